@@ -0,0 +1,220 @@
+"""
+Disponibilidad por doctor.
+
+Cada doctor (y opcionalmente cada consultorio) puede tener su propio calendario.
+Los intervalos ocupados salen de una sola llamada freebusy.query que cubre todos
+los calendarios relevantes y se cachean por calendario unos segundos, así que
+agregar doctores casi no suma latencia.
+"""
+
+import bisect
+import math
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from typing import Iterator
+from zoneinfo import ZoneInfo
+
+from .calendar_sync import calendar_sync
+from .clinic import OFFICE_HOURS, doctor_calendar, office_calendar
+from .config import settings
+from .services.ai import format_slot
+from .services.calendar import CalendarClient
+
+Interval = tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: list[Interval]) -> list[Interval]:
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class BusyCache:
+    """Intervalos ocupados por calendario, con la ventana consultada y su antigüedad."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl = ttl_seconds
+        self.entries: dict[str, tuple[float, datetime, datetime, list[Interval]]] = {}
+
+    def get(self, calendar_id: str, start: datetime, end: datetime) -> list[Interval] | None:
+        entry = self.entries.get(calendar_id)
+        if not entry:
+            return None
+        fetched_at, cached_start, cached_end, intervals = entry
+        if time.monotonic() - fetched_at > self.ttl or start < cached_start or end > cached_end:
+            return None
+        return [(s, e) for s, e in intervals if s < end and e > start]
+
+    def put(self, calendar_id: str, start: datetime, end: datetime, intervals: list[Interval]):
+        self.entries[calendar_id] = (time.monotonic(), start, end, intervals)
+
+    def invalidate(self, calendar_id: str | None = None):
+        if calendar_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(calendar_id, None)
+
+
+busy_cache = BusyCache(settings.freebusy_cache_seconds)
+
+
+def calendars_for(doctor: str | None, office: str | None) -> list[str]:
+    ids = [doctor_calendar(doctor)]
+    office_cal = office_calendar(office)
+    if office_cal and office_cal not in ids:
+        ids.append(office_cal)
+    return ids
+
+
+async def busy_intervals(
+    calendar_ids: list[str], start: datetime, end: datetime, calendar: CalendarClient | None = None
+) -> dict[str, list[Interval]]:
+    """Ocupados por calendario; los que no están en caché van juntos en un freebusy."""
+    result = {}
+    missing = []
+    for cal_id in calendar_ids:
+        cached = busy_cache.get(cal_id, start, end)
+        if cached is None:
+            missing.append(cal_id)
+        else:
+            result[cal_id] = cached
+    if missing:
+        calendar = calendar or CalendarClient()
+        fetched = await calendar.free_busy(missing, start, end)
+        for cal_id in missing:
+            intervals = merge_intervals(fetched.get(cal_id, []))
+            busy_cache.put(cal_id, start, end, intervals)
+            result[cal_id] = intervals
+    return result
+
+
+async def busy_events(
+    doctor: str | None,
+    office: str | None,
+    start: datetime,
+    end: datetime,
+    calendar: CalendarClient | None = None,
+) -> list[dict]:
+    """
+    Ocupado combinado del doctor (+ consultorio) en el formato de eventos que
+    espera AIClient.suggest_available_slots.
+    """
+    by_calendar = await busy_intervals(calendars_for(doctor, office), start, end, calendar)
+    merged = merge_intervals([iv for intervals in by_calendar.values() for iv in intervals])
+    return [
+        {"start": {"dateTime": s.isoformat()}, "end": {"dateTime": e.isoformat()}}
+        for s, e in merged
+    ]
+
+
+# La búsqueda pide el ocupado por páginas de una semana, solo las que necesita
+PAGE_DAYS = 7
+
+
+def days_outward(preferred: date, earliest: date, max_days: int) -> Iterator[date]:
+    """preferred, +1, -1, +2, -2, ... sin bajar de `earliest`."""
+    if preferred >= earliest:
+        yield preferred
+    for k in range(1, max_days + 1):
+        for day in (preferred + timedelta(days=k), preferred - timedelta(days=k)):
+            if day >= earliest:
+                yield day
+
+
+def free_slot_starts(day: date, tz: ZoneInfo, busy: list[Interval]) -> list[datetime]:
+    """Slots de 1h libres en horario de consultorio; `busy` debe venir fusionado y ordenado."""
+    starts = [s for s, _ in busy]
+    free = []
+    for hour in range(*OFFICE_HOURS):
+        slot_start = datetime.combine(day, dt_time(hour), tzinfo=tz)
+        slot_end = slot_start + timedelta(hours=1)
+        # Único intervalo candidato a solaparse: el último que empieza antes del fin del slot
+        idx = bisect.bisect_left(starts, slot_end) - 1
+        if idx >= 0 and busy[idx][1] > slot_start:
+            continue
+        free.append(slot_start)
+    return free
+
+
+async def nearest_slots(
+    doctor: str | None,
+    office: str | None,
+    preferred: datetime,
+    count: int = 5,
+    max_days: int = 90,
+    calendar: CalendarClient | None = None,
+) -> list[dict]:
+    """
+    Busca hacia afuera desde `preferred` (ambas direcciones, desde mañana) y se
+    detiene en cuanto tiene `count` slots y ningún día restante puede quedar más
+    cerca. Devuelve los slots ordenados por cercanía a la preferencia.
+    """
+    tz = ZoneInfo(settings.scheduler_timezone)
+    preferred = preferred.astimezone(tz)
+    earliest = (datetime.now(tz) + timedelta(days=1)).date()
+    calendar_ids = calendars_for(doctor, office)
+    pages: dict[int, list[Interval]] = {}
+    found: list[tuple[float, datetime]] = []
+    worst = math.inf
+
+    for day in days_outward(preferred.date(), earliest, max_days):
+        day_gap = abs((day - preferred.date()).days)
+        if len(found) >= count and (day_gap - 1) * 86400 > worst:
+            break
+        page = (day - earliest).days // PAGE_DAYS
+        if page not in pages:
+            page_start = datetime.combine(earliest + timedelta(days=page * PAGE_DAYS), dt_time.min, tzinfo=tz)
+            by_calendar = await busy_intervals(
+                calendar_ids, page_start, page_start + timedelta(days=PAGE_DAYS), calendar
+            )
+            pages[page] = merge_intervals([iv for intervals in by_calendar.values() for iv in intervals])
+        for slot_start in free_slot_starts(day, tz, pages[page]):
+            found.append((abs((slot_start - preferred).total_seconds()), slot_start))
+        found.sort()
+        del found[count:]
+        if len(found) >= count:
+            worst = found[-1][0]
+
+    return [format_slot(slot_start) for _, slot_start in found]
+
+
+async def window_slots(
+    doctor: str | None,
+    office: str | None,
+    first_day: date,
+    last_day: date,
+    calendar: CalendarClient | None = None,
+) -> list[dict]:
+    """
+    Todos los slots libres de `first_day` a `last_day` (inclusive, desde mañana),
+    en orden, con un solo freebusy para toda la ventana.
+    """
+    tz = ZoneInfo(settings.scheduler_timezone)
+    first_day = max(first_day, (datetime.now(tz) + timedelta(days=1)).date())
+    if last_day < first_day:
+        return []
+    start = datetime.combine(first_day, dt_time.min, tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), dt_time.min, tzinfo=tz)
+    by_calendar = await busy_intervals(calendars_for(doctor, office), start, end, calendar)
+    busy = merge_intervals([iv for intervals in by_calendar.values() for iv in intervals])
+    return [
+        format_slot(slot_start)
+        for offset in range((last_day - first_day).days + 1)
+        for slot_start in free_slot_starts(first_day + timedelta(days=offset), tz, busy)
+    ]
+
+
+def _invalidate_on_change(events: list[dict], full_sync: bool):
+    if full_sync:
+        busy_cache.invalidate()
+        return
+    for calendar_id in {event.get("_calendar_id") for event in events}:
+        busy_cache.invalidate(calendar_id)
+
+
+calendar_sync.subscribe(_invalidate_on_change)
@@ -0,0 +1,234 @@
+"""
+Resumen del día para el dueño ("resumen" por WhatsApp).
+
+Se arma de noche (`briefing_hour`, fuera del horario de consulta) y queda en
+memoria: agenda del día siguiente en todos los calendarios y huecos libres por
+doctor (un solo freebusy). Si CalendarSync avisa de cambios en ese día, el job
+de refresco lo vuelve a armar en segundo plano; al contestar solo se arma si
+todavía no hay ninguno.
+
+El encabezado ("hoy"/"mañana"), las citas nuevas de las últimas 24 h (ledger),
+la lista de espera y los correos pendientes se arman al contestar: dependen de
+la hora en que se pide y cambian durante el día.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from .availability import free_slot_starts, merge_intervals
+from .calendar_sync import calendar_sync
+from .clinic import DOCTORS, all_calendar_ids, doctor_calendar
+from .config import settings
+from .db import SessionLocal
+from .email_digest import owner_key
+from .ledger import to_utc_naive
+from .logs import get_logger
+from .metrics import briefing_requests
+from .models import Appointment
+from .services.calendar import CalendarClient
+from .state import state
+from .waitlist import waitlist_index
+from .whatsapp_commands import parse_command
+
+logger = get_logger(__name__)
+
+_WEEKDAYS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+
+
+@dataclass
+class Briefing:
+    day: date
+    generated_at: datetime
+    text: str  # parte precalculada (agenda y huecos)
+
+
+def briefing_day(now: datetime) -> date:
+    """Desde `briefing_hour` el resumen es del día siguiente; antes, del día en curso."""
+    return now.date() + timedelta(days=1) if now.hour >= settings.briefing_hour else now.date()
+
+
+def _doctor_name(doctor: str | None) -> str:
+    return DOCTORS.get(doctor or "", doctor or "sin doctor").partition(" (")[0]
+
+
+def _ranges(starts: list[datetime]) -> list[str]:
+    """Slots de 1 h consecutivos como franjas "10:00–13:00"."""
+    ranges: list[list[datetime]] = []
+    for start in starts:
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(hours=1)
+        else:
+            ranges.append([start, start + timedelta(hours=1)])
+    return [f"{s:%H:%M}–{e:%H:%M}" for s, e in ranges]
+
+
+async def _agenda(calendar: CalendarClient, start: datetime, end: datetime) -> list[tuple[datetime, str]]:
+    calendar_ids = all_calendar_ids()
+    pages = await asyncio.gather(
+        *(calendar.list_events(start, end, max_results=100, calendar_id=cal_id) for cal_id in calendar_ids)
+    )
+    seen = set()
+    agenda = []
+    for events in pages:
+        for event in events:
+            if event.get("id") in seen or event.get("status") == "cancelled":
+                continue
+            seen.add(event.get("id"))
+            event_start, _ = CalendarClient.event_start_end(event)
+            if event_start is not None:
+                agenda.append((event_start.astimezone(start.tzinfo), event.get("summary") or "(sin título)"))
+    return sorted(agenda)
+
+
+async def _gaps(calendar: CalendarClient, day: date, tz: ZoneInfo) -> dict[str, list[str]]:
+    """Franjas libres por doctor; directo a freebusy para no pisar la caché de las búsquedas de pacientes."""
+    start = datetime.combine(day, datetime.min.time(), tzinfo=tz)
+    calendar_ids = list(dict.fromkeys(doctor_calendar(doctor) for doctor in DOCTORS))
+    busy = await calendar.free_busy(calendar_ids, start, start + timedelta(days=1))
+    return {
+        doctor: _ranges(free_slot_starts(day, tz, merge_intervals(busy.get(doctor_calendar(doctor), []))))
+        for doctor in DOCTORS
+    }
+
+
+def _new_bookings(now: datetime) -> dict[str | None, int]:
+    try:
+        with SessionLocal() as session:
+            rows = (
+                session.query(Appointment.doctor, func.count(Appointment.id))
+                .filter(
+                    Appointment.created_at >= to_utc_naive(now - timedelta(days=1)),
+                    Appointment.status != "cancelled",
+                )
+                .group_by(Appointment.doctor)
+                .all()
+            )
+    except SQLAlchemyError as exc:
+        logger.error("briefing.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return {}
+    return dict(rows)
+
+
+async def build_briefing(now: datetime | None = None, calendar: CalendarClient | None = None) -> Briefing:
+    tz = ZoneInfo(settings.scheduler_timezone)
+    now = now or datetime.now(tz)
+    calendar = calendar or CalendarClient()
+    day = briefing_day(now)
+    start = datetime.combine(day, datetime.min.time(), tzinfo=tz)
+    agenda, gaps = await asyncio.gather(_agenda(calendar, start, start + timedelta(days=1)), _gaps(calendar, day, tz))
+
+    lines = []
+    if agenda:
+        lines.append(f"Agenda ({len(agenda)}):")
+        lines.extend(f"- {when:%H:%M} {summary}" for when, summary in agenda)
+    else:
+        lines.append("Agenda: sin eventos.")
+    lines.append("\nHuecos libres:")
+    for doctor, ranges in gaps.items():
+        lines.append(f"- {_doctor_name(doctor)}: {', '.join(ranges) if ranges else 'lleno'}")
+    return Briefing(day=day, generated_at=now, text="\n".join(lines))
+
+
+def _heading(day: date, now: datetime) -> str:
+    # Se calcula al contestar: el de las 21:00 dice "mañana" y al día siguiente ya es "hoy"
+    label = {0: "hoy", 1: "mañana"}.get((day - now.date()).days, "el")
+    return f"Resumen para {label} {_WEEKDAYS[day.weekday()]} {day:%d/%m}:"
+
+
+def _live_sections(now: datetime) -> str:
+    """Lo que depende de la hora en que se pide: citas nuevas (24 h), lista de espera y correos."""
+    bookings = _new_bookings(now)
+    if bookings:
+        total = sum(bookings.values())
+        by_doctor = ", ".join(f"{_doctor_name(doctor)} {count}" for doctor, count in sorted(bookings.items(), key=lambda kv: -kv[1]))
+        lines = [f"Citas nuevas (24 h): {total} — {by_doctor}"]
+    else:
+        lines = ["Citas nuevas (24 h): ninguna"]
+    waiting: dict[str | None, int] = {}
+    for item in waitlist_index.items.values():
+        if item.status == "waiting":
+            waiting[item.doctor] = waiting.get(item.doctor, 0) + 1
+    if waiting:
+        by_doctor = ", ".join(f"{_doctor_name(doctor)} {count}" for doctor, count in waiting.items())
+        lines.append(f"Lista de espera: {sum(waiting.values())} — {by_doctor}")
+    else:
+        lines.append("Lista de espera: vacía")
+    pending = state.pending_count()
+    lines.append(f"Correos pendientes: {pending}" + (" (responde 'contestar N' o 'ignorar N')" if pending else ""))
+    return "\n".join(lines)
+
+
+class BriefingCache:
+    def __init__(self):
+        self.current: Briefing | None = None
+        self.dirty = False
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False) -> Briefing | None:
+        """Rearma el resumen si es de otro día o el calendario cambió; los errores dejan el anterior."""
+        async with self.lock:
+            now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+            if not force and not self.dirty and self.current and self.current.day == briefing_day(now):
+                return self.current
+            self.dirty = False
+            try:
+                self.current = await build_briefing(now)
+            except Exception as exc:
+                self.dirty = True
+                logger.error("briefing.build_failed", error=exc.__class__.__name__, detail=str(exc))
+                return self.current
+            logger.info("briefing.built", day=self.current.day.isoformat())
+            return self.current
+
+    def invalidate(self, events: list[dict], full_sync: bool):
+        """Listener de CalendarSync: solo ensucia si algo cae en el día del resumen."""
+        if self.current is None or self.dirty:
+            return
+        if full_sync:
+            self.dirty = True
+            return
+        for event in events:
+            start, _ = CalendarClient.event_start_end(event)
+            if start is None or start.astimezone(ZoneInfo(settings.scheduler_timezone)).date() == self.current.day:
+                self.dirty = True
+                return
+
+    async def render(self) -> str:
+        now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+        briefing = self.current
+        if briefing is None or briefing.day != briefing_day(now):
+            # Solo si el job todavía no corrió (p. ej. recién arrancado o Google caído)
+            briefing_requests.inc("built")
+            briefing = await self.refresh()
+        else:
+            briefing_requests.inc("cached")
+        if briefing is None:
+            return "No pude armar el resumen de la agenda, revisa que Google Calendar siga autorizado.\n\n" + _live_sections(now)
+        stale = " (hay cambios, lo estoy actualizando)" if self.dirty else ""
+        return (
+            f"{_heading(briefing.day, now)}\n\n{briefing.text}\n\n{_live_sections(now)}\n\n"
+            f"(Agenda actualizada {briefing.generated_at:%d/%m %H:%M}{stale}.)"
+        )
+
+
+briefing_cache = BriefingCache()
+calendar_sync.subscribe(briefing_cache.invalidate)
+
+
+async def refresh_briefing():
+    await briefing_cache.refresh()
+
+
+async def handle_briefing_command(number: str, text: str) -> str | None:
+    """"resumen" del dueño → el resumen en caché. None si no es el dueño o no es el comando."""
+    if owner_key(number) != owner_key(settings.owner_whatsapp_number):
+        return None
+    # "resumen" solo, no un borrador que empieza con esa palabra
+    if parse_command(text).intent != "summary" or len(text.split()) > 3:
+        return None
+    return await briefing_cache.render()
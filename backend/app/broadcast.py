@@ -0,0 +1,87 @@
+"""
+Fan-out de /status/stream (Server-Sent Events).
+
+Un solo broadcaster escucha el journal y cada N segundos arma los contadores;
+cada frame SSE se codifica una vez y se reparte con put_nowait a la cola
+acotada de cada cliente. Un cliente cuya cola se llena se desconecta en vez de
+frenar a los demás, así que cada viewer extra cuesta un put por evento.
+"""
+
+import asyncio
+import json
+
+from .config import settings
+from .journal import JournalEntry, journal
+from .services.dispatcher import dispatcher
+from .state import state
+
+
+def sse_frame(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def counters() -> dict:
+    return {
+        "pending": state.pending_count(),
+        "active_conversations": len(state.appointment_conversations),
+        "dispatcher_queue": dispatcher.pending(),
+        "journal_last_seq": journal.last_seq,
+    }
+
+
+class StatusBroadcaster:
+    def __init__(self, buffer_size: int, counters_seconds: int):
+        self.buffer_size = buffer_size
+        self.counters_seconds = counters_seconds
+        self.clients: set[asyncio.Queue] = set()
+        self.dropped = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._ticker: asyncio.Task | None = None
+
+    def connect(self) -> asyncio.Queue:
+        self.loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_size)
+        queue.put_nowait(sse_frame("counters", counters()))
+        self.clients.add(queue)
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._tick())
+        return queue
+
+    def disconnect(self, queue: asyncio.Queue):
+        self.clients.discard(queue)
+
+    def publish(self, frame: bytes):
+        if not self.clients:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self.loop and self.loop is not None:
+            # log_event desde un hilo del scheduler: repartir en el loop de los clientes
+            self.loop.call_soon_threadsafe(self._fanout, frame)
+        else:
+            self._fanout(frame)
+
+    def _fanout(self, frame: bytes):
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Consumidor lento: se corta; el None le avisa al generador que cierre
+                self.clients.discard(queue)
+                self.dropped += 1
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _tick(self):
+        while self.clients:
+            await asyncio.sleep(self.counters_seconds)
+            self._fanout(sse_frame("counters", counters()))
+
+    def on_journal_entry(self, entry: JournalEntry):
+        self.publish(sse_frame("event", entry.to_dict()))
+
+
+broadcaster = StatusBroadcaster(settings.status_stream_buffer, settings.status_stream_counters_seconds)
+journal.subscribe(broadcaster.on_journal_entry)
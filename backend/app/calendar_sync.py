@@ -0,0 +1,91 @@
+"""
+Sincronización incremental del calendario.
+
+Mantiene el syncToken de Google y reparte los eventos cambiados a los
+suscriptores (p. ej. el motor de recordatorios). Los cambios hechos por el
+propio backend (citas creadas/canceladas) se notifican directo con `notify`
+sin esperar al siguiente sync.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from .clinic import all_calendar_ids
+from .config import settings
+from .logs import get_logger
+from .services.calendar import CalendarClient
+
+logger = get_logger(__name__)
+
+# listener(events, full_sync)
+CalendarListener = Callable[[list[dict], bool], None]
+
+
+class CalendarSync:
+    """
+    Un syncToken por calendario (principal + calendarios por doctor/consultorio).
+    Cada evento se entrega con `_calendar_id` para saber de qué calendario viene.
+    """
+
+    def __init__(self):
+        self.sync_tokens: dict[str, str] = {}
+        self.listeners: list[CalendarListener] = []
+        self.last_sync_at: datetime | None = None
+
+    def subscribe(self, listener: CalendarListener):
+        self.listeners.append(listener)
+
+    def notify(self, events: list[dict], full_sync: bool = False, calendar_id: str | None = None):
+        for event in events:
+            event.setdefault("_calendar_id", calendar_id or settings.google_calendar_id)
+        for listener in self.listeners:
+            try:
+                listener(events, full_sync)
+            except Exception as exc:
+                logger.error(
+                    "calendar_sync.listener_failed",
+                    listener=getattr(listener, "__name__", str(listener)),
+                    error=exc.__class__.__name__,
+                    detail=str(exc),
+                )
+
+    async def run(self, calendar: CalendarClient | None = None) -> int:
+        """
+        Trae los cambios desde el último sync. Si falta el token de algún calendario
+        (arranque o token vencido) se hace sync completo de todos: los listeners
+        reconstruyen su estado a partir de un full_sync único.
+        """
+        calendar = calendar or CalendarClient()
+        now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+        calendar_ids = all_calendar_ids()
+        full_sync = any(cal_id not in self.sync_tokens for cal_id in calendar_ids)
+        if full_sync:
+            self.sync_tokens.clear()
+        items = []
+        next_tokens = {}
+        for cal_id in calendar_ids:
+            try:
+                cal_items, next_token = await calendar.sync_events(
+                    self.sync_tokens.get(cal_id), start=now - timedelta(days=1), calendar_id=cal_id
+                )
+            except HttpError as exc:
+                if exc.resp.status != 410 or full_sync:
+                    raise
+                # Token vencido → sync completo
+                logger.info("calendar_sync.token_expired", calendar=cal_id)
+                self.sync_tokens.clear()
+                return await self.run(calendar)
+            for event in cal_items:
+                event["_calendar_id"] = cal_id
+            items.extend(cal_items)
+            next_tokens[cal_id] = next_token
+        self.notify(items, full_sync)
+        self.sync_tokens.update(next_tokens)
+        self.last_sync_at = now
+        return len(items)
+
+
+calendar_sync = CalendarSync()
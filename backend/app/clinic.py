@@ -0,0 +1,47 @@
+"""Catálogo de la clínica: doctores y consultorios."""
+
+from .config import settings
+
+DOCTORS = {
+    "fernandez": "Dr. Jose Fernandez (Consultas Generales)",
+    "paredes": "Dr. Juan Paredes (Pediatría)",
+    "perez": "Dr. Pedro Perez (Neurología)",
+}
+
+OFFICE_LOCATIONS = {
+    "calle13": "Calle 13, Número 111",
+    "calle09": "Calle 09, Número 120",
+}
+
+# SOLUCIÓN MEDIA: Ubicación por defecto si no se especifica
+DEFAULT_OFFICE = "calle13"  # Sede principal
+
+# Horario de consultorio: todos los días 10am-6pm, slots de 1 hora
+OFFICE_HOURS = (10, 18)
+
+
+def _parse_mapping(raw: str) -> dict[str, str]:
+    mapping = {}
+    for pair in raw.split(","):
+        key, sep, value = pair.partition("=")
+        if sep and key.strip() and value.strip():
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+DOCTOR_CALENDARS = _parse_mapping(settings.doctor_calendars)
+OFFICE_CALENDARS = _parse_mapping(settings.office_calendars)
+
+
+def doctor_calendar(doctor: str | None) -> str:
+    """Calendario donde se agendan las citas del doctor."""
+    return DOCTOR_CALENDARS.get(doctor or "", settings.google_calendar_id)
+
+
+def office_calendar(office: str | None) -> str | None:
+    return OFFICE_CALENDARS.get(office or "")
+
+
+def all_calendar_ids() -> list[str]:
+    ids = [settings.google_calendar_id, *DOCTOR_CALENDARS.values(), *OFFICE_CALENDARS.values()]
+    return list(dict.fromkeys(ids))
@@ -10,9 +10,18 @@ class Settings(BaseSettings):
     whatsapp_gateway_url: str = "http://localhost:3001"
     whatsapp_gateway_api_key: str = "CHANGE_ME"
     owner_whatsapp_number: str = "CHANGE_ME"
+    dispatcher_rate_per_second: float = 5.0
+    dispatcher_workers: int = 4
 
     openai_api_key: str = "CHANGE_ME"
     openai_model: str = "gpt-4o-mini"
+    # Cliente compartido: pool con keep-alive, HTTP/2 si está instalado `h2`
+    openai_timeout_seconds: float = 30.0
+    openai_connect_timeout_seconds: float = 5.0
+    openai_max_retries: int = 2
+    openai_max_connections: int = 20
+    openai_keepalive_seconds: float = 60.0
+    openai_http2: bool = True
 
     google_client_id: str = "CHANGE_ME"
     google_client_secret: str = "CHANGE_ME"
@@ -20,9 +29,78 @@ class Settings(BaseSettings):
     google_token_path: str = "backend/.secrets/token.json"
     google_scopes: str = "https://www.googleapis.com/auth/gmail.modify https://www.googleapis.com/auth/gmail.send https://www.googleapis.com/auth/calendar"
     gmail_poll_minutes: int = 5
+    # Digest de correos: cuántos por completion/mensaje y cuánto cuerpo de cada uno va al modelo
+    # (~4 caracteres por token)
+    email_digest_max: int = 15
+    email_digest_body_chars: int = 1200
+    # Bytes del cuerpo que se decodifican por correo, y parte más grande que se baja por attachmentId
+    email_body_max_bytes: int = 16 * 1024
+    email_body_fetch_max_bytes: int = 256 * 1024
+    # Triage local antes del modelo: "a@x.com,@dominio.com"; allow siempre avisa, deny siempre archiva
+    email_allow_senders: str = ""
+    email_deny_senders: str = ""
+    # Clasificador aprendido de los "ignorar": prob. mínima y veces que se ignoró al remitente/dominio
+    email_triage_threshold: float = 0.9
+    email_triage_min_ignored: int = 3
     google_calendar_id: str = "primary"
+    calendar_sync_minutes: int = 5
+    # "doctor=calendar_id,..." ; los doctores sin calendario propio usan google_calendar_id
+    doctor_calendars: str = ""
+    # "office=calendar_id,..." ; opcional, un consultorio ocupado bloquea a todos sus doctores
+    office_calendars: str = ""
+    freebusy_cache_seconds: int = 60
+    # Planificador de requests a Google: cuotas (Gmail en unidades), batch y reintentos
+    google_calendar_user_qps: float = 10.0
+    google_calendar_project_qps: float = 160.0
+    google_gmail_user_units_per_second: float = 250.0
+    google_gmail_project_units_per_second: float = 20000.0
+    google_batch_max: int = 50
+    google_batch_window_ms: int = 5
+    google_max_retries: int = 5
+    google_backoff_base_seconds: float = 0.5
+    google_backoff_max_seconds: float = 32.0
+    slot_hold_minutes: int = 10
+    # Resumen del dueño: hora local en que se arma el del día siguiente y cada cuánto se revisan cambios
+    briefing_hour: int = 21
+    briefing_refresh_minutes: int = 15
+    # Caché de preguntas frecuentes (primer mensaje): similitud mínima, fracción de palabras de la
+    # pregunta que la entrada debe cubrir, vida de las aprobadas y JSON extra
+    faq_similarity_threshold: float = 0.7
+    faq_min_coverage: float = 0.5
+    faq_ttl_hours: float = 24 * 30
+    faq_path: str = ""
+    # Debajo de esta confianza la fecha pedida por el paciente la resuelve el modelo
+    date_parser_min_confidence: float = 0.6
 
     scheduler_timezone: str = "America/Monterrey"
+    # Tope que espera un webhook a que termine el calentamiento del arranque
+    startup_ready_timeout_seconds: float = 30
+
+    message_dedup_ttl_hours: int = 24
+    # Conversaciones en memoria: tope de pacientes y expiración por inactividad
+    max_conversations: int = 5000
+    conversation_idle_minutes: int = 720
+
+    # Journal de eventos (vacío = solo en memoria)
+    journal_dir: str = "backend/.journal"
+    journal_segment_bytes: int = 4 * 1024 * 1024
+    journal_max_segments: int = 20
+    journal_memory_entries: int = 10000
+
+    # /status/stream: eventos en cola por cliente antes de cortarlo, y cada cuánto van los contadores
+    status_stream_buffer: int = 256
+    status_stream_counters_seconds: int = 5
+
+    log_level: str = "INFO"
+    # Fracción de mensajes con spans; exporter: none | file | otlp
+    trace_sample_rate: float = 0.1
+    trace_exporter: str = "none"
+    trace_file: str = "backend/.traces.ndjson"
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+
+    # Grabación de turnos para replay (vacío = apagado); la sal fija los alias de teléfonos
+    record_dir: str = ""
+    record_salt: str = "CHANGE_ME"
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,41 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import declarative_base, sessionmaker
 
 from .config import settings
+from .logs import get_logger
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = get_logger(__name__)
+
+_engine = None
+
+
+def get_engine():
+    """El engine (y el driver de la base) se crean al primer uso, no al importar."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings.database_url, pool_pre_ping=True)
+    return _engine
+
+
+class _LazySessionmaker(sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+Base = declarative_base()
+
+
+def init_db() -> bool:
+    """Crea las tablas si no existen. Devuelve False si la base no está disponible."""
+    from . import models  # noqa: F401 - registra los modelos en Base.metadata
+
+    try:
+        Base.metadata.create_all(bind=get_engine())
+    except SQLAlchemyError as exc:
+        logger.error("db.init_failed", error=exc.__class__.__name__, detail=str(exc))
+        return False
+    return True
@@ -0,0 +1,138 @@
+"""
+Dedup de mensajes entrantes por message ID.
+
+El gateway reintenta el POST a /whatsapp/incoming cuando hay timeout; sin dedup
+el backend vuelve a procesar el mensaje (historial duplicado, llamadas extra a
+OpenAI y hasta una segunda cita en el calendario).
+"""
+
+import hashlib
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .config import settings
+from .db import SessionLocal
+from .logs import get_logger
+from .models import ProcessedMessage
+
+logger = get_logger(__name__)
+
+
+def message_hash(message_id: str) -> int:
+    """Hash de 64 bits (con signo, cabe en BIGINT) del message ID."""
+    digest = hashlib.blake2b(message_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class MessageDedupIndex:
+    """
+    Anillo de buckets con TTL. Cada bucket cubre `ttl / buckets` segundos y
+    guarda solo hashes de 64 bits; al rotar se descarta el bucket más viejo
+    completo, así que la memoria queda acotada por el tráfico de la ventana.
+    """
+
+    def __init__(self, ttl_seconds: int, buckets: int = 24):
+        self.buckets = buckets
+        self.bucket_seconds = max(1, ttl_seconds // buckets)
+        self.ring: deque[tuple[int, set[int]]] = deque()
+
+    def _current(self, now: float) -> set[int]:
+        bucket_id = int(now // self.bucket_seconds)
+        if not self.ring or self.ring[-1][0] != bucket_id:
+            self.ring.append((bucket_id, set()))
+        while self.ring and self.ring[0][0] <= bucket_id - self.buckets:
+            self.ring.popleft()
+        return self.ring[-1][1]
+
+    def __contains__(self, key: int) -> bool:
+        return any(key in bucket for _, bucket in self.ring)
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for _, bucket in self.ring)
+
+    def add(self, key: int, now: float | None = None) -> bool:
+        """Agrega el hash; devuelve False si ya estaba dentro de la ventana."""
+        now = time.time() if now is None else now
+        current = self._current(now)
+        if key in self:
+            return False
+        current.add(key)
+        return True
+
+    def load(self, key: int, seen_at: float):
+        """Restaura un hash en el bucket que le corresponde por su timestamp."""
+        bucket_id = int(seen_at // self.bucket_seconds)
+        for existing_id, bucket in self.ring:
+            if existing_id == bucket_id:
+                bucket.add(key)
+                return
+        self.ring.append((bucket_id, {key}))
+        self.ring = deque(sorted(self.ring, key=lambda item: item[0]))
+
+    def discard(self, key: int):
+        for _, bucket in self.ring:
+            bucket.discard(key)
+
+
+message_index = MessageDedupIndex(settings.message_dedup_ttl_hours * 3600)
+
+
+def claim_message(message_id: str) -> bool:
+    """
+    Reclama el message ID para procesarlo. Devuelve False si es un reintento.
+    El índice en memoria resuelve los reintentos sin tocar la base; la PK en
+    `processed_messages` cubre reinicios y varias instancias.
+    """
+    key = message_hash(message_id)
+    if not message_index.add(key):
+        return False
+    try:
+        with SessionLocal() as session:
+            session.add(ProcessedMessage(message_hash=key, seen_at=datetime.utcnow()))
+            session.commit()
+    except IntegrityError:
+        return False
+    except SQLAlchemyError as exc:
+        # Sin base seguimos deduplicando solo en memoria
+        logger.error("dedup.db_error", error=exc.__class__.__name__, detail=str(exc))
+    return True
+
+
+def release_message(message_id: str):
+    """Libera el claim si el procesamiento falló, para que el reintento sí entre."""
+    key = message_hash(message_id)
+    message_index.discard(key)
+    try:
+        with SessionLocal() as session:
+            session.query(ProcessedMessage).filter(ProcessedMessage.message_hash == key).delete()
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("dedup.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def prune_processed_messages():
+    """Borra de la base los IDs que ya salieron de la ventana de dedup."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.message_dedup_ttl_hours)
+    try:
+        with SessionLocal() as session:
+            session.query(ProcessedMessage).filter(ProcessedMessage.seen_at < cutoff).delete()
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("dedup.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def restore_message_index() -> int:
+    """Carga los IDs vigentes desde la base (tras un reinicio)."""
+    prune_processed_messages()
+    try:
+        with SessionLocal() as session:
+            rows = session.query(ProcessedMessage.message_hash, ProcessedMessage.seen_at).all()
+    except SQLAlchemyError as exc:
+        logger.error("dedup.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return 0
+    for key, seen_at in rows:
+        message_index.load(key, seen_at.replace(tzinfo=timezone.utc).timestamp())
+    return len(rows)
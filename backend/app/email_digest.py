@@ -0,0 +1,142 @@
+"""
+Digest de correos para el dueño.
+
+Cada poll junta los correos nuevos en un solo mensaje numerado (del más al
+menos importante) y el dueño actúa sobre los ítems por WhatsApp:
+"ignorar 2", "ignorar" (todos), "contestar 1" → texto de la respuesta → "sí".
+Lo que quedó abierto de un digest anterior (incluido un borrador a medias)
+sigue al frente de la lista y los correos nuevos se numeran después.
+"""
+
+from email.utils import parseaddr
+
+from .config import settings
+from .email_triage import triage_model
+from .logs import get_logger
+from .services.gmail import GmailClient
+from .state import PendingEmailAction, state
+from .whatsapp_commands import parse_command
+
+logger = get_logger(__name__)
+
+OPEN = ("pending", "drafting")
+
+
+def owner_key(raw: str) -> str:
+    # Solo dígitos y el prefijo de celular MX (521) normalizado a 52
+    digits = "".join(ch for ch in (raw or "") if ch.isdigit())
+    if digits.startswith("521"):
+        return "52" + digits[3:]
+    return digits
+
+
+def _sender_name(sender: str) -> str:
+    name, address = parseaddr(sender)
+    return name or address or sender
+
+
+def format_digest(
+    actions: list[PendingEmailAction], archived: int = 0, carried: list[PendingEmailAction] | None = None
+) -> str:
+    note = f"\n\n(Además archivé {archived} correos masivos o automáticos sin avisarte.)" if archived else ""
+    carried = carried or []
+    if len(actions) == 1 and not carried:
+        action = actions[0]
+        return (
+            f"Jefe, recibiste un correo de {action.sender}. "
+            f"Dice lo siguiente: {action.summary}.\n\n"
+            "¿Quieres ignorarlo o contestar?"
+        ) + note
+    if len(actions) == 1:
+        lines = ["Jefe, tienes 1 correo nuevo:"]
+    else:
+        lines = [f"Jefe, tienes {len(actions)} correos nuevos (del más importante al menos):"]
+    for number, action in enumerate(actions, len(carried) + 1):
+        lines.append(f"{number}. {_sender_name(action.sender)} — {action.subject}: {action.summary}")
+    if carried:
+        lines.append("\nSiguen pendientes del anterior:")
+        for number, action in enumerate(carried, 1):
+            draft = " (respuesta a medias)" if action.status == "drafting" else ""
+            lines.append(f"{number}. {_sender_name(action.sender)} — {action.subject}{draft}")
+    lines.append("\nResponde por ejemplo 'contestar 1' o 'ignorar 3' ('ignorar' los descarta todos).")
+    return "\n".join(lines) + note
+
+
+def _pick(items: list[PendingEmailAction], number: int | None) -> PendingEmailAction | None:
+    open_items = [a for a in items if a.status in OPEN]
+    if number is None:
+        return open_items[0] if len(open_items) == 1 else None
+    if 1 <= number <= len(items) and items[number - 1].status in OPEN:
+        return items[number - 1]
+    return None
+
+
+async def _send(action: PendingEmailAction) -> str:
+    _, address = parseaddr(action.sender)
+    try:
+        await GmailClient().send_reply(address, f"Re: {action.subject}", action.draft_reply or "")
+    except Exception as exc:
+        logger.exception("email.reply_failed", error=exc.__class__.__name__)
+        return "No pude enviar la respuesta, revisa que Gmail siga autorizado. ¿Lo intento de nuevo? (sí/no)"
+    action.status = "approved"
+    triage_model.learn(action.sender, action.subject, ignored=False)
+    state.log_event("email.replied", f"To {action.sender} - {action.subject}")
+    return f"Listo, le contesté a {_sender_name(action.sender)}."
+
+
+def _ignore(action: PendingEmailAction):
+    action.status = "ignored"
+    triage_model.learn(action.sender, action.subject, ignored=True)
+    state.log_event("email.ignored", f"From {action.sender} - {action.subject}")
+
+
+async def handle_owner_reply(number: str, text: str) -> str | None:
+    """
+    Atiende al dueño sobre los ítems del digest. Devuelve el texto de respuesta,
+    o None si el mensaje no es del dueño o no es sobre los correos pendientes.
+    """
+    key = owner_key(number)
+    if key != owner_key(settings.owner_whatsapp_number):
+        return None
+    items = state.get_pending_items(key)
+    if not any(a.status in OPEN for a in items):
+        return None
+    command = parse_command(text)
+
+    drafting = next((a for a in items if a.status == "drafting"), None)
+    # "contestar 3"/"ignorar 3" con número siempre son comandos, aunque haya un borrador abierto
+    explicit = command.intent in ("ignore", "reply") and command.payload.get("item") is not None
+    if drafting is not None and explicit:
+        drafting.status, drafting.draft_reply = "pending", None
+    elif drafting is not None:
+        if command.intent == "cancel":
+            drafting.status, drafting.draft_reply = "pending", None
+            return "Ok, no le contesto por ahora."
+        if drafting.draft_reply is not None and command.intent in ("confirm", "send"):
+            return await _send(drafting)
+        if drafting.draft_reply is not None and command.intent == "reject":
+            drafting.draft_reply = None
+            return "Ok, no lo envío. Escríbeme cómo quieres que le conteste, o 'cancelar'."
+        # Cualquier otro texto es la respuesta (o la corrige)
+        drafting.draft_reply = text.strip()
+        return (
+            f"Le voy a contestar a {_sender_name(drafting.sender)}:\n\n{drafting.draft_reply}\n\n"
+            "¿Lo envío? (sí/no)"
+        )
+
+    if command.intent == "ignore":
+        number_given = command.payload.get("item")
+        targets = [a for a in items if a.status in OPEN] if number_given is None else [_pick(items, number_given)]
+        if None in targets:
+            return f"No tengo el correo {number_given} pendiente."
+        for action in targets:
+            _ignore(action)
+        return "Listo, lo ignoro." if len(targets) == 1 else f"Listo, ignoré {len(targets)} correos."
+
+    if command.intent == "reply":
+        action = _pick(items, command.payload.get("item"))
+        if action is None:
+            return "¿Cuál correo contesto? Dime el número, por ejemplo 'contestar 2'."
+        action.status = "drafting"
+        return f"¿Qué le contesto a {_sender_name(action.sender)} sobre \"{action.subject}\"?"
+    return None
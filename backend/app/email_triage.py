@@ -0,0 +1,158 @@
+"""
+Triage local de correos, antes de gastar una completion en resumirlos.
+
+En orden:
+1. Listas del dueño (`email_allow_senders` / `email_deny_senders`): dirección
+   completa o "@dominio".
+2. Encabezados de correo masivo o automático: List-Unsubscribe, List-Id,
+   Precedence bulk/list/junk, Auto-Submitted, remitentes tipo no-reply.
+3. Un clasificador chico (Naive Bayes en log-odds) sobre remitente, dominio y
+   palabras del asunto, entrenado con lo que el dueño ignora y lo que contesta.
+   Solo archiva si la probabilidad pasa `email_triage_threshold` y el
+   remitente (o su dominio) ya se ignoró `email_triage_min_ignored` veces, para
+   que un asunto parecido no tape a un remitente nuevo.
+
+Los conteos viven en la tabla `email_triage_features` y se cargan al arrancar.
+"""
+
+import math
+import re
+from datetime import datetime
+from email.utils import parseaddr
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import settings
+from .db import SessionLocal
+from .logs import get_logger
+from .models import EmailTriageFeature
+
+logger = get_logger(__name__)
+
+_NO_REPLY_RE = re.compile(
+    r"^(no-?reply|do-?not-?reply|notifications?|notificaciones|mailer-daemon|postmaster|bounces?|newsletters?)\b"
+)
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+BULK_PRECEDENCE = {"bulk", "list", "junk"}
+
+
+def _address(sender: str) -> str:
+    return parseaddr(sender or "")[1].lower()
+
+
+def _parse_senders(raw: str) -> set[str]:
+    return {item.strip().lower() for item in raw.split(",") if item.strip()}
+
+
+def _listed(address: str, entries: set[str]) -> bool:
+    domain = address.rpartition("@")[2]
+    return address in entries or f"@{domain}" in entries
+
+
+def features(sender: str, subject: str) -> list[str]:
+    address = _address(sender)
+    found = []
+    if address:
+        found.append(f"from:{address}")
+        found.append(f"domain:{address.rpartition('@')[2]}")
+    words = dict.fromkeys(w.lower() for w in _WORD_RE.findall(subject or ""))
+    found.extend(f"w:{word}" for word in list(words)[:12])
+    return found
+
+
+class TriageModel:
+    """Conteos por rasgo: [ignorados, atendidos]."""
+
+    def __init__(self):
+        self.counts: dict[str, list[int]] = {}
+
+    def probability(self, sender: str, subject: str) -> float | None:
+        """
+        P(ignorar): cada rasgo visto aporta el log-odds de su posterior Beta(1, 1)
+        y se suman como en Naive Bayes. None si ningún rasgo se ha visto.
+        """
+        log_odds = 0.0
+        known = False
+        for feature in features(sender, subject):
+            ignored, kept = self.counts.get(feature, (0, 0))
+            if not ignored and not kept:
+                continue
+            known = True
+            log_odds += math.log((ignored + 1) / (kept + 1))
+        if not known:
+            return None
+        return 1 / (1 + math.exp(-max(-50.0, min(50.0, log_odds))))
+
+    def sender_known_ignored(self, sender: str) -> bool:
+        """El remitente ya se ignoró varias veces, o su dominio sin que nunca se contestara a nadie de él."""
+        address = _address(sender)
+        by_address = self.counts.get(f"from:{address}", (0, 0))[0]
+        domain_ignored, domain_kept = self.counts.get(f"domain:{address.rpartition('@')[2]}", (0, 0))
+        minimum = settings.email_triage_min_ignored
+        return by_address >= minimum or (domain_ignored >= minimum and not domain_kept)
+
+    def learn(self, sender: str, subject: str, ignored: bool):
+        column = 0 if ignored else 1
+        names = features(sender, subject)
+        for name in names:
+            self.counts.setdefault(name, [0, 0])[column] += 1
+        try:
+            with SessionLocal() as session:
+                now = datetime.utcnow()
+                for name in names:
+                    row = session.get(EmailTriageFeature, name)
+                    if row is None:
+                        row = EmailTriageFeature(feature=name, ignored=0, kept=0)
+                        session.add(row)
+                    row.ignored, row.kept = self.counts[name]
+                    row.updated_at = now
+                session.commit()
+        except SQLAlchemyError as exc:
+            # Sin base el modelo sigue aprendiendo en memoria hasta el próximo reinicio
+            logger.error("triage.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+    def restore(self) -> int:
+        try:
+            with SessionLocal() as session:
+                rows = session.query(EmailTriageFeature.feature, EmailTriageFeature.ignored, EmailTriageFeature.kept).all()
+        except SQLAlchemyError as exc:
+            logger.error("triage.db_error", error=exc.__class__.__name__, detail=str(exc))
+            return 0
+        self.counts = {feature: [ignored, kept] for feature, ignored, kept in rows}
+        return len(rows)
+
+
+triage_model = TriageModel()
+
+
+def skip_reason(headers: dict) -> str | None:
+    """
+    Por qué no vale la pena avisar de este correo (allow/deny, bulk, automated,
+    no_reply, learned), o None si va al digest. `headers` viene de extract_headers.
+    """
+    sender = headers.get("from", "")
+    address = _address(sender)
+    if _listed(address, _parse_senders(settings.email_allow_senders)):
+        return None
+    if _listed(address, _parse_senders(settings.email_deny_senders)):
+        return "deny"
+    if headers.get("list-unsubscribe") or headers.get("list-id"):
+        return "bulk"
+    if headers.get("precedence", "").strip().lower() in BULK_PRECEDENCE:
+        return "bulk"
+    if headers.get("auto-submitted", "no").strip().lower() != "no":
+        return "automated"
+    if _NO_REPLY_RE.match(address.partition("@")[0]):
+        return "no_reply"
+    probability = triage_model.probability(sender, headers.get("subject", ""))
+    if (
+        probability is not None
+        and probability >= settings.email_triage_threshold
+        and triage_model.sender_known_ignored(sender)
+    ):
+        return "learned"
+    return None
+
+
+def restore_triage_model() -> int:
+    return triage_model.restore()
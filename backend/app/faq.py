@@ -0,0 +1,313 @@
+"""
+Caché semántica de preguntas frecuentes para el primer mensaje de un paciente.
+
+Horarios, direcciones, qué doctor ve niños: preguntas que se repiten y que hoy
+pasan por `analyze_health_query` con todo el historial. Acá se contestan en el
+momento si se parecen lo suficiente (coseno >= `faq_similarity_threshold`) a
+una entrada del índice.
+
+- Vectores: hashing vectorizer local (palabras, bigramas y trigramas de
+  caracteres para aguantar faltas de ortografía), sin modelo de embeddings.
+- Entradas curadas: se generan del catálogo de la clínica (clinic.py) más las
+  de `faq_path` (JSON, p. ej. precios); se regeneran si el catálogo cambia.
+- Entradas aprobadas: respuestas del modelo a primeras preguntas informativas
+  quedan como candidatas; un admin las aprueba (/admin/faq) y se guardan en la
+  tabla `faq_entries` con TTL y la huella del catálogo con que se aprobaron.
+  Si el catálogo cambia, las aprobadas con otra huella dejan de servirse.
+"""
+
+import hashlib
+import json
+import math
+import re
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .clinic import DOCTORS, OFFICE_HOURS, OFFICE_LOCATIONS
+from .config import settings
+from .db import SessionLocal
+from .logs import get_logger
+from .models import FaqEntry
+
+logger = get_logger(__name__)
+
+DIMENSIONS = 1 << 20
+# Cada cuánto se recalcula la huella del catálogo (lee `faq_path`)
+FINGERPRINT_SECONDS = 60
+INTRO = "¡Hola! Soy el asistente virtual del Hospital de Especialidades. "
+_ACCENTS = str.maketrans("áéíóúüñ", "aeiouun")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "al", "de", "del", "el", "la", "los", "las", "lo", "un", "una", "y", "o", "en", "por", "para", "con",
+    "que", "se", "su", "sus", "me", "mi", "es", "son", "hola", "buenas", "buenos", "dias", "tardes", "noches",
+    "favor", "porfa", "gracias", "quisiera", "saber", "queria", "oiga", "disculpe", "tienen", "hay", "cual",
+    "cuales", "ustedes",
+}
+# Cómo preguntan los pacientes por cada especialidad del catálogo
+_SPECIALTY_ALIASES = {
+    "pediatría": ["pediatra", "doctor para niños", "qué doctor atiende niños", "atienden niños", "atienden bebés", "quién ve a los niños"],
+    "neurología": ["neurólogo", "doctor de los nervios"],
+    "consultas generales": ["médico general", "doctor general", "consulta general"],
+}
+# Un mensaje con esto nunca se contesta desde la caché: lo ve el modelo (y su detección de emergencias)
+_URGENT_RE = re.compile(r"\b(urgen\w*|emergencia\w*|sangr\w*|desmay\w*|convulsi\w*|pecho|respirar|grave)\b")
+# Ni con un síntoma: "mi bebé tiene fiebre, ¿atienden bebés?" pide triage, no el horario del pediatra
+_SYMPTOM_RE = re.compile(
+    r"\b(fiebre|calentura|temperatura|dol[oi]\w*|duel\w*|v[oó]mit\w*|n[aá]usea\w*|tos|diarrea|mare\w*|"
+    r"infecci\w*|inflam\w*|hinch\w*|ronch\w*|alergi\w*|comez[oó]n|pica\w*|herid\w*|golpe\w*|"
+    r"s[ií]ntoma\w*|enferm\w*|malestar|cay[oó]|torci\w*|fractur\w*)\b"
+)
+
+
+def _stem(word: str) -> str:
+    """Plural a singular, lo justo para que "doctores" y "pediatras" pesen igual que en singular."""
+    if len(word) > 5 and word.endswith("es") and word[-3] in "rnld":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _tokens(text: str) -> list[str]:
+    words = _WORD_RE.findall(text.lower().translate(_ACCENTS))
+    return [_stem(word) for word in words if word not in _STOPWORDS]
+
+
+def _needs_triage(text: str) -> bool:
+    lowered = text.lower()
+    return bool(_URGENT_RE.search(lowered) or _SYMPTOM_RE.search(lowered))
+
+
+def _slot(feature: str) -> int:
+    return zlib.crc32(feature.encode()) & (DIMENSIONS - 1)
+
+
+def vectorize(text: str) -> dict[int, float]:
+    """Vector disperso normalizado (L2): palabras, bigramas y trigramas de caracteres."""
+    counts: dict[int, float] = {}
+    words = _tokens(text)
+    features = [(f"w:{w}", 1.0) for w in words]
+    features += [(f"b:{a}_{b}", 0.7) for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"_{word}_"
+        features += [(f"c:{padded[i:i + 3]}", 0.4) for i in range(len(padded) - 2)]
+    for feature, weight in features:
+        slot = _slot(feature)
+        counts[slot] = counts.get(slot, 0.0) + weight
+    norm = math.sqrt(sum(value * value for value in counts.values()))
+    return {slot: value / norm for slot, value in counts.items()} if norm else {}
+
+
+def cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(slot, 0.0) for slot, value in a.items())
+
+
+def catalog_fingerprint() -> str:
+    """Huella de todo lo que las respuestas citan: si cambia, las respuestas viejas ya no valen."""
+    raw = json.dumps([DOCTORS, OFFICE_LOCATIONS, list(OFFICE_HOURS), _load_file()], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def _load_file() -> list[dict]:
+    if not settings.faq_path:
+        return []
+    try:
+        with open(settings.faq_path, encoding="utf-8") as fh:
+            items = json.load(fh)
+    except (OSError, ValueError) as exc:
+        logger.warning("faq.file_error", path=settings.faq_path, error=exc.__class__.__name__)
+        return []
+    return [item for item in items if isinstance(item, dict) and item.get("questions") and item.get("answer")]
+
+
+def curated_entries() -> list[tuple[list[str], str]]:
+    """(preguntas, respuesta) armadas del catálogo de la clínica, más las de `faq_path`."""
+    opens, closes = OFFICE_HOURS
+    offices = "\n".join(f"- {name}" for name in OFFICE_LOCATIONS.values())
+    doctors = "\n".join(f"- {name}" for name in DOCTORS.values())
+    entries = [
+        (
+            ["¿Cuál es su horario?", "horarios", "¿A qué hora abren?", "¿A qué hora cierran?", "¿Hasta qué hora atienden?",
+             "¿Qué días atienden?", "¿Qué días abren?", "¿Abren los domingos?", "horario de atención"],
+            f"{INTRO}Atendemos todos los días de {opens}:00 a {closes}:00, con citas de una hora. "
+            "¿Te gustaría agendar una?",
+        ),
+        (
+            ["¿Dónde están ubicados?", "¿Dónde se encuentran?", "¿Cuál es la dirección?", "dirección", "ubicación", "¿Dónde queda el consultorio?",
+             "¿Dónde están los consultorios?", "¿Dónde queda la clínica?", "¿En qué calle están?"],
+            f"{INTRO}Tenemos dos consultorios:\n{offices}\n\n¿En cuál te gustaría tu cita?",
+        ),
+        (
+            ["¿Qué doctores tienen?", "¿Qué doctores hay?", "¿Qué especialistas tienen?",
+             "¿Qué especialidades manejan?", "¿Con qué médicos cuentan?"],
+            f"{INTRO}Nuestro equipo médico:\n{doctors}\n\n¿Con quién te gustaría agendar?",
+        ),
+    ]
+    for name in DOCTORS.values():
+        specialty = name.partition("(")[2].rstrip(")")
+        if not specialty:
+            continue
+        questions = [f"¿Tienen {specialty}?", f"¿Quién atiende {specialty}?", f"¿Hay doctor de {specialty}?"]
+        for alias in _SPECIALTY_ALIASES.get(specialty.lower(), []):
+            questions += [alias, f"¿Tienen {alias}?"]
+        entries.append((questions, f"{INTRO}Sí, {specialty} la atiende el {name.partition(' (')[0]}. "
+                                   "¿Te gustaría agendar una cita?"))
+    entries += [(item["questions"], item["answer"]) for item in _load_file()]
+    return entries
+
+
+@dataclass
+class FaqItem:
+    entry_id: str
+    questions: list[str]
+    answer: str
+    source: str  # curated | approved
+    fingerprint: str
+    expires_at: float | None = None
+    hits: int = 0
+    vectors: list[dict[int, float]] = field(default_factory=list, repr=False)
+    words: set[str] = field(default_factory=set, repr=False)
+
+    def __post_init__(self):
+        if not self.vectors:
+            self.vectors = [vectorize(question) for question in self.questions]
+        if not self.words:
+            self.words = {word for question in self.questions for word in _tokens(question)}
+
+
+@dataclass
+class FaqCandidate:
+    candidate_id: str
+    question: str
+    answer: str
+    seen: int = 1
+
+
+class FaqCache:
+    def __init__(self):
+        self.entries: dict[str, FaqItem] = {}
+        self.candidates: deque[FaqCandidate] = deque(maxlen=200)
+        self.fingerprint = ""
+        self.checked = 0.0
+
+    def _refresh(self, force: bool = False):
+        """Regenera las curadas y descarta aprobadas de otro catálogo cuando cambia la huella."""
+        if not force and time.monotonic() - self.checked < FINGERPRINT_SECONDS:
+            return
+        self.checked = time.monotonic()
+        fingerprint = catalog_fingerprint()
+        if fingerprint == self.fingerprint:
+            return
+        stale = [key for key, entry in self.entries.items() if entry.source == "curated" or entry.fingerprint != fingerprint]
+        for key in stale:
+            del self.entries[key]
+        for idx, (questions, answer) in enumerate(curated_entries()):
+            self.entries[f"curated-{idx}"] = FaqItem(f"curated-{idx}", questions, answer, "curated", fingerprint)
+        if self.fingerprint:
+            logger.info("faq.catalog_changed", dropped=len(stale), entries=len(self.entries))
+        self.fingerprint = fingerprint
+
+    def lookup(self, text: str) -> tuple[FaqItem, float] | None:
+        """La entrada vigente más parecida si pasa el umbral."""
+        if _needs_triage(text):
+            return None
+        self._refresh()
+        vector = vectorize(text)
+        if not vector:
+            return None
+        words = set(_tokens(text))
+        now = time.time()
+        best, best_score = None, 0.0
+        for key, entry in list(self.entries.items()):
+            if entry.expires_at is not None and entry.expires_at < now:
+                del self.entries[key]
+                continue
+            score = max(cosine(vector, candidate) for candidate in entry.vectors)
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None or best_score < settings.faq_similarity_threshold:
+            return None
+        # La entrada tiene que cubrir casi toda la pregunta, no solo la parte que se parece
+        if len(words & best.words) < settings.faq_min_coverage * len(words):
+            return None
+        best.hits += 1
+        return best, best_score
+
+    def propose(self, question: str, answer: str):
+        """Respuesta del modelo a una primera pregunta informativa: queda para aprobación."""
+        if _needs_triage(question):
+            return
+        vector = vectorize(question)
+        for candidate in self.candidates:
+            if cosine(vector, vectorize(candidate.question)) >= settings.faq_similarity_threshold:
+                candidate.seen += 1
+                return
+        candidate_id = hashlib.sha1(question.encode()).hexdigest()[:10]
+        self.candidates.append(FaqCandidate(candidate_id, question, answer))
+
+    def approve(self, questions: list[str], answer: str, ttl_hours: float | None = None) -> FaqItem:
+        self._refresh(force=True)
+        ttl = settings.faq_ttl_hours if ttl_hours is None else ttl_hours
+        entry_id = "approved-" + hashlib.sha1("\n".join(questions).encode()).hexdigest()[:10]
+        entry = FaqItem(entry_id, questions, answer, "approved", self.fingerprint, time.time() + ttl * 3600)
+        self.entries[entry_id] = entry
+        self.candidates = deque((c for c in self.candidates if c.question not in questions), maxlen=200)
+        try:
+            with SessionLocal() as session:
+                row = FaqEntry(id=entry_id)
+                row.questions = json.dumps(questions, ensure_ascii=False)
+                row.answer = answer
+                row.fingerprint = self.fingerprint
+                row.expires_at = datetime.utcfromtimestamp(entry.expires_at)
+                session.merge(row)
+                session.commit()
+        except SQLAlchemyError as exc:
+            logger.error("faq.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return entry
+
+    def remove(self, entry_id: str) -> bool:
+        entry = self.entries.get(entry_id)
+        if entry is None or entry.source != "approved":
+            return False
+        del self.entries[entry_id]
+        try:
+            with SessionLocal() as session:
+                session.query(FaqEntry).filter(FaqEntry.id == entry_id).delete()
+                session.commit()
+        except SQLAlchemyError as exc:
+            logger.error("faq.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return True
+
+    def restore(self) -> int:
+        """Carga las aprobadas vigentes y del catálogo actual (las demás se borran)."""
+        self._refresh(force=True)
+        now = datetime.utcnow()
+        try:
+            with SessionLocal() as session:
+                session.query(FaqEntry).filter(
+                    (FaqEntry.expires_at < now) | (FaqEntry.fingerprint != self.fingerprint)
+                ).delete(synchronize_session=False)
+                session.commit()
+                rows = session.query(FaqEntry).all()
+                loaded = [(row.id, json.loads(row.questions), row.answer, row.expires_at) for row in rows]
+        except SQLAlchemyError as exc:
+            logger.error("faq.db_error", error=exc.__class__.__name__, detail=str(exc))
+            return 0
+        for entry_id, questions, answer, expires_at in loaded:
+            expires = (expires_at - datetime(1970, 1, 1)) / timedelta(seconds=1)
+            self.entries[entry_id] = FaqItem(entry_id, questions, answer, "approved", self.fingerprint, expires)
+        return len(loaded)
+
+
+faq_cache = FaqCache()
+
+
+def restore_faq() -> int:
+    return faq_cache.restore()
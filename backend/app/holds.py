@@ -0,0 +1,224 @@
+"""
+Holds de horarios ofrecidos (tabla `slot_holds`).
+
+Cuando el bot ofrece horarios a un paciente los reserva unos minutos; otros
+pacientes ya no los ven. Al agendar, `claim_slot` hace un compare-and-claim
+atómico sobre la fila del hold, así dos pacientes nunca se llevan el mismo
+horario aunque Google todavía no muestre el evento. Agendado, la fila queda
+como 'booked' hasta la hora de la cita (o hasta que se cancele): una oferta
+vieja que se conteste tarde ya no puede agendar encima.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .calendar_sync import calendar_sync
+from .clinic import doctor_calendar
+from .config import settings
+from .db import SessionLocal
+from .ledger import to_utc_naive
+from .logs import get_logger
+from .models import Appointment, SlotHold
+
+logger = get_logger(__name__)
+
+# Mientras corre create_event el slot queda bloqueado como máximo este tiempo
+BOOKING_GRACE = timedelta(minutes=2)
+
+
+def hold_resource(doctor: str | None) -> str:
+    """Recurso que se reserva: el calendario donde se agenda al doctor."""
+    return doctor_calendar(doctor)
+
+
+def _slot_start(slot: dict) -> datetime:
+    return to_utc_naive(datetime.fromisoformat(slot["datetime"]))
+
+
+def hold_offered_slots(patient_number: str, doctor: str | None, slots: list[dict], limit: int = 5) -> list[dict]:
+    """
+    Filtra los slots que otro paciente tiene reservados y reserva hasta `limit`
+    para este paciente. Devuelve los slots efectivamente reservados.
+    """
+    if not slots:
+        return []
+    resource = hold_resource(doctor)
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=settings.slot_hold_minutes)
+    starts = [_slot_start(slot) for slot in slots]
+    held = []
+    try:
+        with SessionLocal() as session:
+            # Liberar holds previos del paciente: cada oferta nueva reemplaza la anterior
+            session.query(SlotHold).filter(
+                SlotHold.patient_number == patient_number, SlotHold.status == "held"
+            ).delete(synchronize_session=False)
+            taken = {
+                row.slot_start
+                for row in session.query(SlotHold.slot_start).filter(
+                    SlotHold.resource == resource,
+                    SlotHold.slot_start.in_(starts),
+                    SlotHold.expires_at > now,
+                )
+            }
+            session.query(SlotHold).filter(
+                SlotHold.resource == resource,
+                SlotHold.slot_start.in_(starts),
+                SlotHold.expires_at <= now,
+            ).delete(synchronize_session=False)
+            session.commit()
+
+            for slot, start in zip(slots, starts):
+                if len(held) >= limit:
+                    break
+                if start in taken:
+                    continue
+                try:
+                    session.add(SlotHold(
+                        resource=resource,
+                        slot_start=start,
+                        patient_number=patient_number,
+                        status="held",
+                        expires_at=expires_at,
+                    ))
+                    session.commit()
+                except IntegrityError:
+                    # Otro paciente lo reservó entre la consulta y el insert
+                    session.rollback()
+                    continue
+                held.append(slot)
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return slots[:limit]
+    return held
+
+
+def claim_slot(patient_number: str, doctor: str | None, slot_start: datetime) -> bool:
+    """
+    Compare-and-claim: pasa el hold del paciente a 'booking'. Si el hold ya venció
+    pero nadie más tomó el slot, lo inserta directo. False si el slot es de otro.
+    """
+    resource = hold_resource(doctor)
+    start = to_utc_naive(slot_start)
+    now = datetime.utcnow()
+    try:
+        with SessionLocal() as session:
+            claimed = (
+                session.query(SlotHold)
+                .filter(
+                    SlotHold.resource == resource,
+                    SlotHold.slot_start == start,
+                    or_(
+                        SlotHold.patient_number == patient_number,
+                        SlotHold.expires_at <= now,
+                    ),
+                    # Un 'booking' vigente de otro paciente nunca se roba
+                    or_(SlotHold.status == "held", and_(SlotHold.status == "booking", SlotHold.expires_at <= now)),
+                )
+                .update(
+                    {
+                        "patient_number": patient_number,
+                        "status": "booking",
+                        "expires_at": now + BOOKING_GRACE,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if claimed:
+                session.commit()
+                return True
+            session.add(SlotHold(
+                resource=resource,
+                slot_start=start,
+                patient_number=patient_number,
+                status="booking",
+                expires_at=now + BOOKING_GRACE,
+            ))
+            session.commit()
+            return True
+    except IntegrityError:
+        return False
+    except SQLAlchemyError as exc:
+        # Sin la tabla no hay cómo saber si el slot es de otro: mejor no agendar
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return False
+
+
+def book_slot(patient_number: str, doctor: str | None, slot_start: datetime):
+    """El evento ya está en Google: el claim queda 'booked' hasta la hora de la cita."""
+    start = to_utc_naive(slot_start)
+    try:
+        with SessionLocal() as session:
+            session.query(SlotHold).filter(
+                SlotHold.resource == hold_resource(doctor),
+                SlotHold.slot_start == start,
+                SlotHold.patient_number == patient_number,
+            ).update({"status": "booked", "expires_at": start}, synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def release_booked(event_id: str):
+    """La cita se canceló o se movió: su horario vuelve a poder ofrecerse."""
+    try:
+        with SessionLocal() as session:
+            row = session.query(Appointment).filter(Appointment.event_id == event_id).one_or_none()
+            if row is None or row.start_at is None:
+                return
+            session.query(SlotHold).filter(
+                SlotHold.resource == row.calendar_id,
+                SlotHold.slot_start == row.start_at,
+                SlotHold.status == "booked",
+            ).delete(synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def release_slot(patient_number: str, doctor: str | None, slot_start: datetime):
+    """Suelta el claim si no se pudo crear el evento."""
+    try:
+        with SessionLocal() as session:
+            session.query(SlotHold).filter(
+                SlotHold.resource == hold_resource(doctor),
+                SlotHold.slot_start == to_utc_naive(slot_start),
+                SlotHold.patient_number == patient_number,
+            ).delete(synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def release_patient_holds(patient_number: str):
+    try:
+        with SessionLocal() as session:
+            session.query(SlotHold).filter(
+                SlotHold.patient_number == patient_number, SlotHold.status == "held"
+            ).delete(synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def prune_expired_holds():
+    try:
+        with SessionLocal() as session:
+            session.query(SlotHold).filter(SlotHold.expires_at <= datetime.utcnow()).delete(
+                synchronize_session=False
+            )
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def _release_cancelled(events: list[dict], full_sync: bool):
+    """Listener de CalendarSync: una cita cancelada (por el bot o en Google) libera su 'booked'."""
+    for event in events:
+        if event.get("status") == "cancelled" and event.get("id"):
+            release_booked(event["id"])
+
+
+calendar_sync.subscribe(_release_cancelled)
@@ -0,0 +1,214 @@
+"""
+Journal de operación: eventos estructurados, append-only, en segmentos rotados.
+
+Cada `state.log_event` queda como una línea JSON en el segmento activo
+(`journal_dir/segment-<primer seq>.ndjson`); al pasar `journal_segment_bytes` se
+abre uno nuevo y se borran los más viejos que excedan `journal_max_segments`.
+Los últimos `journal_memory_entries` viven también en memoria, indexados por
+tipo y por paciente, así que /journal y /status no leen disco.
+"""
+
+import bisect
+import json
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Iterator
+
+from .config import settings
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class JournalEntry:
+    seq: int
+    ts: float  # epoch en segundos
+    kind: str
+    detail: str
+    patient: str | None = None
+    doctor: str | None = None
+    latency_ms: float | None = None
+    error: str | None = None  # clase de la excepción
+    trace_id: str | None = None
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+class Journal:
+    def __init__(self, directory: str | None, segment_bytes: int, max_segments: int, memory_entries: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.memory_entries = memory_entries
+        self.entries: dict[int, JournalEntry] = {}
+        self.order: deque[int] = deque()
+        self.by_kind: dict[str, deque[int]] = {}
+        self.by_patient: dict[str, deque[int]] = {}
+        self.last_seq = 0
+        self.listeners = []
+        self._segment = None
+        self._segment_size = 0
+
+    # --- escritura ---
+
+    def append(
+        self,
+        kind: str,
+        detail: str,
+        patient: str | None = None,
+        doctor: str | None = None,
+        latency_ms: float | None = None,
+        error: str | None = None,
+        trace_id: str | None = None,
+    ) -> JournalEntry:
+        self.last_seq += 1
+        entry = JournalEntry(self.last_seq, time.time(), kind, detail, patient, doctor, latency_ms, error, trace_id)
+        self._index(entry)
+        if self.directory:
+            try:
+                self._write(entry)
+            except OSError as exc:
+                # El journal nunca debe tumbar el webhook; queda al menos en memoria
+                logger.error("journal.write_failed", error=exc.__class__.__name__, detail=str(exc))
+        for listener in self.listeners:
+            listener(entry)
+        return entry
+
+    def subscribe(self, listener):
+        """listener(entry) por cada evento nuevo (no se llama al restaurar)."""
+        self.listeners.append(listener)
+
+    def _index(self, entry: JournalEntry):
+        self.entries[entry.seq] = entry
+        self.order.append(entry.seq)
+        self.by_kind.setdefault(entry.kind, deque()).append(entry.seq)
+        if entry.patient:
+            self.by_patient.setdefault(entry.patient, deque()).append(entry.seq)
+        while len(self.order) > self.memory_entries:
+            old = self.entries.pop(self.order.popleft())
+            self._unindex(self.by_kind, old.kind, old.seq)
+            if old.patient:
+                self._unindex(self.by_patient, old.patient, old.seq)
+
+    @staticmethod
+    def _unindex(index: dict[str, deque[int]], key: str, seq: int):
+        # Las entradas salen en orden de seq, así que siempre es la primera del índice
+        seqs = index.get(key)
+        if seqs and seqs[0] == seq:
+            seqs.popleft()
+            if not seqs:
+                del index[key]
+
+    def _write(self, entry: JournalEntry):
+        if self._segment is None or self._segment_size >= self.segment_bytes:
+            self._rotate(entry.seq)
+        line = json.dumps(entry.to_dict(), ensure_ascii=False) + "\n"
+        self._segment.write(line)
+        self._segment.flush()
+        self._segment_size += len(line.encode("utf-8"))
+
+    def _rotate(self, first_seq: int):
+        if self._segment is not None:
+            self._segment.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"segment-{first_seq:012d}.ndjson")
+        self._segment = open(path, "a", encoding="utf-8")
+        self._segment_size = self._segment.tell()
+        for old in self.segments()[: -self.max_segments]:
+            os.remove(old)
+
+    def segments(self) -> list[str]:
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(".ndjson"))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def restore(self) -> int:
+        """Al arrancar: recarga en memoria la cola de los segmentos y continúa el seq."""
+        loaded = 0
+        needed = self.memory_entries
+        lines: list[str] = []
+        for path in reversed(self.segments()):
+            with open(path, encoding="utf-8") as fh:
+                lines = fh.readlines() + lines
+            if len(lines) >= needed:
+                break
+        for line in lines[-needed:]:
+            try:
+                data = json.loads(line)
+                entry = JournalEntry(**data)
+            except (ValueError, TypeError):
+                continue  # línea truncada por un corte
+            self._index(entry)
+            self.last_seq = max(self.last_seq, entry.seq)
+            loaded += 1
+        return loaded
+
+    # --- lectura ---
+
+    def recent(self, limit: int) -> list[JournalEntry]:
+        return [self.entries[seq] for seq in islice(reversed(self.order), limit)]
+
+    def query(
+        self,
+        kind: str | None = None,
+        patient: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        cursor: int | None = None,
+        limit: int = 50,
+    ) -> tuple[list[JournalEntry], int | None]:
+        """
+        Más nuevos primero. `cursor` es el seq desde el que seguir hacia atrás
+        (exclusivo); devuelve el cursor de la siguiente página o None.
+        """
+        if kind is not None and patient is not None:
+            # El índice más chico manda; el otro filtro se aplica al recorrer
+            kinds = self.by_kind.get(kind, deque())
+            patients = self.by_patient.get(patient, deque())
+            seqs: deque[int] = kinds if len(kinds) <= len(patients) else patients
+        elif kind is not None:
+            seqs = self.by_kind.get(kind, deque())
+        elif patient is not None:
+            seqs = self.by_patient.get(patient, deque())
+        else:
+            seqs = self.order
+
+        page: list[JournalEntry] = []
+        for entry in self._walk_back(seqs, cursor):
+            if until is not None and entry.ts >= until:
+                continue
+            if since is not None and entry.ts < since:
+                break  # los seq crecen con el tiempo: lo que sigue es más viejo
+            if (kind is not None and entry.kind != kind) or (patient is not None and entry.patient != patient):
+                continue
+            if len(page) == limit:
+                return page, page[-1].seq
+            page.append(entry)
+        return page, None
+
+    def _walk_back(self, seqs: deque[int], cursor: int | None) -> Iterator[JournalEntry]:
+        walk = reversed(seqs)
+        if cursor is not None:
+            # Los índices están ordenados por seq: saltar directo a la página
+            walk = islice(walk, len(seqs) - bisect.bisect_left(seqs, cursor), None)
+        for seq in walk:
+            entry = self.entries.get(seq)
+            if entry is not None:
+                yield entry
+
+    def counts_by_kind(self) -> dict[str, int]:
+        return {kind: len(seqs) for kind, seqs in self.by_kind.items()}
+
+
+journal = Journal(
+    settings.journal_dir or None,
+    settings.journal_segment_bytes,
+    settings.journal_max_segments,
+    settings.journal_memory_entries,
+)
@@ -0,0 +1,146 @@
+"""
+Ledger local de citas (tabla `appointments`).
+
+Se escribe con el mismo feed de CalendarSync que usan los recordatorios: la cita
+que crea el bot llega por `calendar_sync.notify` y los cambios hechos a mano en
+Google llegan en el siguiente sync incremental. Así cancelar o reagendar es una
+sola consulta por número de paciente, sin recorrer descripciones en Google.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .calendar_sync import calendar_sync
+from .config import settings
+from .db import SessionLocal
+from .logs import get_logger
+from .models import Appointment
+from .patient_reminders import PatientAppointment, appointment_from_event, patient_index
+from .services.calendar import CalendarClient
+
+logger = get_logger(__name__)
+
+_DESCRIPTION_REASON = re.compile(r"Motivo:\s*(.+)")
+
+
+def to_utc_naive(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def from_utc_naive(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(settings.scheduler_timezone))
+
+
+def _to_appointment(row: Appointment) -> PatientAppointment:
+    return PatientAppointment(
+        event_id=row.event_id,
+        patient_number=row.patient_number,
+        doctor=row.doctor,
+        office=row.office,
+        start=from_utc_naive(row.start_at),
+        confirmed=row.status == "confirmed",
+        calendar_id=row.calendar_id,
+    )
+
+
+def _upsert_from_event(session, event: dict, now: datetime):
+    row = session.query(Appointment).filter(Appointment.event_id == event.get("id")).one_or_none()
+    appt = appointment_from_event(event)
+    if appt is None:
+        if row is not None and event.get("status") == "cancelled":
+            row.status = "cancelled"
+            row.updated_at = now
+        return
+    _, end = CalendarClient.event_start_end(event)
+    reason = _DESCRIPTION_REASON.search(event.get("description") or "")
+    if row is None:
+        row = Appointment(event_id=appt.event_id, created_at=now)
+        session.add(row)
+    row.calendar_id = appt.calendar_id
+    row.patient_number = appt.patient_number
+    row.doctor = appt.doctor
+    row.office = appt.office
+    row.start_at = to_utc_naive(appt.start)
+    row.end_at = to_utc_naive(end) if end else None
+    row.status = "confirmed" if appt.confirmed else "booked"
+    row.symptoms = reason.group(1).strip() if reason else row.symptoms
+    row.updated_at = now
+
+
+def reconcile_events(events: list[dict], full_sync: bool):
+    """Aplica al ledger solo los eventos que cambiaron (listener de CalendarSync)."""
+    now = datetime.utcnow()
+    try:
+        with SessionLocal() as session:
+            for event in events:
+                _upsert_from_event(session, event, now)
+            if full_sync:
+                # Lo que ya no está en Google desde ayer en adelante se canceló
+                seen = [ev.get("id") for ev in events if ev.get("id")]
+                stale = session.query(Appointment).filter(
+                    Appointment.start_at >= now - timedelta(days=1),
+                    Appointment.status != "cancelled",
+                )
+                if seen:
+                    stale = stale.filter(Appointment.event_id.notin_(seen))
+                stale.update({"status": "cancelled", "updated_at": now}, synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("ledger.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+calendar_sync.subscribe(reconcile_events)
+
+
+def find_next_appointment(patient_number: str, now: datetime | None = None) -> PatientAppointment | None:
+    """Próxima cita activa del paciente (una consulta sobre el índice paciente+inicio)."""
+    now = now or datetime.now(ZoneInfo(settings.scheduler_timezone))
+    try:
+        with SessionLocal() as session:
+            row = (
+                session.query(Appointment)
+                .filter(
+                    Appointment.patient_number == patient_number,
+                    Appointment.start_at > to_utc_naive(now),
+                    Appointment.status != "cancelled",
+                )
+                .order_by(Appointment.start_at)
+                .first()
+            )
+            return _to_appointment(row) if row else None
+    except SQLAlchemyError as exc:
+        logger.error("ledger.db_error", error=exc.__class__.__name__, detail=str(exc))
+    # Sin base usamos el índice en memoria de los recordatorios
+    upcoming = patient_index.upcoming_for(patient_number, now)
+    return upcoming[0] if upcoming else None
+
+
+async def cancel_appointment(event_id: str, calendar_id: str | None = None, calendar: CalendarClient | None = None):
+    calendar = calendar or CalendarClient()
+    await calendar.delete_event(event_id, calendar_id=calendar_id)
+    calendar_sync.notify([{"id": event_id, "status": "cancelled"}], calendar_id=calendar_id)
+
+
+async def reschedule_appointment(
+    event_id: str,
+    new_start: datetime,
+    calendar_id: str | None = None,
+    calendar: CalendarClient | None = None,
+) -> dict:
+    calendar = calendar or CalendarClient()
+    new_end = new_start + timedelta(hours=1)
+    event = await calendar.patch_event(
+        event_id,
+        {
+            "start": {"dateTime": new_start.isoformat(), "timeZone": settings.scheduler_timezone},
+            "end": {"dateTime": new_end.isoformat(), "timeZone": settings.scheduler_timezone},
+            # Al mover la cita se pierde la confirmación previa
+            "extendedProperties": {"private": {"confirmed": "false"}},
+        },
+        calendar_id=calendar_id,
+    )
+    calendar_sync.notify([event], calendar_id=calendar_id)
+    return event
@@ -0,0 +1,78 @@
+"""
+Logs estructurados: una línea JSON por evento con trace_id/span_id de la traza
+en curso, para poder seguir un mensaje de punta a punta.
+
+    logger = get_logger(__name__)
+    logger.error("holds.db_error", error=exc.__class__.__name__, detail=str(exc))
+"""
+
+import json
+import logging
+import sys
+
+from .config import settings
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        # Import tardío: tracing también usa este módulo
+        from .tracing import current_span_id, current_trace_id
+
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", {}))
+        trace_id = current_trace_id()
+        if trace_id:
+            data["trace_id"] = trace_id
+            span_id = current_span_id()
+            if span_id:
+                data["span_id"] = span_id
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class StructuredLogger:
+    """logger.info("evento", campo=valor, ...) sobre logging estándar."""
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: dict, exc_info: bool = False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        """Como error() pero con el traceback de la excepción en curso."""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def configure_logging():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger("app")
+    root.handlers[:] = [handler]
+    root.setLevel(settings.log_level.upper())
+    root.propagate = False
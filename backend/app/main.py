@@ -1,27 +1,77 @@
+import time
+
+IMPORTS_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from .logs import configure_logging
+
+configure_logging()
+
+from .db import init_db
+from .dedup import restore_message_index
+from .email_triage import restore_triage_model
+from .faq import restore_faq
+from .journal import journal
+from .metrics import MetricsMiddleware
+from .services.ai import close_ai_client
+from .startup import startup
+from .waitlist import restore_waitlist
+
+from .routes.admin import router as admin_router
 from .routes.health import router as health_router
 from .routes.oauth import router as oauth_router
 from .routes.gmail import router as gmail_router
 from .routes.calendar import router as calendar_router
-from .scheduler import start_scheduler, schedule_gmail_poll, schedule_calendar_checks
+from .routes.journal import router as journal_router
+from .scheduler import start_scheduler, schedule_gmail_poll, schedule_calendar_checks, schedule_maintenance
 from .routes.whatsapp import router as whatsapp_router
 
+startup.started = IMPORTS_STARTED
+startup.mark("imports", IMPORTS_STARTED)
+
 
-app = FastAPI(title="Agenda Agent")
+def start_jobs():
+    start_scheduler()
+    schedule_gmail_poll()
+    schedule_calendar_checks()
+    schedule_maintenance()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # /health contesta ya; base, índices y SDK se calientan en segundo plano
+    warmup = startup.warm(
+        {
+            "restore_message_index": restore_message_index,
+            "restore_waitlist": restore_waitlist,
+            "restore_triage_model": restore_triage_model,
+            "restore_faq": restore_faq,
+        },
+        init_db=init_db,
+        journal_restore=journal.restore,
+        start_jobs=start_jobs,
+    )
+    try:
+        yield
+    finally:
+        if not warmup.done():
+            warmup.cancel()
+        await close_ai_client()
+
+
+app = FastAPI(title="Agenda Agent", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health_router)
 app.include_router(oauth_router)
 app.include_router(gmail_router)
 app.include_router(calendar_router)
 app.include_router(whatsapp_router)
-
-
-@app.on_event("startup")
-async def startup():
-    start_scheduler()
-    schedule_gmail_poll()
-    schedule_calendar_checks()
+app.include_router(journal_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
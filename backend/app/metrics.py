@@ -0,0 +1,289 @@
+"""
+Métricas en proceso con salida en formato de texto de Prometheus (/metrics).
+
+Contadores e histogramas de buckets fijos guardados en dicts por tupla de
+labels: registrar una observación es un bisect y dos sumas, sin locks ni
+librerías extra. Los tamaños de estado son gauges que se leen al momento del
+scrape.
+"""
+
+import bisect
+import functools
+import inspect
+import time
+from typing import Callable
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+
+from .profiler import profiler
+from .recorder import current_turn
+from .tracing import span
+
+_INF = 'le="+Inf"'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [conteos por bucket (no acumulados) + overflow, suma, total]
+        self.series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q: float, *labels: str) -> float | None:
+        """Aproximación por bucket (cota superior), útil para benchmarks."""
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return None
+        target = q * series[2]
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.series.items():
+            running = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                le = _label_text(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {running}")
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, _INF)} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Valor leído en cada scrape con `collect() -> {labels: valor}`."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...], collect: Callable[[], dict]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect().items():
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...], collect: Callable[[], dict]) -> Gauge:
+        metric = Gauge(name, help_text, labelnames, collect)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+ai_seconds = registry.histogram("ai_request_seconds", "Latencia de AIClient por método", ("method",))
+ai_tokens = registry.counter("ai_tokens_total", "Tokens de OpenAI por método y tipo", ("method", "kind"))
+ai_errors = registry.counter("ai_errors_total", "Errores de AIClient", ("method", "error"))
+google_seconds = registry.histogram("google_api_seconds", "Latencia de llamadas a Google", ("api", "method"))
+google_errors = registry.counter("google_api_errors_total", "Errores de llamadas a Google", ("api", "method", "error"))
+google_retries = registry.counter("google_api_retries_total", "Reintentos a Google por error transitorio", ("api", "status"))
+google_batch_size = registry.histogram(
+    "google_api_batch_size", "Requests por round trip a Google", ("api",), buckets=(1, 2, 5, 10, 20, 50)
+)
+google_queue_wait = registry.histogram("google_api_queue_seconds", "Espera en la cola de Google", ("api", "priority"))
+briefing_requests = registry.counter("briefing_requests_total", "Resúmenes pedidos por el dueño, desde caché o armados", ("source",))
+faq_lookups = registry.counter("faq_lookups_total", "Primeros mensajes contra la caché de FAQ", ("result",))
+date_parse = registry.counter("date_parse_total", "Fechas pedidas por pacientes, por quién las resolvió", ("source",))
+email_triage = registry.counter("email_triage_total", "Correos por decisión del triage local", ("verdict", "reason"))
+gateway_seconds = registry.histogram("gateway_send_seconds", "Latencia de envío al gateway de WhatsApp")
+gateway_errors = registry.counter("gateway_send_errors_total", "Errores de envío al gateway", ("error",))
+http_seconds = registry.histogram("http_request_seconds", "Latencia por ruta", ("route", "method", "status"))
+job_seconds = registry.histogram("scheduler_job_seconds", "Duración de jobs del scheduler", ("job",))
+job_lag = registry.histogram("scheduler_job_lag_seconds", "Retraso entre la hora programada y la ejecución", ("job",))
+job_errors = registry.counter("scheduler_job_errors_total", "Jobs que terminaron con excepción", ("job",))
+
+
+def timed(
+    histogram: Histogram,
+    errors: Counter,
+    *labels: str,
+    span_name: str | None = None,
+    capture_args: bool = False,
+):
+    """
+    Decorador para funciones sync o async: latencia y errores por clase de
+    excepción, y un span hijo de la traza en curso (nombre = labels con puntos).
+    Las async además pasan por el turno grabado/reproducido si hay uno
+    (`capture_args` guarda también los argumentos, p. ej. el mensaje saliente).
+    """
+    name = span_name or ".".join(labels)
+
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    with span(name):
+                        turn = current_turn()
+                        if turn is not None:
+                            return await turn.through(name, func, args, kwargs, capture_args=capture_args)
+                        return await func(*args, **kwargs)
+                except Exception as exc:
+                    errors.inc(*labels, exc.__class__.__name__)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(name):
+                    return func(*args, **kwargs)
+            except Exception as exc:
+                errors.inc(*labels, exc.__class__.__name__)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels)
+
+        return wrapper
+
+    return decorate
+
+
+def record_usage(method: str, response) -> dict:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    tokens = {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+    ai_tokens.inc(method, "prompt", value=tokens["prompt_tokens"])
+    ai_tokens.inc(method, "completion", value=tokens["completion_tokens"])
+    return tokens
+
+
+class MetricsMiddleware:
+    """ASGI puro (no BaseHTTPMiddleware) para no bufferear /status/stream."""
+
+    def __init__(self, app):
+        self.app = app
+        self.paths: dict = {}
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self.paths.get(endpoint)
+        if path is None:
+            # Plantilla de la ruta ("/oauth/callback"), nunca la URL cruda: cardinalidad acotada
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self.paths[endpoint] = path = path or "unmatched"
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route_path(scope)
+            http_seconds.observe(time.perf_counter() - started, route, scope["method"], status[0])
+            if profiler.active and route != "/admin/profile":
+                profiler.request_finished()
+
+
+def observe_scheduler(scheduler) -> None:
+    """Duración y retraso de cada job a partir de los eventos de APScheduler."""
+    submitted: dict[str, float] = {}
+
+    def on_event(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            submitted[event.job_id] = time.perf_counter()
+            if event.scheduled_run_times:
+                lag = time.time() - event.scheduled_run_times[-1].timestamp()
+                job_lag.observe(max(lag, 0.0), event.job_id)
+            return
+        started = submitted.pop(event.job_id, None)
+        if started is not None:
+            job_seconds.observe(time.perf_counter() - started, event.job_id)
+        if event.code == EVENT_JOB_ERROR:
+            job_errors.inc(event.job_id)
+
+    scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
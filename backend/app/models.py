@@ -0,0 +1,104 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, UniqueConstraint
+
+from .db import Base
+
+
+class ProcessedMessage(Base):
+    """Message IDs de WhatsApp ya procesados (dedup de reintentos del gateway)."""
+
+    __tablename__ = "processed_messages"
+
+    message_hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    seen_at = Column(DateTime, nullable=False, index=True)
+
+
+class SentReminder(Base):
+    """Recordatorios ya enviados; sobrevive reinicios para no repetir avisos."""
+
+    __tablename__ = "sent_reminders"
+
+    key = Column(String(255), primary_key=True)
+    sent_at = Column(DateTime, nullable=False, index=True)
+
+
+class Appointment(Base):
+    """Ledger local de citas agendadas por el bot (espejo de Google Calendar)."""
+
+    __tablename__ = "appointments"
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String(255), nullable=False, unique=True)
+    calendar_id = Column(String(255), nullable=True)
+    patient_number = Column(String(32), nullable=False)
+    doctor = Column(String(32), nullable=True)
+    office = Column(String(32), nullable=True)
+    # Fechas en UTC sin tzinfo (igual que el resto de tablas)
+    start_at = Column(DateTime, nullable=False)
+    end_at = Column(DateTime, nullable=True)
+    status = Column(String(16), nullable=False, default="booked")  # booked | confirmed | cancelled
+    symptoms = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_appointments_patient_start", "patient_number", "start_at"),
+        Index("ix_appointments_doctor_start", "doctor", "start_at"),
+        Index("ix_appointments_office_start", "office", "start_at"),
+        Index("ix_appointments_start", "start_at"),
+    )
+
+
+class SlotHold(Base):
+    """Reserva temporal de un horario ofrecido a un paciente (evita doble booking)."""
+
+    __tablename__ = "slot_holds"
+
+    id = Column(Integer, primary_key=True)
+    resource = Column(String(255), nullable=False)  # calendario donde se agenda el slot
+    slot_start = Column(DateTime, nullable=False)
+    patient_number = Column(String(32), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default="held")  # held | booking | booked
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("resource", "slot_start", name="uq_slot_holds_resource_start"),)
+
+
+class WaitlistEntry(Base):
+    """Paciente esperando un horario que se libere (doctor + ventana de fechas)."""
+
+    __tablename__ = "waitlist"
+
+    id = Column(Integer, primary_key=True)
+    patient_number = Column(String(32), nullable=False, index=True)
+    doctor = Column(String(32), nullable=True)
+    office = Column(String(32), nullable=True)
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False, index=True)
+    priority = Column(Integer, nullable=False, default=0)  # menor = primero
+    status = Column(String(16), nullable=False, default="waiting")  # waiting | offered | booked | expired
+    offered_slot = Column(DateTime, nullable=True)
+    offered_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class EmailTriageFeature(Base):
+    """Conteos del clasificador de triage: cuántas veces el dueño ignoró o atendió cada rasgo."""
+
+    __tablename__ = "email_triage_features"
+
+    feature = Column(String(255), primary_key=True)  # from:addr | domain:dom | w:token
+    ignored = Column(Integer, nullable=False, default=0)
+    kept = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class FaqEntry(Base):
+    """Respuesta frecuente aprobada; vale mientras no venza ni cambie el catálogo de la clínica."""
+
+    __tablename__ = "faq_entries"
+
+    id = Column(String(32), primary_key=True)
+    questions = Column(Text, nullable=False)  # JSON: lista de preguntas de ejemplo
+    answer = Column(Text, nullable=False)
+    fingerprint = Column(String(16), nullable=False)  # huella del catálogo al aprobarla
+    expires_at = Column(DateTime, nullable=False, index=True)
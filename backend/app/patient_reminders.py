@@ -0,0 +1,194 @@
+"""
+Recordatorios para pacientes ("tu cita es mañana") y sus respuestas.
+
+Las citas agendadas por el bot llevan el número del paciente en
+extendedProperties.private, así que el índice por paciente se arma con el mismo
+feed incremental de CalendarSync, sin una llamada a Google por evento. Los
+envíos salen por el dispatcher con rate limit.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from .calendar_sync import calendar_sync
+from .clinic import DOCTORS, OFFICE_LOCATIONS
+from .config import settings
+from .reminders import ReminderEngine, claim_reminder
+from .services.calendar import CalendarClient
+
+PATIENT_OFFSETS = (1440, 60)
+
+# Citas viejas (antes de extendedProperties) solo tienen el número en la descripción
+_DESCRIPTION_PATIENT = re.compile(r"Paciente:\s*(\d+)")
+
+CONFIRM_WORDS = {"confirmo", "confirmar", "confirmado", "si confirmo", "confirmo mi cita", "confirmo cita"}
+CANCEL_WORDS = {"cancelar", "cancelo", "cancela", "cancelar cita", "cancelo mi cita", "cancelar mi cita"}
+
+
+@dataclass
+class PatientAppointment:
+    event_id: str
+    patient_number: str
+    doctor: str | None
+    office: str | None
+    start: datetime
+    confirmed: bool = False
+    calendar_id: str | None = None
+
+
+def appointment_from_event(event: dict) -> PatientAppointment | None:
+    if event.get("status") == "cancelled" or "dateTime" not in event.get("start", {}):
+        return None
+    private = event.get("extendedProperties", {}).get("private", {})
+    patient = private.get("patient_number")
+    if not patient:
+        match = _DESCRIPTION_PATIENT.search(event.get("description") or "")
+        patient = match.group(1) if match else None
+    if not patient:
+        return None
+    start, _ = CalendarClient.event_start_end(event)
+    start = start.astimezone(ZoneInfo(settings.scheduler_timezone))
+    return PatientAppointment(
+        event_id=event["id"],
+        patient_number=patient,
+        doctor=private.get("doctor"),
+        office=private.get("office"),
+        start=start,
+        confirmed=private.get("confirmed") == "true",
+        calendar_id=event.get("_calendar_id") or private.get("calendar_id"),
+    )
+
+
+def normalize_reply(text: str) -> str:
+    clean = unicodedata.normalize("NFKD", (text or "").lower())
+    clean = "".join(ch for ch in clean if not unicodedata.combining(ch))
+    clean = re.sub(r"[^a-z0-9 ]", " ", clean)
+    return " ".join(clean.split())
+
+
+def parse_reminder_reply(text: str) -> str | None:
+    """Devuelve 'confirm' | 'cancel' si el texto es una respuesta corta al recordatorio."""
+    clean = normalize_reply(text)
+    if clean in CONFIRM_WORDS:
+        return "confirm"
+    if clean in CANCEL_WORDS:
+        return "cancel"
+    return None
+
+
+class PatientReminderIndex:
+    def __init__(self):
+        self.engine = ReminderEngine(offsets=PATIENT_OFFSETS)
+        self.appointments: dict[str, PatientAppointment] = {}
+        self.by_patient: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.appointments)
+
+    def upsert_event(self, event: dict, now: datetime) -> bool:
+        appt = appointment_from_event(event)
+        if appt is None:
+            return self.remove(event.get("id"))
+        previous = self.appointments.get(appt.event_id)
+        if previous and previous.patient_number != appt.patient_number:
+            self._unlink(previous)
+        self.appointments[appt.event_id] = appt
+        self.by_patient.setdefault(appt.patient_number, set()).add(appt.event_id)
+        return self.engine.upsert_event(event, now)
+
+    def remove(self, event_id: str | None) -> bool:
+        appt = self.appointments.pop(event_id, None) if event_id else None
+        if appt is None:
+            return False
+        self._unlink(appt)
+        return self.engine.remove_event(event_id)
+
+    def _unlink(self, appt: PatientAppointment):
+        ids = self.by_patient.get(appt.patient_number)
+        if ids is not None:
+            ids.discard(appt.event_id)
+            if not ids:
+                del self.by_patient[appt.patient_number]
+
+    def reset(self, keep_ids: set[str]):
+        """Tras un sync completo, descarta las citas que ya no existen."""
+        for event_id in [k for k in self.appointments if k not in keep_ids]:
+            self.remove(event_id)
+
+    def upcoming_for(self, patient_number: str, now: datetime, within: timedelta | None = None) -> list[PatientAppointment]:
+        appts = [
+            self.appointments[event_id]
+            for event_id in self.by_patient.get(patient_number, ())
+            if self.appointments[event_id].start > now
+        ]
+        if within is not None:
+            appts = [a for a in appts if a.start - now <= within]
+        return sorted(appts, key=lambda a: a.start)
+
+    def pop_due(self, now: datetime) -> list[tuple[PatientAppointment, int]]:
+        due = []
+        for target, offset in self.engine.pop_due(now):
+            appt = self.appointments.get(target.event_id)
+            if appt:
+                due.append((appt, offset))
+        return due
+
+
+def patient_reminder_key(appt: PatientAppointment, offset: int) -> str:
+    return f"patient:{appt.event_id}:{offset}:{appt.start.isoformat()}"
+
+
+def claim_patient_reminder(appt: PatientAppointment, offset: int) -> bool:
+    return claim_reminder(patient_reminder_key(appt, offset))
+
+
+def reminder_text(appt: PatientAppointment, offset: int) -> str:
+    doctor = DOCTORS.get(appt.doctor or "", "tu doctor")
+    office = OFFICE_LOCATIONS.get(appt.office or "")
+    place = f" en {office}" if office else ""
+    hour = appt.start.strftime("%H:%M")
+    if offset >= 1440:
+        return (
+            f"Hola! Te recordamos que tu cita con {doctor} es mañana a las {hour}{place}.\n\n"
+            "Responde *confirmo* para confirmarla o *cancelar* si no podrás asistir."
+        )
+    return f"Tu cita con {doctor} es en 1 hora (a las {hour}){place}. ¡Te esperamos!"
+
+
+patient_index = PatientReminderIndex()
+
+
+async def handle_reminder_reply(patient_number: str, text: str) -> str | None:
+    """
+    Atiende "confirmo"/"cancelar" si el paciente tiene una cita en las próximas
+    25h. Devuelve el texto de respuesta, o None si el mensaje no es una respuesta
+    al recordatorio y debe seguir el flujo normal.
+    """
+    reply = parse_reminder_reply(text)
+    if reply is None:
+        return None
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    upcoming = patient_index.upcoming_for(patient_number, now, within=timedelta(hours=25))
+    if not upcoming:
+        return None
+    appt = upcoming[0]
+    doctor = DOCTORS.get(appt.doctor or "", "tu doctor")
+    when = appt.start.strftime("%d/%m a las %H:%M")
+    calendar = CalendarClient()
+    if reply == "confirm":
+        event = await calendar.patch_event(
+            appt.event_id,
+            {"extendedProperties": {"private": {"confirmed": "true"}}},
+            calendar_id=appt.calendar_id,
+        )
+        calendar_sync.notify([event], calendar_id=appt.calendar_id)
+        return f"¡Gracias! Tu cita con {doctor} el {when} queda confirmada."
+    await calendar.delete_event(appt.event_id, calendar_id=appt.calendar_id)
+    calendar_sync.notify([{"id": appt.event_id, "status": "cancelled"}], calendar_id=appt.calendar_id)
+    return (
+        f"Listo, cancelé tu cita con {doctor} del {when}. "
+        "Si quieres agendar otra fecha, escríbeme."
+    )
@@ -0,0 +1,125 @@
+"""
+Profiler por muestreo para el proceso en vivo.
+
+Un hilo aparte lee `sys._current_frames()` cada `interval` y cuenta las pilas en
+formato "collapsed" (raíz;...;hoja N), que es lo que consumen flamegraph.pl y
+speedscope. Apagado no cuesta nada: no hay hooks de profile/trace instalados.
+
+Cada muestra se etiqueta con la ruta o el job del scheduler que la originó,
+reconociendo el code object del endpoint/job en la pila, así que no hace falta
+instrumentar las rutas ni los jobs.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Hojas en estas librerías = hilo esperando (loop en select, pool ocioso)
+_IDLE_MODULES = {"selectors", "threading", "queue", "concurrent.futures.thread"}
+
+
+def _code_of(func):
+    func = getattr(func, "__func__", func)
+    func = getattr(func, "__wrapped__", func)
+    return getattr(func, "__code__", None)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.active = False
+        self.samples: Counter[str] = Counter()
+        self.idle_samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self.requests_left: int | None = None
+        self._tags: dict = {}
+        self._labels: dict = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(
+        self,
+        seconds: float,
+        interval: float = 0.005,
+        max_requests: int | None = None,
+        routes: list | None = None,
+        jobs: list | None = None,
+    ) -> bool:
+        """Arranca una sesión; False si ya hay una corriendo."""
+        if self.active:
+            return False
+        self.samples = Counter()
+        self.idle_samples = 0
+        self.requests_left = max_requests
+        self._tags = {}
+        for route in routes or []:
+            code = _code_of(getattr(route, "endpoint", None))
+            if code is not None:
+                self._tags[code] = f"route:{route.path}"
+        for job in jobs or []:
+            code = _code_of(job.func)
+            if code is not None:
+                self._tags[code] = f"job:{job.id}"
+        self._stop.clear()
+        self.active = True
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, args=(seconds, interval), name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def request_finished(self):
+        """Lo llama el middleware de métricas; corta la sesión tras N requests."""
+        if self.requests_left is None:
+            return
+        self.requests_left -= 1
+        if self.requests_left <= 0:
+            self._stop.set()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, seconds: float, interval: float):
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        try:
+            while not self._stop.wait(interval) and time.monotonic() < deadline:
+                self._sample(me)
+        finally:
+            self.duration = time.monotonic() - self.started_at
+            self.active = False
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+            label = self._labels[code] = f"{module}:{code.co_name}"
+        return label
+
+    def _sample(self, me: int):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            if frame.f_globals.get("__name__") in _IDLE_MODULES:
+                self.idle_samples += 1
+                continue
+            stack = []
+            tag = None
+            while frame is not None:
+                if tag is None:
+                    tag = self._tags.get(frame.f_code)
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(tag or "untagged")
+            stack.reverse()
+            self.samples[";".join(stack)] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+profiler = SamplingProfiler()
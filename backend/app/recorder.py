@@ -0,0 +1,244 @@
+"""
+Grabación y reproducción de turnos de WhatsApp.
+
+Con `record_dir` configurado, cada turno de whatsapp_incoming deja una línea
+NDJSON con la entrada, el estado de la conversación antes del turno, y en orden
+cada llamada a upstream (modelo, Google, gateway) con su resultado, más el
+resultado del turno. Los números de teléfono se cambian por alias estables
+(HMAC, solo dígitos) antes de escribir.
+
+El hook vive en `metrics.timed` y en `AIClient._complete`, que ya envuelven
+todas las llamadas externas. scripts/replay_conversations.py instala un turno
+en modo "replay" que devuelve las respuestas grabadas en vez de llamar afuera.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from .config import settings
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+FORMAT_VERSION = 1
+# Otros teléfonos dentro de texto libre (el del paciente se reemplaza en todo el registro)
+_PHONE_RE = re.compile(r"(?<!\d)\+?\d{10,13}(?!\d)")
+
+
+class ReplayMismatch(Exception):
+    """El código pidió un upstream que no está (o ya se consumió) en la grabación."""
+
+
+class RecordedUpstreamError(Exception):
+    """Error grabado de un upstream, re-lanzado durante la reproducción."""
+
+
+# --- Codificación: JSON con marcas para lo que JSON no tiene ---
+
+def encode(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): encode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, tuple):
+        return {"$tuple": [encode(v) for v in value]}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, BaseModel):
+        return encode(value.model_dump())
+    # Respuestas HTTP del gateway y similares: no hacen falta para reproducir
+    return None
+
+
+def decode(value):
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        if "$tuple" in value:
+            return tuple(decode(v) for v in value["$tuple"])
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        return {k: decode(v) for k, v in value.items()}
+    return value
+
+
+def phone_alias(number: str) -> str:
+    """Alias estable de solo dígitos (el route normaliza a dígitos), prefijo 000."""
+    digest = hmac.new(settings.record_salt.encode(), number.encode(), hashlib.sha256).hexdigest()
+    return f"000{int(digest[:16], 16) % 10**10:010d}"
+
+
+def _mask_phones(text: str) -> str:
+    return _PHONE_RE.sub(lambda m: phone_alias("".join(ch for ch in m.group() if ch.isdigit())), text)
+
+
+# --- Turno en curso ---
+
+class Turn:
+    __slots__ = ("mode", "patient", "started", "calls", "expected", "closed")
+
+    def __init__(self, mode: str, patient: str, expected: list[dict] | None = None):
+        self.mode = mode  # record | replay
+        self.patient = patient
+        self.started = time.time()
+        self.calls: list[dict] = []
+        self.expected = deque(expected or [])
+        # Tareas creadas durante el turno heredan el contextvar; al cerrar dejan de grabarse
+        self.closed = False
+
+    async def through(self, name: str, func, args: tuple, kwargs: dict, capture_args: bool = False,
+                      to_json=encode, from_json=decode):
+        entry = {"call": name}
+        if capture_args:
+            entry["args"] = encode(list(args[1:]))  # sin self
+        self.calls.append(entry)
+        if self.mode == "replay":
+            recorded = self._take(name)
+            if "error" in recorded:
+                raise RecordedUpstreamError(recorded["error"])
+            return from_json(recorded.get("result"))
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as exc:
+            entry["error"] = f"{exc.__class__.__name__}: {exc}"
+            raise
+        entry["result"] = to_json(result)
+        return result
+
+    def _take(self, name: str) -> dict:
+        # La siguiente llamada grabada con ese nombre; el orden se compara aparte
+        for idx, recorded in enumerate(self.expected):
+            if recorded["call"] == name:
+                del self.expected[idx]
+                return recorded
+        raise ReplayMismatch(name)
+
+
+_turn: ContextVar[Turn | None] = ContextVar("recorded_turn", default=None)
+
+
+def current_turn() -> Turn | None:
+    turn = _turn.get()
+    return turn if turn is not None and not turn.closed else None
+
+
+@contextmanager
+def use_turn(turn: Turn):
+    token = _turn.set(turn)
+    try:
+        yield turn
+    finally:
+        turn.closed = True
+        _turn.reset(token)
+
+
+# --- Estado de la conversación ---
+
+def snapshot(patient: str) -> dict:
+    from .state import state
+
+    conversation = state.get_appointment_conversation(patient)
+    return {
+        "conversation": encode(asdict(conversation)) if conversation else None,
+        "history": [[m.role, m.content, m.ts] for m in state.get_conversation_history(patient)],
+        "pending": [encode(asdict(action)) for action in state.get_pending_items(patient)],
+    }
+
+
+def restore(patient: str, data: dict):
+    from .state import AppointmentConversation, HistoryMessage, PendingEmailAction, state
+
+    state.clear_appointment_conversation(patient)
+    state.clear_conversation_history(patient)
+    state.clear_pending(patient)
+    if data.get("conversation"):
+        conversation = AppointmentConversation(**decode(data["conversation"]))
+        state.appointment_conversations.set(patient, conversation)
+    if data.get("history"):
+        state.conversation_history.set(
+            patient, deque((HistoryMessage(role, content, ts) for role, content, ts in data["history"]), maxlen=20)
+        )
+    if data.get("pending"):
+        state.set_pending_digest(patient, [PendingEmailAction(**decode(item)) for item in data["pending"]])
+
+
+# --- Escritura ---
+
+class TurnRecorder:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.written = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def anonymize(self, record: dict, number: str) -> str:
+        record["input"]["text"] = _mask_phones(record["input"]["text"])
+        for item in record["state"]["history"]:
+            item[1] = _mask_phones(item[1])
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        digits = "".join(ch for ch in number if ch.isdigit())
+        for raw in {number, digits, settings.owner_whatsapp_number} - {"", "CHANGE_ME"}:
+            line = line.replace(raw, phone_alias("".join(ch for ch in raw if ch.isdigit())))
+        return line
+
+    def write(self, turn: Turn, message, snapshot_before: dict, result: dict | None, elapsed_ms: float):
+        record = {
+            "v": FORMAT_VERSION,
+            "ts": round(turn.started, 3),
+            "input": message.model_dump(),
+            "state": snapshot_before,
+            "calls": turn.calls,
+            "result": encode(result),
+            "ms": round(elapsed_ms, 1),
+        }
+        try:
+            line = self.anonymize(record, message.from_number)
+            path = os.path.join(self.directory, f"turns-{datetime.utcfromtimestamp(turn.started):%Y%m%d}.ndjson")
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+                self.written += 1
+        except (OSError, TypeError, ValueError) as exc:
+            logger.warning("recorder.write_failed", error=exc.__class__.__name__, detail=str(exc))
+
+
+recorder = TurnRecorder(settings.record_dir)
+
+
+@contextmanager
+def record_turn(message, patient: str):
+    """
+    Envuelve un turno de whatsapp_incoming. Si ya hay un turno instalado (replay)
+    o la grabación está apagada, no hace nada. El caller deja el resultado en
+    `holder["result"]`.
+    """
+    holder: dict = {}
+    if _turn.get() is not None or not recorder.enabled:
+        yield holder
+        return
+    before = snapshot(patient)
+    turn = Turn("record", patient)
+    started = time.perf_counter()
+    try:
+        with use_turn(turn):
+            yield holder
+    finally:
+        recorder.write(turn, message, before, holder.get("result"), (time.perf_counter() - started) * 1000)
@@ -0,0 +1,157 @@
+"""
+Motor de recordatorios del calendario.
+
+En lugar de consultar Google cada minuto y buscar eventos a ±1 minuto de cada
+offset, se calcula la hora exacta de cada recordatorio cuando el evento entra
+o cambia (ver CalendarSync) y se guarda en un heap. El scheduler programa un
+solo job para el siguiente vencimiento.
+"""
+
+import heapq
+import itertools
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .db import SessionLocal
+from .logs import get_logger
+from .models import SentReminder
+from .services.calendar import CalendarClient
+
+logger = get_logger(__name__)
+
+REMINDER_OFFSETS = (1440, 60, 10)
+REMINDER_LABELS = {1440: "24h", 60: "1h", 10: "10 min"}
+
+# Un tick que llega tarde todavía dispara el recordatorio si no pasó más de esto
+LATE_GRACE = timedelta(minutes=5)
+
+
+@dataclass
+class ReminderTarget:
+    event_id: str
+    start: datetime
+    summary: str
+    location: str | None
+    attendees: str
+    version: int
+
+
+class ReminderEngine:
+    """
+    Heap de (fire_at, seq, event_id, offset, version). Cuando un evento se mueve
+    se incrementa su versión y se empujan solo sus nuevas entradas; las viejas
+    se descartan de forma perezosa al salir del heap.
+    """
+
+    def __init__(self, offsets: tuple[int, ...] = REMINDER_OFFSETS):
+        self.offsets = offsets
+        self.heap: list[tuple[datetime, int, str, int, int]] = []
+        self.targets: dict[str, ReminderTarget] = {}
+        self._seq = itertools.count()
+        self._versions = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def upsert_event(self, event: dict, now: datetime) -> bool:
+        """Registra o actualiza un evento. Devuelve True si cambió su agenda de recordatorios."""
+        event_id = event.get("id")
+        if not event_id:
+            return False
+        if event.get("status") == "cancelled":
+            return self.remove_event(event_id)
+        start, _ = CalendarClient.event_start_end(event)
+        if start is None or start.tzinfo is None or "dateTime" not in event.get("start", {}):
+            # Eventos de día completo no llevan recordatorio
+            return self.remove_event(event_id)
+        start = start.astimezone(now.tzinfo)
+
+        attendees = event.get("attendees", [])
+        who = ", ".join([a.get("email", "") for a in attendees if a.get("email")])
+        current = self.targets.get(event_id)
+        if current and current.start == start:
+            current.summary = event.get("summary", "(sin título)")
+            current.location = event.get("location")
+            current.attendees = who
+            return False
+
+        target = ReminderTarget(
+            event_id=event_id,
+            start=start,
+            summary=event.get("summary", "(sin título)"),
+            location=event.get("location"),
+            attendees=who,
+            version=next(self._versions),
+        )
+        self.targets[event_id] = target
+        for offset in self.offsets:
+            fire_at = start - timedelta(minutes=offset)
+            if fire_at + LATE_GRACE < now or start <= now:
+                continue
+            heapq.heappush(self.heap, (fire_at, next(self._seq), event_id, offset, target.version))
+        return True
+
+    def remove_event(self, event_id: str) -> bool:
+        return self.targets.pop(event_id, None) is not None
+
+    def next_fire_at(self) -> datetime | None:
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: datetime) -> list[tuple[ReminderTarget, int]]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, _, event_id, offset, version = heapq.heappop(self.heap)
+            target = self.targets.get(event_id)
+            if not target or target.version != version:
+                continue
+            if target.start <= now or fire_at + LATE_GRACE < now:
+                continue
+            due.append((target, offset))
+        self._forget_past(now)
+        return due
+
+    def _drop_stale(self):
+        while self.heap:
+            _, _, event_id, _, version = self.heap[0]
+            target = self.targets.get(event_id)
+            if target and target.version == version:
+                return
+            heapq.heappop(self.heap)
+
+    def _forget_past(self, now: datetime):
+        for event_id in [k for k, t in self.targets.items() if t.start <= now]:
+            del self.targets[event_id]
+
+
+def reminder_key(target: ReminderTarget, offset: int) -> str:
+    # Incluye el inicio: si el evento se mueve, sus recordatorios se vuelven a enviar
+    return f"{target.event_id}:{offset}:{target.start.isoformat()}"
+
+
+def claim_reminder(key: str) -> bool:
+    """Marca el recordatorio como enviado de forma durable. False si ya se había enviado."""
+    try:
+        with SessionLocal() as session:
+            session.add(SentReminder(key=key, sent_at=datetime.utcnow()))
+            session.commit()
+    except IntegrityError:
+        return False
+    except SQLAlchemyError as exc:
+        logger.error("reminder.db_error", error=exc.__class__.__name__, detail=str(exc))
+    return True
+
+
+def release_reminder(key: str):
+    """Deshace el claim de un recordatorio que no se pudo entregar, para que otro intento lo mande."""
+    try:
+        with SessionLocal() as session:
+            session.query(SentReminder).filter(SentReminder.key == key).delete()
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("reminder.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+reminder_engine = ReminderEngine()
@@ -0,0 +1,88 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from ..faq import faq_cache
+from ..profiler import profiler
+from ..scheduler import scheduler
+from ..schemas import FaqEntryIn
+from ..security import require_internal_key
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_internal_key)])
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    request: Request,
+    seconds: float = Query(default=10, gt=0, le=120),
+    requests: int | None = Query(default=None, ge=1),
+    interval_ms: float = Query(default=5, ge=1, le=100),
+):
+    """
+    Muestrea el proceso durante `seconds` (o hasta `requests` requests, lo que
+    pase primero) y devuelve pilas colapsadas etiquetadas por ruta/job.
+    """
+    started = profiler.start(
+        seconds,
+        interval=interval_ms / 1000,
+        max_requests=requests,
+        routes=request.app.routes,
+        jobs=scheduler.get_jobs(),
+    )
+    if not started:
+        raise HTTPException(status_code=409, detail="profiler already running")
+    while profiler.active:
+        await asyncio.sleep(0.05)
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "X-Profile-Seconds": f"{profiler.duration:.2f}",
+            "X-Profile-Idle-Samples": str(profiler.idle_samples),
+        },
+    )
+
+
+def _faq_entry(entry) -> dict:
+    return {
+        "id": entry.entry_id,
+        "source": entry.source,
+        "questions": entry.questions,
+        "answer": entry.answer,
+        "expires_at": entry.expires_at,
+        "hits": entry.hits,
+    }
+
+
+@router.get("/faq")
+async def list_faq():
+    """Entradas de la caché de FAQ y respuestas del modelo pendientes de aprobar."""
+    return {
+        "entries": [_faq_entry(entry) for entry in faq_cache.entries.values()],
+        "candidates": [
+            {"id": c.candidate_id, "question": c.question, "answer": c.answer, "seen": c.seen}
+            for c in sorted(faq_cache.candidates, key=lambda c: -c.seen)
+        ],
+    }
+
+
+@router.post("/faq")
+async def approve_faq(body: FaqEntryIn):
+    if not body.questions or not body.answer.strip():
+        raise HTTPException(status_code=422, detail="questions and answer are required")
+    return _faq_entry(faq_cache.approve(body.questions, body.answer, body.ttl_hours))
+
+
+@router.post("/faq/candidates/{candidate_id}/approve")
+async def approve_faq_candidate(candidate_id: str, ttl_hours: float | None = Query(default=None, gt=0)):
+    candidate = next((c for c in faq_cache.candidates if c.candidate_id == candidate_id), None)
+    if candidate is None:
+        raise HTTPException(status_code=404, detail="candidate not found")
+    return _faq_entry(faq_cache.approve([candidate.question], candidate.answer, ttl_hours))
+
+
+@router.delete("/faq/{entry_id}")
+async def delete_faq(entry_id: str):
+    if not faq_cache.remove(entry_id):
+        raise HTTPException(status_code=404, detail="entry not found")
+    return {"status": "deleted"}
@@ -1,8 +1,13 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 
 from ..config import settings
-from ..services.ai import AIClient
-from ..services.gmail import GmailClient, extract_headers, extract_snippet
+from ..email_digest import format_digest, owner_key
+from ..email_triage import skip_reason
+from ..metrics import email_triage
+from ..services.ai import get_ai_client
+from ..services.gmail import GmailClient, extract_headers
 from ..services.whatsapp_gateway import WhatsAppGateway
 from ..state import PendingEmailAction, state
 from ..schemas import OutgoingWhatsAppMessage
@@ -10,55 +15,77 @@ from ..schemas import OutgoingWhatsAppMessage
 router = APIRouter()
 gateway = WhatsAppGateway()
 
-def _normalize_number(raw: str) -> str:
-    # Strip non-digits and normalize MX mobile (52/521) prefixes.
-    digits = "".join(ch for ch in (raw or "") if ch.isdigit())
-    if digits.startswith("521"):
-        return "52" + digits[3:]
-    return digits
-
 
 async def poll_and_notify():
+    """
+    Junta los no leídos nuevos (hasta email_digest_max), los resume y rankea en
+    una sola completion y manda un único digest numerado al dueño.
+    """
     gmail = GmailClient()
-    messages = gmail.list_unread(max_results=1)
+    messages = await gmail.list_unread(max_results=settings.email_digest_max)
     if not messages:
         return {"status": "no_unread"}
 
-    msg_id = messages[0]["id"]
-    if state.has_seen_email(msg_id):
-        return {"status": "already_seen", "message_id": msg_id}
-    full = gmail.get_message(msg_id)
-    headers = extract_headers(full.get("payload", {}))
-    sender = headers.get("from", "desconocido")
-    subject = headers.get("subject", "(sin asunto)")
-    snippet = extract_snippet(full)
+    new_ids = [m["id"] for m in messages if not state.has_seen_email(m["id"])]
+    if not new_ids:
+        return {"status": "already_seen", "message_ids": [m["id"] for m in messages]}
+    # Concurrentes: el planificador de Google los manda en un solo batch. Primero
+    # solo encabezados; el cuerpo se baja únicamente para lo que pasa el triage.
+    metas = await asyncio.gather(*(gmail.get_metadata(msg_id) for msg_id in new_ids))
 
-    ai = AIClient(settings.openai_api_key)
-    summary = await ai.summarize_email(subject, snippet)
+    candidates = []
+    skipped = 0
+    for msg_id, meta in zip(new_ids, metas):
+        headers = extract_headers(meta.get("payload", {}))
+        sender = headers.get("from", "desconocido")
+        subject = headers.get("subject", "(sin asunto)")
+        # Masivos, automáticos y lo que el dueño siempre ignora se archivan sin pasar por el modelo
+        reason = skip_reason(headers)
+        email_triage.inc("skip" if reason else "notify", reason or "ok")
+        if reason:
+            skipped += 1
+            state.log_event("email.triaged", f"From {sender} - {subject} ({reason})")
+            continue
+        candidates.append({"id": msg_id, "sender": sender, "subject": subject})
 
-    pending = PendingEmailAction(
-        action_id=msg_id,
-        sender=sender,
-        subject=subject,
-        summary=summary,
-    )
-    state.set_pending(_normalize_number(settings.owner_whatsapp_number), pending)
-    state.log_event("email.new", f"From {sender} - {subject}")
+    fulls = await asyncio.gather(*(gmail.get_message(email["id"]) for email in candidates))
+    bodies = await asyncio.gather(*(gmail.read_body(full) for full in fulls))
+    emails = [
+        dict(email, body=body[: settings.email_digest_body_chars]) for email, body in zip(candidates, bodies)
+    ]
 
-    await gateway.send_message(
-        OutgoingWhatsAppMessage(
-            to_number=settings.owner_whatsapp_number,
-            text=(
-                f"Jefe, recibiste un correo de {sender}. "
-                f"Dice lo siguiente: {summary}.\n\n"
-                "¿Quieres ignorarlo o contestar?"
-            ),
+    if not emails:
+        await asyncio.gather(*(gmail.archive_message(msg_id) for msg_id in new_ids))
+        for msg_id in new_ids:
+            state.mark_email_seen(msg_id)
+        return {"status": "triaged", "message_ids": new_ids, "skipped": skipped}
+    by_id = {email["id"]: email for email in emails}
+
+    ai = get_ai_client()
+    ranked = await ai.summarize_digest(emails)
+
+    actions = [
+        PendingEmailAction(
+            action_id=item["id"],
+            sender=by_id[item["id"]]["sender"],
+            subject=by_id[item["id"]]["subject"],
+            summary=item["summary"],
         )
+        for item in ranked
+    ]
+    # Lo abierto del digest anterior (p. ej. un "contestar 1" a medias) no se pierde
+    carried = state.add_pending_digest(owner_key(settings.owner_whatsapp_number), actions)
+    for action in actions:
+        state.log_event("email.new", f"From {action.sender} - {action.subject}")
+
+    await gateway.send_message(
+        OutgoingWhatsAppMessage(to_number=settings.owner_whatsapp_number, text=format_digest(actions, archived=skipped, carried=carried))
     )
     # Avoid repeated notifications by marking as read/archived after notify.
-    gmail.archive_message(msg_id)
-    state.mark_email_seen(msg_id)
-    return {"status": "notified", "message_id": msg_id}
+    await asyncio.gather(*(gmail.archive_message(msg_id) for msg_id in new_ids))
+    for msg_id in new_ids:
+        state.mark_email_seen(msg_id)
+    return {"status": "notified", "message_ids": new_ids, "skipped": skipped}
 
 
 @router.post("/gmail/poll")
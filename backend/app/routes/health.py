@@ -1,19 +1,57 @@
-from fastapi import APIRouter
+import asyncio
+from datetime import datetime, timezone
+from html import escape
 
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+
+from ..broadcast import broadcaster
+from ..journal import journal
+from ..metrics import registry
+from ..security import require_stream_key
+from ..services.dispatcher import dispatcher
+from ..startup import startup
 from ..state import state
 
 router = APIRouter()
 
+# La página solo se vuelve a armar cuando hay eventos nuevos o cambia el conteo
+_status_cache: dict[tuple[int, int], str] = {}
+
 
 @router.get("/health")
 async def health():
-    return {"status": "ok"}
+    # Vivo desde que termina de importar; `ready` indica si ya terminó el calentamiento
+    return {"status": "ok", "ready": startup.ready.is_set()}
+
+
+registry.gauge(
+    "state_entries",
+    "Tamaño de las estructuras en memoria",
+    ("store",),
+    lambda: {(name,): value for name, value in state.memory_report().items()},
+)
+registry.gauge("dispatcher_queue_depth", "Mensajes esperando en el dispatcher", (), lambda: {(): dispatcher.pending()})
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
-@router.get("/status")
+@router.get("/debug/memory")
+async def debug_memory():
+    return state.memory_report()
+
+
+@router.get("/status", response_class=HTMLResponse)
 async def status():
-    pending_count = len(state.pending_by_user)
-    events = list(state.events)[:50]
+    pending_count = state.pending_count()
+    key = (journal.last_seq, pending_count)
+    cached = _status_cache.get(key)
+    if cached is not None:
+        return cached
+    events = journal.recent(50)
     html = [
         "<html><head><title>Agenda Agent Status</title>",
         "<style>body{font-family:Arial,sans-serif;padding:20px;} .tag{font-size:12px;color:#666;} .evt{margin:6px 0;}</style>",
@@ -27,9 +65,41 @@ async def status():
     else:
         html.append("<div>")
         for ev in events:
+            ts = datetime.fromtimestamp(ev.ts, timezone.utc).replace(tzinfo=None).isoformat()
             html.append(
-                f"<div class='evt'><span class='tag'>{ev['ts']} · {ev['kind']}</span><br/>{ev['detail']}</div>"
+                f"<div class='evt'><span class='tag'>{ts} · {escape(ev.kind)}</span><br/>{escape(ev.detail)}</div>"
             )
         html.append("</div>")
     html.append("</body></html>")
-    return "".join(html)
+    page = "".join(html)
+    _status_cache.clear()
+    _status_cache[key] = page
+    return page
+
+
+# Lleva el mismo journal que /journal (números y texto de pacientes): misma llave
+@router.get("/status/stream", dependencies=[Depends(require_stream_key)])
+async def status_stream(request: Request):
+    queue = broadcaster.connect()
+
+    async def frames():
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    return  # lo cortó el broadcaster por lento
+                yield frame
+        finally:
+            broadcaster.disconnect(queue)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
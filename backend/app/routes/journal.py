@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
+
+from ..journal import journal
+from ..security import require_internal_key
+
+router = APIRouter(dependencies=[Depends(require_internal_key)])
+
+
+@router.get("/journal")
+async def query_journal(
+    kind: str | None = None,
+    patient: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: int | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    entries, next_cursor = journal.query(
+        kind=kind,
+        patient=patient,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        cursor=cursor,
+        limit=limit,
+    )
+    return {"entries": [entry.to_dict() for entry in entries], "next_cursor": next_cursor}
+
+
+@router.get("/journal/kinds")
+async def journal_kinds():
+    return journal.counts_by_kind()
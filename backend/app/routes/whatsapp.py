@@ -1,30 +1,72 @@
+import re
+import time
+from itertools import zip_longest
 from fastapi import APIRouter, HTTPException
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from ..briefing import handle_briefing_command
+from ..calendar_sync import calendar_sync
+from ..availability import nearest_slots, window_slots
+from ..clinic import DEFAULT_OFFICE, DOCTORS, OFFICE_LOCATIONS, doctor_calendar
 from ..config import settings
+from ..dedup import claim_message, release_message
+from ..email_digest import handle_owner_reply
+from ..faq import faq_cache
+from ..holds import book_slot, claim_slot, hold_offered_slots, release_booked, release_patient_holds, release_slot
+from ..ledger import cancel_appointment, find_next_appointment, reschedule_appointment
+from ..patient_reminders import handle_reminder_reply
+from ..recorder import record_turn
 from ..schemas import IncomingWhatsAppMessage, OutgoingWhatsAppMessage, CalendarEventDraft
 from ..services.whatsapp_gateway import WhatsAppGateway
 from ..services.calendar import CalendarClient
-from ..services.ai import AIClient
+from ..services.google_api import interactive
+from ..services.ai import format_days, get_ai_client
+from ..startup import startup
 from ..state import state, AppointmentConversation
+from ..temporal import datetime_request as parse_datetime_request, normalize_request
+from ..tracing import start_trace
+from ..waitlist import join_waitlist, mark_booked
+from ..logs import get_logger
+from ..metrics import date_parse, faq_lookups
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 gateway = WhatsAppGateway()
 
-DOCTORS = {
-    "fernandez": "Dr. Jose Fernandez (Consultas Generales)",
-    "paredes": "Dr. Juan Paredes (Pediatría)",
-    "perez": "Dr. Pedro Perez (Neurología)",
-}
 
-OFFICE_LOCATIONS = {
-    "calle13": "Calle 13, Número 111",
-    "calle09": "Calle 09, Número 120",
-}
+# Respuesta a "¿Cancelo tu cita ...?": solo un sí o no explícito al inicio del mensaje
+_YES_RE = re.compile(r"^\W*(s[ií]+|claro|ok|okay|dale|adelante|por favor)\b", re.IGNORECASE)
+_CANCEL_IT_RE = re.compile(r"\bcanc[eé]l(a|al[ao]|arla|arlo)\b", re.IGNORECASE)
+_NO_RE = re.compile(r"^\W*(no|nel|mejor no|todav[ií]a no|d[eé]jal[ao])\b", re.IGNORECASE)
+
+
+def _cancel_answer(text: str) -> bool | None:
+    """True = sí cancelar, False = no, None = no contestó la pregunta."""
+    if _YES_RE.match(text) or _CANCEL_IT_RE.search(text):
+        return True
+    if _NO_RE.match(text):
+        return False
+    return None
+
+
+def _closest_to_time(slots: list[dict], requested_time: str) -> list[dict]:
+    """Slots por cercanía a la hora pedida ("HH:MM"); a igual distancia, el día más próximo."""
+    try:
+        hour, minute = (int(part) for part in requested_time.split(":")[:2])
+    except ValueError:
+        return slots
+    target = hour * 60 + minute
+    return sorted(slots, key=lambda s: (abs(int(s['time'].split(":")[0]) * 60 - target), s['datetime']))
+
 
-# SOLUCIÓN MEDIA: Ubicación por defecto si no se especifica
-DEFAULT_OFFICE = "calle13"  # Sede principal
+def _spread_days(slots: list[dict]) -> list[dict]:
+    """Intercala los slots por día: en un rango, las primeras opciones caen en días distintos."""
+    by_day: dict[str, list[dict]] = {}
+    for slot in slots:
+        by_day.setdefault(slot['date'], []).append(slot)
+    return [slot for rank in zip_longest(*by_day.values()) for slot in rank if slot is not None]
 
 
 def _normalize_number(raw: str) -> str:
@@ -39,30 +81,184 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
     Health counselor bot - accepts ALL incoming WhatsApp messages,
     analyzes them as health queries, and responds automatically.
     """
-    print(f"[RAW FROM_NUMBER] raw={message.from_number}")
+    # Recién arrancado: dedup, lista de espera y conversaciones todavía se están cargando
+    await startup.wait_ready()
+    started = time.perf_counter()
+    outcome = "error"
+    patient = _normalize_number(message.from_number)
+    with start_trace("whatsapp.incoming", patient=patient, message_id=message.message_id) as root, \
+            record_turn(message, patient) as recorded, interactive():
+        try:
+            result = await _handle_incoming(message)
+            outcome = result.get("status", "ok")
+            recorded["result"] = result
+            return result
+        finally:
+            root.attributes["status"] = outcome
+            state.log_event(
+                "whatsapp.handled",
+                f"status={outcome}",
+                patient=patient,
+                latency_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+
+
+async def _handle_incoming(message: IncomingWhatsAppMessage) -> dict:
     incoming = _normalize_number(message.from_number)
-    print(f"[NORMALIZED] normalized={incoming}")
-    state.log_event("whatsapp.incoming", f"from={message.from_number} text={message.text[:100]}")
+    logger.debug("whatsapp.from_number", raw=message.from_number, normalized=incoming)
+
+    # Reintento del gateway con el mismo message_id → no-op
+    if message.message_id and not claim_message(message.message_id):
+        logger.info("whatsapp.duplicate", message_id=message.message_id)
+        state.log_event("whatsapp.duplicate", f"from={incoming} message_id={message.message_id}", patient=incoming)
+        return {"status": "duplicate"}
+
+    state.log_event("whatsapp.incoming", f"from={message.from_number} text={message.text[:100]}", patient=incoming)
 
     try:
-        ai = AIClient(settings.openai_api_key)
+        ai = get_ai_client()
         text = message.text.lower().strip()
 
         # Guardar mensaje del usuario en historial
         state.add_message_to_history(incoming, "user", message.text)
 
+        # Respuesta a un recordatorio de cita ("confirmo" / "cancelar")
+        reminder_reply = await handle_reminder_reply(incoming, message.text)
+        if reminder_reply:
+            await gateway.send_message(
+                OutgoingWhatsAppMessage(to_number=message.from_number, text=reminder_reply)
+            )
+            state.add_message_to_history(incoming, "assistant", reminder_reply)
+            state.log_event("patient.reminder_reply", f"patient={incoming} text={message.text[:30]}", patient=incoming)
+            return {"status": "reminder_reply"}
+
+        # El dueño pidiendo su "resumen": sale de la caché, sin Google ni modelo
+        briefing = await handle_briefing_command(incoming, message.text)
+        if briefing:
+            await gateway.send_message(
+                OutgoingWhatsAppMessage(to_number=message.from_number, text=briefing)
+            )
+            state.add_message_to_history(incoming, "assistant", briefing)
+            return {"status": "owner_briefing"}
+
+        # El dueño contestando al digest de correos ("ignorar 2", "contestar 1", ...)
+        owner_reply = await handle_owner_reply(incoming, message.text)
+        if owner_reply:
+            await gateway.send_message(
+                OutgoingWhatsAppMessage(to_number=message.from_number, text=owner_reply)
+            )
+            state.add_message_to_history(incoming, "assistant", owner_reply)
+            return {"status": "owner_email"}
+
         # Obtener historial conversacional
         history = state.get_conversation_history(incoming)
 
         # Obtener conversación de agendamiento si hay una
         conversation = state.get_appointment_conversation(incoming)
 
+        # Cancelación pendiente de confirmar: solo un "sí" explícito borra la cita
+        skip_appointment_action = False
+        if conversation and conversation.cancel_event_id:
+            pending_event_id = conversation.cancel_event_id
+            conversation.cancel_event_id = None
+            answer = _cancel_answer(message.text)
+            if answer is not None:
+                state.clear_appointment_conversation(incoming)
+                existing = find_next_appointment(incoming) if answer else None
+                if existing and existing.event_id == pending_event_id:
+                    await cancel_appointment(existing.event_id, existing.calendar_id)
+                    state.log_event("appointment.cancelled", f"patient={incoming} event={existing.event_id}", patient=incoming, doctor=existing.doctor)
+                    response_text = (
+                        f"Listo, cancelé tu cita con {DOCTORS.get(existing.doctor or '', 'tu doctor')} "
+                        f"del {existing.start.strftime('%d/%m a las %H:%M')}. Si quieres agendar otra fecha, escríbeme."
+                    )
+                    status = "appointment_cancelled"
+                elif answer:
+                    response_text = "Esa cita ya no aparece en la agenda. ¿Te ayudo con algo más?"
+                    status = "no_appointment"
+                else:
+                    response_text = "Ok, tu cita sigue en pie. ¿Te ayudo con algo más?"
+                    status = "cancel_declined"
+                # El historial todavía pide cancelar: se limpia para que esa intención no vuelva a disparar
+                state.clear_conversation_history(incoming)
+                await gateway.send_message(
+                    OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
+                )
+                state.add_message_to_history(incoming, "assistant", response_text)
+                return {"status": status}
+            # Ni sí ni no: sigue el flujo normal sin volver a preguntar por la misma cancelación
+            skip_appointment_action = True
+            if conversation.state == "cancelling":
+                state.clear_appointment_conversation(incoming)
+                conversation = None
+
+        # Primer mensaje con una pregunta frecuente (horario, dirección, ...): se contesta sin el modelo
+        first_turn = not conversation and len(history) == 1
+        if first_turn:
+            hit = faq_cache.lookup(message.text)
+            faq_lookups.inc("hit" if hit else "miss")
+            if hit:
+                entry, score = hit
+                await gateway.send_message(
+                    OutgoingWhatsAppMessage(to_number=message.from_number, text=entry.answer)
+                )
+                state.add_message_to_history(incoming, "assistant", entry.answer)
+                state.log_event("faq.hit", f"patient={incoming} entry={entry.entry_id} score={score:.2f}", patient=incoming)
+                return {"status": "faq"}
+
         # FLUJO CONVERSACIONAL INTELIGENTE
         # Extraer información de la conversación completa usando AI
         appointment_info = await ai.extract_appointment_info(history)
 
-        print(f"[AI EXTRACTION] patient={incoming} info={appointment_info}")
-        state.log_event("ai.extraction", f"patient={incoming} wants_appt={appointment_info.get('wants_appointment')} doctor={appointment_info.get('recommended_doctor')}")
+        logger.info("ai.extraction", patient=incoming, info=appointment_info)
+        state.log_event(
+            "ai.extraction",
+            f"patient={incoming} wants_appt={appointment_info.get('wants_appointment')} doctor={appointment_info.get('recommended_doctor')}",
+            patient=incoming,
+            doctor=appointment_info.get('recommended_doctor'),
+        )
+
+        # Cancelar / reagendar una cita existente: una sola búsqueda en el ledger
+        appointment_action = appointment_info.get('appointment_action')
+        if (
+            appointment_action in ("cancel", "reschedule")
+            and not skip_appointment_action
+            and not (conversation and conversation.reschedule_event_id)
+        ):
+            existing = find_next_appointment(incoming)
+            if not existing:
+                response_text = "No encuentro citas próximas agendadas con este número. ¿Te gustaría agendar una nueva?"
+                await gateway.send_message(
+                    OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
+                )
+                state.add_message_to_history(incoming, "assistant", response_text)
+                return {"status": "no_appointment"}
+
+            existing_doctor = DOCTORS.get(existing.doctor or "", "tu doctor")
+            existing_when = existing.start.strftime("%d/%m a las %H:%M")
+            if appointment_action == "cancel":
+                # Nada se borra hasta que el paciente conteste que sí
+                pending = conversation or AppointmentConversation(patient_number=incoming, state="cancelling")
+                pending.cancel_event_id = existing.event_id
+                state.set_appointment_conversation(incoming, pending)
+                state.log_event("appointment.cancel_requested", f"patient={incoming} event={existing.event_id}", patient=incoming, doctor=existing.doctor)
+                response_text = f"¿Cancelo tu cita con {existing_doctor} del {existing_when}? Responde *sí* o *no*."
+                await gateway.send_message(
+                    OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
+                )
+                state.add_message_to_history(incoming, "assistant", response_text)
+                return {"status": "cancel_confirmation"}
+
+            # Reagendar: reusar doctor y consultorio de la cita, solo falta el nuevo horario
+            logger.info("appointment.rescheduling", event_id=existing.event_id, previous=existing_when)
+            conversation = AppointmentConversation(
+                patient_number=incoming,
+                state="conversing",
+                symptoms=appointment_info.get('symptoms_summary', ''),
+                selected_doctor=existing.doctor,
+                selected_office=existing.office,
+                reschedule_event_id=existing.event_id,
+            )
 
         # Guardar información extraída en la conversación
         if not conversation and appointment_info.get('wants_appointment'):
@@ -78,11 +274,11 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
             # GUARDAR valores extraídos por AI
             if appointment_info.get('recommended_doctor') and not conversation.selected_doctor:
                 conversation.selected_doctor = appointment_info['recommended_doctor']
-                print(f"[SAVED] Doctor: {conversation.selected_doctor}")
+                logger.info("conversation.saved", doctor=conversation.selected_doctor)
 
             if appointment_info.get('preferred_location') and not conversation.selected_office:
                 conversation.selected_office = appointment_info['preferred_location']
-                print(f"[SAVED] Ubicación: {conversation.selected_office}")
+                logger.info("conversation.saved", office=conversation.selected_office)
 
             if appointment_info.get('symptoms_summary'):
                 conversation.symptoms = appointment_info['symptoms_summary']
@@ -100,34 +296,35 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                 )
 
                 try:
-                    selection_response = await ai.client.chat.completions.create(
+                    selection_response = await ai._complete(
+                        "select_slot",
                         model=ai.model,
                         messages=[{"role": "user", "content": selection_prompt}],
                         max_tokens=10
                     )
                     selected_num = selection_response.choices[0].message.content.strip().lower()
-                    print(f"[LLM SLOT SELECTION] User: '{text}' → LLM: '{selected_num}'")
+                    logger.info("slot_selection.llm", user_text=text, selected=selected_num)
 
                     if selected_num.isdigit() and 1 <= int(selected_num) <= len(conversation.proposed_times):
                         idx = int(selected_num) - 1
                         slot = conversation.proposed_times[idx]
                         conversation.selected_time = slot["display"]
                         conversation.proposed_times.insert(0, slot)
-                        print(f"[SAVED] Horario: {conversation.selected_time}")
+                        logger.info("conversation.saved", time=conversation.selected_time)
                     else:
                         # Usuario rechazó o pidió otra fecha → LIMPIAR slots para buscar nuevos
-                        print(f"[NO SLOT SELECTED] User rejected or asked for different date - clearing proposed_times")
+                        logger.info("slot_selection.none")
                         conversation.proposed_times = []
                         state.set_appointment_conversation(incoming, conversation)
                 except Exception as e:
-                    print(f"[ERROR] LLM slot selection failed: {e}")
+                    logger.error("slot_selection.failed", error=e.__class__.__name__, detail=str(e))
 
             state.set_appointment_conversation(incoming, conversation)
 
             # SOLUCIÓN MEDIA: Si tiene doctor + horario pero falta ubicación → usar default
             if conversation.selected_doctor and conversation.selected_time and not conversation.selected_office:
                 conversation.selected_office = DEFAULT_OFFICE
-                print(f"[USING DEFAULT OFFICE] {DEFAULT_OFFICE}")
+                logger.info("conversation.default_office", office=DEFAULT_OFFICE)
                 state.set_appointment_conversation(incoming, conversation)
 
             # SOLUCIÓN CORTA: Verificar qué falta y preguntar específicamente
@@ -141,7 +338,7 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
 
             # Si falta algo, preguntar por el primer elemento faltante
             if missing:
-                print(f"[MISSING INFO] Missing: {missing}")
+                logger.info("conversation.missing_info", missing=missing)
                 if "doctor" in missing:
                     doctor_options = "\n".join([f"- {DOCTORS[key]}" for key in DOCTORS.keys()])
                     response_text = (
@@ -167,74 +364,85 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                     return {"status": "asking_ubicación"}
                 elif "horario" in missing and not conversation.proposed_times:
                     # FLUJO CONVERSACIONAL: Extraer fecha/hora que el usuario está pidiendo
-                    print(f"[EXTRACTING DATETIME REQUEST]")
-                    datetime_request = await ai.extract_datetime_request(history)
-                    print(f"[DATETIME REQUEST] {datetime_request}")
+                    tz = ZoneInfo(settings.scheduler_timezone)
+                    now = datetime.now(tz)
+                    # Parser local primero; el modelo solo si algo suena a fecha y no se entendió
+                    datetime_request = parse_datetime_request(history, now)
+                    if datetime_request is not None:
+                        date_parse.inc("rules")
+                    else:
+                        date_parse.inc("model")
+                        datetime_request = normalize_request(await ai.extract_datetime_request(history), now)
+                    logger.info("ai.datetime_request", request=datetime_request)
 
                     # Si falta horario Y no hemos ofrecido slots → BUSCAR disponibilidad
-                    print(f"[CHECKING AVAILABILITY for requested datetime]")
                     try:
                         calendar = CalendarClient()
-                        tz = ZoneInfo(settings.scheduler_timezone)
-                        now = datetime.now(tz)
 
                         # Determinar rango de búsqueda basado en lo que pidió el usuario
-                        if datetime_request.get('requested_date'):
-                            # Pidió fecha específica → buscar solo ese día
-                            search_date = datetime.fromisoformat(datetime_request['requested_date']).replace(tzinfo=tz)
-                            start_date = search_date
-                            end_date = search_date + timedelta(days=1)
-                            print(f"[SEARCHING SPECIFIC DATE] {datetime_request['requested_date']}")
-                        elif datetime_request.get('requested_day_name'):
-                            # Pidió día de la semana → buscar próximo día con ese nombre
-                            day_map = {"lunes": 0, "martes": 1, "miércoles": 2, "jueves": 3, "viernes": 4, "sábado": 5, "domingo": 6}
-                            requested_weekday = day_map.get(datetime_request['requested_day_name'].lower())
-                            if requested_weekday is not None:
-                                days_ahead = (requested_weekday - now.weekday()) % 7
-                                if days_ahead == 0:
-                                    days_ahead = 7  # Próxima semana si es hoy
-                                search_date = now + timedelta(days=days_ahead)
-                                start_date = search_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                                end_date = start_date + timedelta(days=1)
-                                print(f"[SEARCHING WEEKDAY] {datetime_request['requested_day_name']} → {search_date.strftime('%Y-%m-%d')}")
-                            else:
-                                # Fallback: buscar próximos 7 días
-                                start_date = now
-                                end_date = now + timedelta(days=7)
+                        requested_date = datetime_request.get('requested_date')
+                        if requested_date:
+                            # Pidió fecha, día de la semana o rango de días → buscar solo esos días
+                            last_date = datetime_request.get('requested_date_end') or requested_date
+                            first_day, last_day = date.fromisoformat(requested_date), date.fromisoformat(last_date)
+                            day_text = format_days(first_day, last_day)
+                            logger.info("availability.search_date", date=requested_date, until=last_date)
                         else:
-                            # No especificó → buscar próximos 7 días
-                            start_date = now
-                            end_date = now + timedelta(days=7)
-
-                        # Ajustar para suggest_available_slots que usa "días desde hoy"
-                        # Si buscamos un día específico en el futuro, calcular días desde hoy
-                        if datetime_request.get('requested_date') or datetime_request.get('requested_day_name'):
-                            # Buscar solo ese día específico
-                            days_until = max(0, (start_date.replace(hour=0, minute=0, second=0, microsecond=0) - now.replace(hour=0, minute=0, second=0, microsecond=0)).days)
-                            days_range = 1
-                        else:
-                            # Búsqueda general de 7 días
-                            days_until = 0
-                            days_range = 7
-
-                        existing_events = await calendar.list_events(start_date, end_date)
-
-                        # Filtrar slots para obtener solo el rango que nos interesa
-                        all_slots = await ai.suggest_available_slots(
-                            existing_events,
-                            settings.scheduler_timezone,
-                            days_ahead=7  # Buscar en ventana amplia
+                            # No especificó → buscar los próximos 7 días
+                            first_day = (now + timedelta(days=1)).date()
+                            last_day = first_day + timedelta(days=6)
+                            day_text = None
+                        start_date = datetime.combine(first_day, datetime.min.time(), tzinfo=tz)
+                        end_date = datetime.combine(last_day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+
+                        # Todos los slots libres de esos días (un freebusy del doctor y consultorio, con caché)
+                        window = await window_slots(
+                            conversation.selected_doctor, conversation.selected_office, first_day, last_day, calendar
                         )
+                        available_slots = window
+                        # Franja pedida ("en la tarde", "de 10 a 12"): solo los slots que empiezan dentro
+                        requested_time = datetime_request.get('requested_time')
+                        requested_time_end = datetime_request.get('requested_time_end')
+                        if requested_time and requested_time_end:
+                            available_slots = [
+                                s for s in available_slots if requested_time <= s['time'].zfill(5) < requested_time_end
+                            ]
+                        if requested_time:
+                            # Hora pedida: primero lo más cercano a esa hora
+                            available_slots = _closest_to_time(available_slots, requested_time)
+
+                        # Esos días tienen lugar pero no en la franja → lo más cercano a la hora, esos mismos días
+                        # Sin ningún lugar en la ventana → búsqueda expansiva hacia días cercanos (ambas direcciones)
+                        other_hours = False
+                        searched_nearby = False
+                        nearby_empty = False
+                        if not available_slots and window:
+                            available_slots = _closest_to_time(window, requested_time)
+                            other_hours = True
+                        elif not available_slots and requested_date:
+                            preferred = start_date
+                            if requested_time:
+                                try:
+                                    hour, minute = (int(part) for part in requested_time.split(":")[:2])
+                                    preferred = start_date.replace(hour=hour, minute=minute)
+                                except ValueError:
+                                    pass
+                            available_slots = await nearest_slots(
+                                conversation.selected_doctor, conversation.selected_office, preferred, count=8, calendar=calendar
+                            )
+                            searched_nearby = bool(available_slots)
+                            nearby_empty = not available_slots
+                            logger.info("availability.nearest", preferred=preferred.isoformat(), found=len(available_slots))
 
-                        # Filtrar slots para el día específico si lo pidió
-                        if datetime_request.get('requested_date'):
-                            target_date = datetime_request['requested_date']
-                            available_slots = [s for s in all_slots if s['date'] == target_date]
-                        elif datetime_request.get('requested_day_name'):
-                            target_day = datetime_request['requested_day_name'].capitalize()
-                            available_slots = [s for s in all_slots if s['day'] == target_day]
-                        else:
-                            available_slots = all_slots
+                        # Rango de días ("la próxima semana", "del 3 al 5"): opciones repartidas entre esos días
+                        spread = bool(requested_date) and last_day > first_day and not searched_nearby
+                        if spread:
+                            available_slots = _spread_days(available_slots)
+
+                        # Excluir horarios reservados por otros pacientes y reservar los ofrecidos
+                        available_slots = hold_offered_slots(incoming, conversation.selected_doctor, available_slots)
+                        if spread:
+                            available_slots.sort(key=lambda s: s['datetime'])
 
                         if available_slots:
                             conversation.proposed_times = available_slots[:5]
@@ -243,11 +451,28 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                             doctor_text = f" con {DOCTORS[conversation.selected_doctor]}" if conversation.selected_doctor else ""
                             location_text = f" en {OFFICE_LOCATIONS[conversation.selected_office]}" if conversation.selected_office else ""
 
-                            # CONVERSACIONAL: Si pidió hora específica y la tenemos, confirmarla directamente
-                            requested_time = datetime_request.get('requested_time')
-                            if requested_time:
+                            # CONVERSACIONAL: Si pidió hora específica (no una franja) y la tenemos, confirmarla directamente
+                            if requested_time_end:
+                                requested_time = None
+                            if searched_nearby:
+                                options_text = ""
+                                for idx, slot in enumerate(available_slots[:5], 1):
+                                    options_text += f"{idx}. {slot['display']}\n"
+                                response_text = (
+                                    f"{day_text.capitalize()} ya no tengo lugar{doctor_text}, pero lo más cercano que tengo es:\n\n"
+                                    f"{options_text}\n¿Cuál te conviene?"
+                                )
+                            elif other_hours:
+                                options_text = ""
+                                for idx, slot in enumerate(available_slots[:5], 1):
+                                    options_text += f"{idx}. {slot['display']}\n"
+                                response_text = (
+                                    f"{(day_text or 'esos días').capitalize()} en ese horario ya no tengo lugar{doctor_text}, "
+                                    f"pero tengo:\n\n{options_text}\n¿Cuál te conviene?"
+                                )
+                            elif requested_time:
                                 # Buscar si tenemos exactamente esa hora
-                                exact_match = next((slot for slot in available_slots if slot['time'] == requested_time), None)
+                                exact_match = next((slot for slot in available_slots if slot['time'].zfill(5) == requested_time), None)
                                 if exact_match:
                                     # ¡Encontramos exactamente lo que pidió!
                                     response_text = (
@@ -256,11 +481,11 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                                     )
                                 else:
                                     # Tenemos el día pero no esa hora específica
-                                    options_text = f"Para {datetime_request.get('requested_day_name', 'ese día')} tengo:\n\n"
+                                    options_text = ""
                                     for idx, slot in enumerate(available_slots[:5], 1):
                                         options_text += f"{idx}. {slot['display']}\n"
                                     response_text = (
-                                        f"Lo siento, {datetime_request.get('requested_day_name', 'ese día')} a las {requested_time} ya está ocupado. "
+                                        f"Lo siento, a las {requested_time} ya no tengo lugar {day_text or 'ese día'}. "
                                         f"Pero tengo otras opciones:\n\n{options_text}\n¿Cuál te conviene?"
                                     )
                             else:
@@ -277,14 +502,24 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                             return {"status": "offered_slots"}
                         else:
                             # No hay disponibilidad para lo que pidió
-                            if datetime_request.get('requested_day_name') or datetime_request.get('requested_date'):
-                                day_text = datetime_request.get('requested_day_name', datetime_request.get('requested_date', 'ese día'))
-                                response_text = (
-                                    f"Lo siento, no tengo disponibilidad para {day_text}. "
-                                    f"¿Te gustaría que busque en otros días cercanos?"
-                                )
+                            # Anotar en lista de espera: si se libera algo en esa ventana le avisamos
+                            waitlisted = join_waitlist(
+                                incoming, conversation.selected_doctor, conversation.selected_office, start_date, end_date
+                            )
+                            waitlist_text = " Te anoté en la lista de espera y te aviso si se libera un horario." if waitlisted else ""
+                            if day_text:
+                                if nearby_empty:
+                                    response_text = (
+                                        f"Lo siento, no tengo disponibilidad {day_text} "
+                                        f"ni en los días cercanos.{waitlist_text} ¿Podrías llamarme directamente?"
+                                    )
+                                else:
+                                    response_text = (
+                                        f"Lo siento, no tengo disponibilidad {day_text}.{waitlist_text} "
+                                        f"¿Te gustaría que busque en otros días cercanos?"
+                                    )
                             else:
-                                response_text = "Déjame revisar mi agenda... Actualmente no tengo horarios disponibles en los próximos días. ¿Podrías llamarme directamente?"
+                                response_text = f"Déjame revisar mi agenda... Actualmente no tengo horarios disponibles en los próximos días.{waitlist_text} ¿Podrías llamarme directamente?"
                             await gateway.send_message(
                                 OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
                             )
@@ -292,8 +527,7 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                             return {"status": "no_slots"}
 
                     except Exception as exc:
-                        import traceback
-                        print(f"[CALENDAR ERROR] {traceback.format_exc()}")
+                        logger.exception("availability.calendar_error", error=exc.__class__.__name__)
                         response_text = "Disculpa, dame un momento para revisar mi agenda. Si es urgente, puedes llamarme directamente."
                         await gateway.send_message(
                             OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
@@ -303,11 +537,35 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
 
             # Si ya tenemos TODO (doctor, ubicación, horario) → CREAR CITA
             if conversation.selected_doctor and conversation.selected_office and conversation.selected_time:
-                print(f"[CREATING APPOINTMENT] Doctor={conversation.selected_doctor} Location={conversation.selected_office} Time={conversation.selected_time}")
+                logger.info(
+                    "appointment.creating",
+                    doctor=conversation.selected_doctor,
+                    office=conversation.selected_office,
+                    time=conversation.selected_time,
+                )
+
+                # Compare-and-claim del horario: si otro paciente lo tomó, no agendar encima
+                claimed_dt = datetime.fromisoformat(conversation.proposed_times[0]["datetime"])
+                if not claim_slot(incoming, conversation.selected_doctor, claimed_dt):
+                    logger.info("appointment.slot_taken", time=conversation.selected_time)
+                    state.log_event("appointment.slot_taken", f"patient={incoming} time={conversation.selected_time}", patient=incoming, doctor=conversation.selected_doctor)
+                    conversation.proposed_times = []
+                    conversation.selected_time = None
+                    state.set_appointment_conversation(incoming, conversation)
+                    response_text = (
+                        "Lo siento, ese horario se acaba de ocupar. "
+                        "¿Quieres que te busque otro horario disponible?"
+                    )
+                    await gateway.send_message(
+                        OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
+                    )
+                    state.add_message_to_history(incoming, "assistant", response_text)
+                    return {"status": "slot_taken"}
 
                 # Crear evento en Google Calendar PRIMERO
                 try:
                     calendar = CalendarClient()
+                    calendar_id = doctor_calendar(conversation.selected_doctor)
 
                     # Parsear el datetime seleccionado
                     slot_dt = datetime.fromisoformat(conversation.proposed_times[0]["datetime"])
@@ -326,36 +584,67 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                         },
                         "location": OFFICE_LOCATIONS[conversation.selected_office],
                         "description": f"Paciente: {incoming}\nDoctor: {DOCTORS[conversation.selected_doctor]}\nMotivo: {conversation.symptoms or 'No especificado'}",
+                        "extendedProperties": {
+                            "private": {
+                                "patient_number": incoming,
+                                "doctor": conversation.selected_doctor,
+                                "office": conversation.selected_office,
+                                "calendar_id": calendar_id,
+                            }
+                        },
                     }
 
-                    result = await calendar.create_event(event_payload)
-                    print(f"[CALENDAR SUCCESS] Event created: {result.get('id')}")
-                    state.log_event("appointment.created", f"patient={incoming} doctor={conversation.selected_doctor} time={conversation.selected_time} office={conversation.selected_office}")
+                    if conversation.reschedule_event_id:
+                        # Reagendar: mover el evento existente en lugar de crear otro; su horario viejo se libera
+                        release_booked(conversation.reschedule_event_id)
+                        result = await reschedule_appointment(
+                            conversation.reschedule_event_id, slot_dt, calendar_id, calendar
+                        )
+                        logger.info("appointment.rescheduled", event_id=result.get('id'))
+                        # La petición de reagendar ya se atendió: que no vuelva a disparar desde el historial
+                        state.clear_conversation_history(incoming)
+                        state.log_event("appointment.rescheduled", f"patient={incoming} doctor={conversation.selected_doctor} time={conversation.selected_time} office={conversation.selected_office}", patient=incoming, doctor=conversation.selected_doctor)
+                        response_text = (
+                            f"✅ Listo! Moví tu cita con {DOCTORS[conversation.selected_doctor]} "
+                            f"para {conversation.selected_time} en {OFFICE_LOCATIONS[conversation.selected_office]}.\n\n"
+                            f"Te esperamos ese día. Si tienes alguna duda, escríbeme."
+                        )
+                    else:
+                        result = await calendar.create_event(event_payload, calendar_id=calendar_id)
+                        logger.info("appointment.created", event_id=result.get('id'))
+                        calendar_sync.notify([result], calendar_id=calendar_id)
+                        state.log_event("appointment.created", f"patient={incoming} doctor={conversation.selected_doctor} time={conversation.selected_time} office={conversation.selected_office}", patient=incoming, doctor=conversation.selected_doctor)
+
+                        # SOLO si Google Calendar respondió exitosamente → CONFIRMAR
+                        response_text = (
+                            f"✅ Perfecto! He agendado tu cita con {DOCTORS[conversation.selected_doctor]} "
+                            f"para {conversation.selected_time} en {OFFICE_LOCATIONS[conversation.selected_office]}.\n\n"
+                            f"Te esperamos ese día. Si necesitas reagendar o tienes alguna duda, escríbeme."
+                        )
 
-                    # SOLO si Google Calendar respondió exitosamente → CONFIRMAR
-                    response_text = (
-                        f"✅ Perfecto! He agendado tu cita con {DOCTORS[conversation.selected_doctor]} "
-                        f"para {conversation.selected_time} en {OFFICE_LOCATIONS[conversation.selected_office]}.\n\n"
-                        f"Te esperamos ese día. Si necesitas reagendar o tienes alguna duda, escríbeme."
-                    )
+                    mark_booked(incoming)
+                    # El claim queda como 'booked': una oferta vieja de otro paciente ya no lo pisa
+                    book_slot(incoming, conversation.selected_doctor, claimed_dt)
 
                     # Limpiar conversación
                     state.clear_appointment_conversation(incoming)
-                    print(f"[CLEARED] Appointment conversation after successful booking")
+                    logger.debug("conversation.cleared")
 
                 except Exception as exc:
-                    import traceback
-                    error_detail = traceback.format_exc()
-                    print(f"[CALENDAR ERROR] {error_detail}")
-                    state.log_event("appointment.error", f"patient={incoming} error={str(exc)}")
+                    logger.exception("appointment.calendar_error", error=exc.__class__.__name__)
+                    state.log_event("appointment.error", f"patient={incoming} error={str(exc)}", patient=incoming, error=exc.__class__.__name__)
 
-                    # Si falla, NO confirmar la cita
+                    # Si falla, NO confirmar la cita y soltar el horario
+                    release_slot(incoming, conversation.selected_doctor, claimed_dt)
                     response_text = (
                         f"Lo siento, tuve un problema al crear tu cita en el sistema. "
                         f"Por favor intenta de nuevo o llámanos directamente al hospital. "
                         f"Disculpa las molestias."
                     )
 
+                # Las demás ofertas al paciente ya no hacen falta
+                release_patient_holds(incoming)
+
                 await gateway.send_message(
                     OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
                 )
@@ -367,21 +656,25 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
 
             # Si estamos listos para ofrecer horarios pero aún no los hemos ofrecido
             elif appointment_info.get('ready_to_offer_slots') and not conversation.proposed_times:
-                print(f"[OFFERING SLOTS] Patient ready to see available times")
+                logger.info("availability.offering")
                 try:
                     calendar = CalendarClient()
                     tz = ZoneInfo(settings.scheduler_timezone)
                     now = datetime.now(tz)
-                    start_date = now
-                    end_date = now + timedelta(days=7)
-
-                    existing_events = await calendar.list_events(start_date, end_date)
-                    available_slots = await ai.suggest_available_slots(
-                        existing_events,
-                        settings.scheduler_timezone,
-                        days_ahead=7
+                    first_day = (now + timedelta(days=1)).date()
+                    start_date = datetime.combine(first_day, datetime.min.time(), tzinfo=tz)
+                    end_date = start_date + timedelta(days=7)
+
+                    available_slots = await window_slots(
+                        conversation.selected_doctor,
+                        conversation.selected_office,
+                        first_day,
+                        first_day + timedelta(days=6),
+                        calendar,
                     )
 
+                    available_slots = hold_offered_slots(incoming, conversation.selected_doctor, available_slots)
+
                     if available_slots:
                         conversation.proposed_times = available_slots[:5]
                         state.set_appointment_conversation(incoming, conversation)
@@ -402,7 +695,11 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                         state.add_message_to_history(incoming, "assistant", response_text)
                         return {"status": "offered_slots"}
                     else:
-                        response_text = "Déjame revisar mi agenda... Actualmente no tengo horarios disponibles en los próximos días. ¿Podrías llamarme directamente?"
+                        waitlisted = join_waitlist(
+                            incoming, conversation.selected_doctor, conversation.selected_office, start_date, end_date
+                        )
+                        waitlist_text = " Te anoté en la lista de espera y te aviso si se libera un horario." if waitlisted else ""
+                        response_text = f"Déjame revisar mi agenda... Actualmente no tengo horarios disponibles en los próximos días.{waitlist_text} ¿Podrías llamarme directamente?"
                         await gateway.send_message(
                             OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
                         )
@@ -410,8 +707,7 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                         return {"status": "no_slots"}
 
                 except Exception as exc:
-                    import traceback
-                    print(f"[CALENDAR ERROR] {traceback.format_exc()}")
+                    logger.exception("availability.calendar_error", error=exc.__class__.__name__)
                     response_text = "Disculpa, dame un momento para revisar mi agenda. Si es urgente, puedes llamarme directamente."
                     await gateway.send_message(
                         OutgoingWhatsAppMessage(to_number=message.from_number, text=response_text)
@@ -420,9 +716,14 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
                     return {"status": "calendar_error"}
 
         # No hay conversación activa o está en estado inicial - usar respuesta conversacional del LLM
-        print(f"[DEFAULT RESPONSE PATH] No conversation or not offering slots, using analyze_health_query")
+        logger.debug("health.default_path")
         analysis = await ai.analyze_health_query(message.text, conversation_history=history)
-        print(f"[ANALYSIS RESULT] emergency={analysis.get('is_emergency')} needs_appt={analysis.get('needs_appointment')} response={analysis.get('suggested_response', '')[:100]}")
+        logger.info(
+            "health.analysis",
+            emergency=analysis.get('is_emergency'),
+            needs_appt=analysis.get('needs_appointment'),
+            response=analysis.get('suggested_response', '')[:100],
+        )
 
         is_emergency = analysis.get("is_emergency", False)
         needs_appointment = analysis.get("needs_appointment", False)
@@ -433,15 +734,20 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
         state.log_event(
             "health.analysis",
             f"from={incoming} emergency={is_emergency} needs_appt={needs_appointment} urgency={urgency}",
+            patient=incoming,
         )
 
+        # Pregunta informativa de primer mensaje: candidata a la caché de FAQ (la aprueba un admin)
+        if first_turn and not (is_emergency or needs_appointment or needs_more_info):
+            faq_cache.propose(message.text, suggested_response)
+
         # Usar respuesta conversacional del LLM
         response_text = suggested_response
-        print(f"[SENDING RESPONSE] to={incoming} text={response_text[:100]}")
+        logger.info("whatsapp.sending", to=incoming, text=response_text[:100])
 
         # Si es emergencia, loguear
         if is_emergency:
-            state.log_event("health.emergency", f"from={incoming} message={message.text[:50]}")
+            state.log_event("health.emergency", f"from={incoming} message={message.text[:50]}", patient=incoming)
 
         # Enviar respuesta
         await gateway.send_message(
@@ -454,7 +760,7 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
         # Guardar respuesta en historial
         state.add_message_to_history(incoming, "assistant", response_text)
 
-        state.log_event("whatsapp.response_sent", f"to={incoming} emergency={is_emergency} appt={needs_appointment}")
+        state.log_event("whatsapp.response_sent", f"to={incoming} emergency={is_emergency} appt={needs_appointment}", patient=incoming)
 
         return {
             "status": "processed",
@@ -466,7 +772,14 @@ async def whatsapp_incoming(message: IncomingWhatsAppMessage):
     except Exception as exc:
         import traceback
         error_detail = traceback.format_exc()
-        state.log_event("whatsapp.error", f"from={incoming} error={str(exc)} traceback={error_detail[:500]}")
+        state.log_event(
+            "whatsapp.error",
+            f"from={incoming} error={str(exc)} traceback={error_detail[:500]}",
+            patient=incoming,
+            error=exc.__class__.__name__,
+        )
+        if message.message_id:
+            release_message(message.message_id)
         # En caso de error, enviar respuesta genérica
         try:
             error_response = "Disculpa, estoy teniendo problemas técnicos. Por favor intenta de nuevo o llama al doctor directamente si es urgente."
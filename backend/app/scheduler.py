@@ -1,15 +1,27 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from .config import settings
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from .briefing import refresh_briefing
+from .calendar_sync import calendar_sync
+from .dedup import prune_processed_messages
+from .holds import prune_expired_holds
+from .metrics import observe_scheduler
+from .patient_reminders import claim_patient_reminder, patient_index, patient_reminder_key, reminder_text
+from .reminders import REMINDER_LABELS, claim_reminder, release_reminder, reminder_engine, reminder_key
 from .routes.gmail import poll_and_notify
 from .schemas import OutgoingWhatsAppMessage
 from .services.calendar import CalendarClient
+from .services.dispatcher import dispatcher
 from .services.whatsapp_gateway import WhatsAppGateway
 from .state import state
+from .tracing import flush_traces
+from .waitlist import expire_waitlist_offers
 
 scheduler = AsyncIOScheduler(timezone=settings.scheduler_timezone)
 
@@ -17,6 +29,7 @@ scheduler = AsyncIOScheduler(timezone=settings.scheduler_timezone)
 def start_scheduler():
     if scheduler.running:
         return
+    observe_scheduler(scheduler)
     scheduler.start()
 
 
@@ -30,48 +43,103 @@ def schedule_gmail_poll(minutes: int | None = None):
     )
 
 
-async def check_calendar_reminders():
-    cal = CalendarClient()
+def _on_calendar_change(events: list[dict], full_sync: bool):
     now = datetime.now(ZoneInfo(settings.scheduler_timezone))
-    horizon = now + timedelta(hours=24)
-    events = await cal.list_events(now, horizon, max_results=20)
-    gateway = WhatsAppGateway()
-    offsets = [1440, 60, 10]
-    label = {1440: "24h", 60: "1h", 10: "10 min"}
-    for ev in events:
-        start = ev.get("start", {}).get("dateTime")
-        if not start:
-            continue
-        try:
-            start_dt = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(
-                ZoneInfo(settings.scheduler_timezone)
+    if full_sync:
+        seen = {ev.get("id") for ev in events}
+        for event_id in [k for k in reminder_engine.targets if k not in seen]:
+            reminder_engine.remove_event(event_id)
+        patient_index.reset(seen)
+    changed = [ev for ev in events if reminder_engine.upsert_event(ev, now)]
+    if changed or full_sync:
+        arm_reminders()
+    changed = [ev for ev in events if patient_index.upsert_event(ev, now)]
+    if changed or full_sync:
+        arm_patient_reminders()
+
+
+calendar_sync.subscribe(_on_calendar_change)
+
+
+def _arm(engine, job_id: str, func):
+    """Programa un único job para el siguiente vencimiento del heap."""
+    next_fire = engine.next_fire_at()
+    if next_fire is None:
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+        return
+    scheduler.add_job(
+        func,
+        DateTrigger(run_date=next_fire),
+        id=job_id,
+        replace_existing=True,
+        misfire_grace_time=None,
+    )
+
+
+def arm_reminders():
+    _arm(reminder_engine, "calendar_reminders", fire_due_reminders)
+
+
+def arm_patient_reminders():
+    _arm(patient_index.engine, "patient_reminders", fire_patient_reminders)
+
+
+async def sync_calendar_changes():
+    await calendar_sync.run()
+
+
+def _owner_reminder_sent(key: str, text: str):
+    state.mark_reminder_sent(key)
+    state.log_event("calendar.reminder", text)
+
+
+async def fire_due_reminders():
+    """
+    Encola los recordatorios vencidos del dueño en el dispatcher (con reintentos).
+    El claim durable evita duplicados; si el envío se agota se libera.
+    """
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    try:
+        for target, offset in reminder_engine.pop_due(now):
+            key = reminder_key(target, offset)
+            if key in state.reminders_sent or not claim_reminder(key):
+                continue
+            when = target.start.strftime("%Y-%m-%d %H:%M")
+            extra = f" con {target.attendees}" if target.attendees else ""
+            place = f" en {target.location}" if target.location else ""
+            text = (
+                f"Recordatorio: en {REMINDER_LABELS.get(offset, f'{offset} min')} "
+                f"tienes {target.summary}{extra}{place} a las {when}."
             )
-        except Exception:
-            continue
-        delta_minutes = int((start_dt - now).total_seconds() / 60)
-        for offset in offsets:
-            if abs(delta_minutes - offset) <= 1:
-                key = f"{ev.get('id')}:{offset}"
-                if key in state.reminders_sent:
-                    continue
-                summary = ev.get("summary", "(sin título)")
-                location = ev.get("location")
-                attendees = ev.get("attendees", [])
-                who = ", ".join([a.get("email", "") for a in attendees if a.get("email")])
-                when = start_dt.strftime("%Y-%m-%d %H:%M")
-                extra = f" con {who}" if who else ""
-                place = f" en {location}" if location else ""
-                text = (
-                    f"Recordatorio: en {label.get(offset, f'{offset} min')} "
-                    f"tienes {summary}{extra}{place} a las {when}."
-                )
-                await gateway.send_message(
-                    OutgoingWhatsAppMessage(
-                        to_number=settings.owner_whatsapp_number, text=text
-                    )
-                )
-                state.mark_reminder_sent(key)
-                state.log_event("calendar.reminder", text)
+            await dispatcher.enqueue(
+                OutgoingWhatsAppMessage(to_number=settings.owner_whatsapp_number, text=text),
+                on_sent=lambda key=key, text=text: _owner_reminder_sent(key, text),
+                on_failed=lambda key=key: release_reminder(key),
+            )
+    finally:
+        arm_reminders()
+
+
+async def fire_patient_reminders():
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    try:
+        for appt, offset in patient_index.pop_due(now):
+            if not claim_patient_reminder(appt, offset):
+                continue
+            text = reminder_text(appt, offset)
+            await dispatcher.enqueue(
+                OutgoingWhatsAppMessage(to_number=appt.patient_number, text=text),
+                on_failed=lambda key=patient_reminder_key(appt, offset): release_reminder(key),
+            )
+            state.log_event(
+                "patient.reminder",
+                f"patient={appt.patient_number} event={appt.event_id} offset={offset}",
+                patient=appt.patient_number,
+                doctor=appt.doctor,
+            )
+    finally:
+        arm_patient_reminders()
 
 
 async def send_gap_recommendations():
@@ -106,7 +174,7 @@ async def send_gap_recommendations():
     else:
         gap_end = None
     if gap_end:
-        pending_count = len(state.pending_by_user)
+        pending_count = state.pending_count()
         pending_note = f" Tienes {pending_count} pendientes." if pending_count else ""
         text = (
             f"Tienes un hueco de 2h entre {gap_start.strftime('%H:%M')} y {gap_end.strftime('%H:%M')}."
@@ -123,11 +191,13 @@ async def send_gap_recommendations():
 
 
 def schedule_calendar_checks():
+    # Los recordatorios se programan solos (arm_reminders); aquí solo el sync incremental
     scheduler.add_job(
-        check_calendar_reminders,
-        IntervalTrigger(minutes=1),
-        id="calendar_reminders",
+        sync_calendar_changes,
+        IntervalTrigger(minutes=settings.calendar_sync_minutes),
+        id="calendar_sync",
         replace_existing=True,
+        next_run_time=datetime.now(ZoneInfo(settings.scheduler_timezone)),
     )
     scheduler.add_job(
         send_gap_recommendations,
@@ -135,3 +205,51 @@ def schedule_calendar_checks():
         id="calendar_recos",
         replace_existing=True,
     )
+    # Resumen del dueño: se arma de noche; el refresco solo rehace si el calendario cambió
+    scheduler.add_job(
+        refresh_briefing,
+        CronTrigger(hour=settings.briefing_hour),
+        id="briefing_nightly",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        refresh_briefing,
+        IntervalTrigger(minutes=settings.briefing_refresh_minutes),
+        id="briefing_refresh",
+        replace_existing=True,
+        next_run_time=datetime.now(ZoneInfo(settings.scheduler_timezone)) + timedelta(seconds=30),
+    )
+
+
+def schedule_maintenance():
+    scheduler.add_job(
+        prune_processed_messages,
+        IntervalTrigger(hours=1),
+        id="dedup_prune",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        prune_expired_holds,
+        IntervalTrigger(minutes=15),
+        id="holds_prune",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        expire_waitlist_offers,
+        IntervalTrigger(minutes=2),
+        id="waitlist_offers",
+        replace_existing=True,
+    )
+    if settings.trace_exporter != "none":
+        scheduler.add_job(
+            flush_traces,
+            IntervalTrigger(seconds=10),
+            id="traces_flush",
+            replace_existing=True,
+        )
+    scheduler.add_job(
+        state.evict_idle,
+        IntervalTrigger(minutes=10),
+        id="conversations_evict",
+        replace_existing=True,
+    )
@@ -5,6 +5,7 @@ class IncomingWhatsAppMessage(BaseModel):
     from_number: str
     text: str
     timestamp: str | None = None
+    message_id: str | None = None
 
 
 class OutgoingWhatsAppMessage(BaseModel):
@@ -19,3 +20,9 @@ class CalendarEventDraft(BaseModel):
     location: str | None = None
     attendees: list[str] = []
     notes: str | None = None
+
+
+class FaqEntryIn(BaseModel):
+    questions: list[str]
+    answer: str
+    ttl_hours: float | None = None
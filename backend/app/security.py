@@ -0,0 +1,18 @@
+import secrets
+
+from fastapi import Header, HTTPException, Query
+
+from .config import settings
+
+
+def require_internal_key(x_api_key: str | None = Header(default=None)):
+    """Dependencia para endpoints de operación: header x-api-key = API_KEY_INTERNAL."""
+    if not x_api_key or not secrets.compare_digest(x_api_key, settings.api_key_internal):
+        raise HTTPException(status_code=401, detail="invalid api key")
+
+
+def require_stream_key(
+    x_api_key: str | None = Header(default=None), key: str | None = Query(default=None)
+):
+    """Como require_internal_key, pero también acepta ?key=: EventSource no puede mandar headers."""
+    require_internal_key(x_api_key or key)
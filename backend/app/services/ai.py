@@ -1,24 +1,132 @@
-from openai import AsyncOpenAI
 import json
-from datetime import datetime, timedelta
+import time
+from importlib.util import find_spec
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
-from typing import List
+from typing import TYPE_CHECKING, List
 
+if TYPE_CHECKING:
+    import httpx
+
+from ..clinic import OFFICE_HOURS
 from ..config import settings
+from ..metrics import ai_errors, ai_seconds, record_usage
+from ..recorder import current_turn
 from ..schemas import CalendarEventDraft
+from ..tracing import span
+
+
+DAY_NAMES = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+MONTH_NAMES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+               "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def format_slot(slot_start: datetime) -> dict:
+    """Slot de 1 hora en el formato que se ofrece al paciente."""
+    day_name = DAY_NAMES[slot_start.weekday()]
+    month_name = MONTH_NAMES[slot_start.month - 1]
+    return {
+        "datetime": slot_start.isoformat(),
+        "display": f"{day_name} {slot_start.day} de {month_name} a las {slot_start.hour}:00",
+        "day": day_name,
+        "date": slot_start.strftime("%Y-%m-%d"),
+        "time": f"{slot_start.hour}:00"
+    }
+
+
+def format_day(day: date) -> str:
+    """Día para usar dentro de una frase: "viernes 24 de octubre"."""
+    return f"{DAY_NAMES[day.weekday()].lower()} {day.day} de {MONTH_NAMES[day.month - 1]}"
+
+
+def format_days(first: date, last: date) -> str:
+    """"el viernes 24 de octubre" o, para un rango, "del lunes 2 al viernes 6 de marzo"."""
+    if first == last:
+        return f"el {format_day(first)}"
+    start = f"{DAY_NAMES[first.weekday()].lower()} {first.day}" if first.month == last.month else format_day(first)
+    return f"del {start} al {format_day(last)}"
+
+
+def build_http_client() -> "httpx.AsyncClient":
+    """Pool HTTP para la API: conexiones reutilizadas entre turnos (sin TLS por mensaje)."""
+    # openai y httpx se importan al primer uso: son lo más pesado del arranque en frío
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=settings.openai_http2 and find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_connections,
+            keepalive_expiry=settings.openai_keepalive_seconds,
+        ),
+        timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds),
+    )
 
 
 class AIClient:
-    def __init__(self, api_key: str | None = None, model: str | None = None):
-        self.client = AsyncOpenAI(api_key=api_key or settings.openai_api_key)
+    def __init__(
+        self,
+        api_key: str | None = None,
+        model: str | None = None,
+        http_client: "httpx.AsyncClient | None" = None,
+    ):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(
+            api_key=api_key or settings.openai_api_key,
+            http_client=http_client,
+            timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds),
+            max_retries=settings.openai_max_retries,
+        )
         self.model = model or settings.openai_model
 
+    async def close(self):
+        await self.client.close()
+
+    async def _complete(self, method: str, timeout: float | None = None, max_retries: int | None = None, **kwargs):
+        """
+        chat.completions.create con latencia, errores y tokens por método.
+        `timeout`/`max_retries` pisan los del cliente solo para esta llamada.
+        """
+        client = self.client
+        overrides = {k: v for k, v in (("timeout", timeout), ("max_retries", max_retries)) if v is not None}
+        if overrides:
+            client = client.with_options(**overrides)
+        started = time.perf_counter()
+        with span(f"ai.{method}", model=kwargs.get("model")) as current:
+            try:
+                turn = current_turn()
+                if turn is not None:
+                    from openai.types.chat import ChatCompletion
+
+                    response = await turn.through(
+                        f"ai.{method}",
+                        client.chat.completions.create,
+                        (),
+                        kwargs,
+                        to_json=lambda r: r.model_dump(mode="json", exclude_none=True),
+                        from_json=ChatCompletion.model_validate,
+                    )
+                else:
+                    response = await client.chat.completions.create(**kwargs)
+            except Exception as exc:
+                ai_errors.inc(method, exc.__class__.__name__)
+                raise
+            finally:
+                ai_seconds.observe(time.perf_counter() - started, method)
+            usage = record_usage(method, response)
+            if current is not None and usage:
+                current.attributes.update(usage)
+        return response
+
     async def summarize_email(self, subject: str, body: str) -> str:
         prompt = (
             "Resume en 1 oración el correo más importante para el dueño del inbox. "
             "No inventes detalles."
         )
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "summarize_email",
             model=self.model,
             messages=[
                 {"role": "system", "content": prompt},
@@ -28,6 +136,51 @@ class AIClient:
         output = response.choices[0].message.content or ""
         return output.strip() or "Sin resumen."
 
+    async def summarize_digest(self, emails: list[dict]) -> list[dict]:
+        """
+        Resume varios correos en una sola completion. `emails`: [{id, sender,
+        subject, body}]. Devuelve [{id, summary, importance 1-5}] ordenado de más
+        a menos importante; un correo que el modelo omita queda con su asunto.
+        """
+        prompt = (
+            "Eres el asistente del dueño de un consultorio. Para CADA correo de la lista, "
+            "resume en 1 oración lo que importa al dueño (sin inventar detalles) y califica "
+            "su importancia de 1 (irrelevante) a 5 (urgente o requiere respuesta). "
+            'Devuelve JSON: {"items": [{"id": "...", "summary": "...", "importance": 1-5}]}'
+        )
+        listing = "\n\n".join(
+            f"[{e['id']}] De: {e['sender']}\nAsunto: {e['subject']}\n{e['body']}" for e in emails
+        )
+        response = await self._complete(
+            "summarize_digest",
+            model=self.model,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": listing},
+            ],
+            response_format={"type": "json_object"},
+        )
+        raw = response.choices[0].message.content or "{}"
+        try:
+            items = json.loads(raw).get("items") or []
+        except (json.JSONDecodeError, AttributeError):
+            items = []
+        by_id = {str(item.get("id")): item for item in items if isinstance(item, dict)}
+        results = []
+        for position, email in enumerate(emails):
+            item = by_id.get(email["id"], {})
+            try:
+                importance = min(5, max(1, int(item.get("importance", 2))))
+            except (TypeError, ValueError):
+                importance = 2
+            summary = str(item.get("summary") or "").strip() or email["subject"]
+            results.append({"id": email["id"], "summary": summary, "importance": importance, "position": position})
+        # Estable: a igual importancia queda el orden de llegada
+        results.sort(key=lambda r: (-r["importance"], r["position"]))
+        for result in results:
+            del result["position"]
+        return results
+
     async def classify_intent(self, text: str, has_pending: bool, pending_summary: str | None) -> dict:
         prompt = (
             "Eres un router de intents para WhatsApp. Elige SOLO un intent: "
@@ -46,7 +199,8 @@ class AIClient:
             "has_pending_email": has_pending,
             "pending_summary": pending_summary or "",
         }
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "classify_intent",
             model=self.model,
             messages=[
                 {"role": "system", "content": prompt},
@@ -99,12 +253,13 @@ class AIClient:
         # Agregar historial si existe
         if conversation_history:
             for msg in conversation_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
+                messages.append({"role": msg.role, "content": msg.content})
 
         # Agregar mensaje actual
         messages.append({"role": "user", "content": text})
 
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "analyze_health_query",
             model=self.model,
             messages=messages,
             response_format={"type": "json_object"},
@@ -148,9 +303,10 @@ class AIClient:
         messages = [{"role": "system", "content": prompt}]
         if conversation_history:
             for msg in conversation_history[-5:]:  # Solo últimos 5 mensajes
-                messages.append({"role": msg["role"], "content": msg["content"]})
+                messages.append({"role": msg.role, "content": msg.content})
 
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "extract_datetime_request",
             model=self.model,
             messages=messages,
             response_format={"type": "json_object"},
@@ -190,6 +346,8 @@ class AIClient:
             "- preferred_date_mention (str): si mencionó fecha ('mañana', 'lunes', fecha específica, o null)\n"
             "- symptoms_summary (str): resumen breve de síntomas/motivo (max 100 caracteres)\n"
             "- ready_to_offer_slots (bool): true si tiene suficiente info y quiere agendar\n"
+            "- appointment_action (str): 'cancel' si quiere CANCELAR una cita que ya tiene agendada, "
+            "'reschedule' si quiere REAGENDAR/CAMBIAR FECHA de una cita ya agendada, 'new' si quiere una cita nueva, o null\n"
             "- needs_clarification (str): qué información falta para agendar (o null si está todo)\n\n"
             "IMPORTANTE: Analiza el contexto COMPLETO, no solo el último mensaje. Si ya identificaste doctor/ubicación en mensajes anteriores, mantenlos. "
             "Si el paciente dice 'Calle 13' o 'la del centro', extrae 'calle13'. Si dice 'Calle 09' o 'la del norte', extrae 'calle09'.\n\n"
@@ -205,9 +363,10 @@ class AIClient:
         # Agregar toda la conversación
         if conversation_history:
             for msg in conversation_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
+                messages.append({"role": msg.role, "content": msg.content})
 
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "extract_appointment_info",
             model=self.model,
             messages=messages,
             response_format={"type": "json_object"},
@@ -224,6 +383,7 @@ class AIClient:
                 "preferred_date_mention": None,
                 "symptoms_summary": "",
                 "ready_to_offer_slots": False,
+                "appointment_action": None,
                 "needs_clarification": "Error al procesar"
             }
 
@@ -245,7 +405,8 @@ class AIClient:
             "- NO des diagnósticos definitivos, solo orientación\n"
             "- Sé breve (máximo 3-4 párrafos cortos), cálido y profesional"
         )
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "chat_response",
             model=self.model,
             messages=[
                 {"role": "system", "content": prompt},
@@ -265,7 +426,8 @@ class AIClient:
             "No inventes datos."
         )
         now_iso = datetime.now(ZoneInfo(timezone)).isoformat()
-        response = await self.client.chat.completions.create(
+        response = await self._complete(
+            "parse_event",
             model=self.model,
             messages=[
                 {
@@ -319,7 +481,7 @@ class AIClient:
             day = now + timedelta(days=day_offset + 1)  # Empezar desde mañana
 
             # Horario: Todos los días 10am-6pm
-            start_hour, end_hour = 10, 18  # 10am-6pm
+            start_hour, end_hour = OFFICE_HOURS
 
             # Revisar cada hora
             for hour in range(start_hour, end_hour):
@@ -345,17 +507,24 @@ class AIClient:
                             continue
 
                 if not has_conflict:
-                    # Formatear para el usuario
-                    day_name = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"][day.weekday()]
-                    month_names = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
-                                   "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
-                    month_name = month_names[slot_start.month - 1]
-                    available_slots.append({
-                        "datetime": slot_start.isoformat(),
-                        "display": f"{day_name} {day.day} de {month_name} a las {hour}:00",
-                        "day": day_name,
-                        "date": day.strftime("%Y-%m-%d"),
-                        "time": f"{hour}:00"
-                    })
+                    available_slots.append(format_slot(slot_start))
 
         return available_slots[:10]  # Retornar máximo 10 slots
+
+
+# Un solo cliente (y pool) para toda la app: rutas y jobs lo piden acá
+_shared: AIClient | None = None
+
+
+def get_ai_client() -> AIClient:
+    global _shared
+    if _shared is None:
+        _shared = AIClient(http_client=build_http_client())
+    return _shared
+
+
+async def close_ai_client():
+    global _shared
+    if _shared is not None:
+        await _shared.close()
+        _shared = None
@@ -1,8 +1,13 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from .google_api import google_api
 from .google_auth import get_calendar_service
 from ..config import settings
+from ..metrics import google_errors, google_seconds, timed
+from ..logs import get_logger
+
+logger = get_logger(__name__)
 
 
 def _to_rfc3339(dt: datetime) -> str:
@@ -25,36 +30,95 @@ class CalendarClient:
         if not self.service:
             raise RuntimeError("Calendar not authorized")
 
-    async def list_events(self, start: datetime, end: datetime, max_results: int = 10):
+    async def _execute(self, request):
+        return await google_api.execute("calendar", request, self.service)
+
+    @timed(google_seconds, google_errors, "calendar", "list_events")
+    async def list_events(self, start: datetime, end: datetime, max_results: int = 10, calendar_id: str | None = None):
         self._ensure_service()
-        resp = (
-            self.service.events()
-            .list(
-                calendarId=settings.google_calendar_id,
-                timeMin=_to_rfc3339(start),
-                timeMax=_to_rfc3339(end),
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
+        request = self.service.events().list(
+            calendarId=calendar_id or settings.google_calendar_id,
+            timeMin=_to_rfc3339(start),
+            timeMax=_to_rfc3339(end),
+            maxResults=max_results,
+            singleEvents=True,
+            orderBy="startTime",
         )
+        resp = await self._execute(request)
         return resp.get("items", [])
 
-    async def create_event(self, payload: dict):
+    @timed(google_seconds, google_errors, "calendar", "sync_events")
+    async def sync_events(
+        self, sync_token: str | None = None, start: datetime | None = None, calendar_id: str | None = None
+    ):
+        """
+        Sincronización incremental. Sin sync_token hace el sync completo desde `start`;
+        con sync_token devuelve solo los eventos cambiados (incluye cancelados).
+        Devuelve (items, next_sync_token). Un token vencido lanza HttpError 410.
+        """
         self._ensure_service()
-        return (
-            self.service.events()
-            .insert(calendarId=settings.google_calendar_id, body=payload)
-            .execute()
+        items = []
+        page_token = None
+        while True:
+            params = {
+                "calendarId": calendar_id or settings.google_calendar_id,
+                "singleEvents": True,
+                "maxResults": 250,
+            }
+            if sync_token:
+                params["syncToken"] = sync_token
+            elif start:
+                params["timeMin"] = _to_rfc3339(start)
+            if page_token:
+                params["pageToken"] = page_token
+            resp = await self._execute(self.service.events().list(**params))
+            items.extend(resp.get("items", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return items, resp.get("nextSyncToken")
+
+    @timed(google_seconds, google_errors, "calendar", "free_busy")
+    async def free_busy(self, calendar_ids: list[str], start: datetime, end: datetime) -> dict[str, list[tuple[datetime, datetime]]]:
+        """Intervalos ocupados de varios calendarios en una sola llamada freebusy.query."""
+        self._ensure_service()
+        resp = await self._execute(
+            self.service.freebusy().query(
+                body={
+                    "timeMin": _to_rfc3339(start),
+                    "timeMax": _to_rfc3339(end),
+                    "timeZone": settings.scheduler_timezone,
+                    "items": [{"id": cal_id} for cal_id in calendar_ids],
+                }
+            )
+        )
+        busy = {}
+        for cal_id, info in resp.get("calendars", {}).items():
+            if info.get("errors"):
+                logger.warning("calendar.freebusy_error", calendar=cal_id, errors=info["errors"])
+            busy[cal_id] = [(_parse_dt(b["start"]), _parse_dt(b["end"])) for b in info.get("busy", [])]
+        return busy
+
+    @timed(google_seconds, google_errors, "calendar", "create_event")
+    async def create_event(self, payload: dict, calendar_id: str | None = None):
+        self._ensure_service()
+        return await self._execute(
+            self.service.events().insert(calendarId=calendar_id or settings.google_calendar_id, body=payload)
+        )
+
+    @timed(google_seconds, google_errors, "calendar", "patch_event")
+    async def patch_event(self, event_id: str, payload: dict, calendar_id: str | None = None):
+        self._ensure_service()
+        return await self._execute(
+            self.service.events().patch(
+                calendarId=calendar_id or settings.google_calendar_id, eventId=event_id, body=payload
+            )
         )
 
-    async def delete_event(self, event_id: str):
+    @timed(google_seconds, google_errors, "calendar", "delete_event")
+    async def delete_event(self, event_id: str, calendar_id: str | None = None):
         self._ensure_service()
-        return (
-            self.service.events()
-            .delete(calendarId=settings.google_calendar_id, eventId=event_id)
-            .execute()
+        return await self._execute(
+            self.service.events().delete(calendarId=calendar_id or settings.google_calendar_id, eventId=event_id)
         )
 
     @staticmethod
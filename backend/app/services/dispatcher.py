@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from ..config import settings
+from ..logs import get_logger
+from ..schemas import OutgoingWhatsAppMessage
+from .whatsapp_gateway import WhatsAppGateway
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitedDispatcher:
+    """
+    Cola de envíos masivos hacia el gateway (recordatorios a pacientes).
+    Los workers comparten un token bucket para no saturar WhatsApp ni el gateway;
+    las respuestas interactivas siguen usando WhatsAppGateway directo.
+    """
+
+    def __init__(
+        self,
+        gateway: WhatsAppGateway | None = None,
+        rate_per_second: float | None = None,
+        workers: int | None = None,
+        max_attempts: int = 3,
+    ):
+        # El cliente HTTP compartido se arma con el primer envío, no al importar
+        self._gateway = gateway
+        rate = rate_per_second or settings.dispatcher_rate_per_second
+        self.bucket = TokenBucket(rate, burst=max(1, int(rate)))
+        self.worker_count = workers or settings.dispatcher_workers
+        self.max_attempts = max_attempts
+        self.queue: asyncio.Queue | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def gateway(self) -> WhatsAppGateway:
+        if self._gateway is None:
+            import httpx
+
+            self._gateway = WhatsAppGateway(client=httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=8)))
+        return self._gateway
+
+    def _ensure_started(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.tasks = [t for t in self.tasks if not t.done()]
+        while len(self.tasks) < self.worker_count:
+            self.tasks.append(asyncio.create_task(self._worker()))
+
+    async def enqueue(self, message: OutgoingWhatsAppMessage, on_sent=None, on_failed=None):
+        """`on_sent` corre al entregarse; `on_failed`, si se agotan los reintentos."""
+        self._ensure_started()
+        await self.queue.put((message, on_sent, on_failed, 1))
+
+    def pending(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def join(self):
+        if self.queue:
+            await self.queue.join()
+
+    async def _worker(self):
+        while True:
+            message, on_sent, on_failed, attempt = await self.queue.get()
+            try:
+                await self.bucket.acquire()
+                resp = await self.gateway.send_message(message)
+                if resp is not None:
+                    resp.raise_for_status()
+                self.sent += 1
+                if on_sent:
+                    on_sent()
+            except Exception as exc:
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(2 ** attempt)
+                    await self.queue.put((message, on_sent, on_failed, attempt + 1))
+                else:
+                    self.failed += 1
+                    logger.error("dispatcher.send_failed", to=message.to_number, error=exc.__class__.__name__, detail=str(exc))
+                    if on_failed:
+                        on_failed()
+            finally:
+                self.queue.task_done()
+
+
+dispatcher = RateLimitedDispatcher()
@@ -1,7 +1,15 @@
 import base64
+import re
 from email.message import EmailMessage
+from html.parser import HTMLParser
 
+from .google_api import google_api
 from .google_auth import get_gmail_service
+from ..config import settings
+from ..metrics import google_errors, google_seconds, timed
+
+# Lo que necesita el triage; el cuerpo solo se baja para los correos que pasan
+TRIAGE_HEADERS = ["From", "Subject", "List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted"]
 
 
 class GmailClient:
@@ -12,46 +20,83 @@ class GmailClient:
         if not self.service:
             raise RuntimeError("Gmail not authorized")
 
-    def list_unread(self, max_results: int = 5):
+    async def _execute(self, request):
+        return await google_api.execute("gmail", request, self.service)
+
+    @timed(google_seconds, google_errors, "gmail", "list_unread")
+    async def list_unread(self, max_results: int = 5):
         self._ensure_service()
-        resp = (
-            self.service.users()
-            .messages()
-            .list(userId="me", q="is:unread", maxResults=max_results)
-            .execute()
+        resp = await self._execute(
+            self.service.users().messages().list(userId="me", q="is:unread", maxResults=max_results)
         )
         return resp.get("messages", [])
 
-    def get_message(self, message_id: str):
+    @timed(google_seconds, google_errors, "gmail", "get_message")
+    async def get_message(self, message_id: str):
+        self._ensure_service()
+        return await self._execute(self.service.users().messages().get(userId="me", id=message_id, format="full"))
+
+    @timed(google_seconds, google_errors, "gmail", "get_metadata")
+    async def get_metadata(self, message_id: str):
+        """Solo encabezados (sin cuerpo ni partes): mucho más liviano que format=full."""
         self._ensure_service()
-        msg = (
-            self.service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="full")
-            .execute()
+        return await self._execute(
+            self.service.users().messages().get(
+                userId="me", id=message_id, format="metadata", metadataHeaders=TRIAGE_HEADERS
+            )
         )
-        return msg
 
-    def archive_message(self, message_id: str):
+    @timed(google_seconds, google_errors, "gmail", "get_attachment")
+    async def get_attachment(self, message_id: str, attachment_id: str):
         self._ensure_service()
-        self.service.users().messages().modify(
-            userId="me",
-            id=message_id,
-            body={"removeLabelIds": ["INBOX", "UNREAD"]},
-        ).execute()
+        return await self._execute(
+            self.service.users().messages().attachments().get(userId="me", messageId=message_id, id=attachment_id)
+        )
+
+    async def read_body(self, message: dict) -> str:
+        """
+        Texto del correo para resumir: la parte text/plain (o el HTML sin
+        etiquetas), hasta `email_body_max_bytes`. Una parte grande que Gmail
+        manda por attachmentId se baja solo si es la elegida y no pasa de
+        `email_body_fetch_max_bytes`; si no hay nada, queda el snippet.
+        """
+        snippet = message.get("snippet", "")
+        part = find_body_part(message.get("payload", {}))
+        if part is None:
+            return snippet
+        body = part.get("body", {})
+        data = body.get("data")
+        if not data and body.get("attachmentId"):
+            if body.get("size", 0) > settings.email_body_fetch_max_bytes:
+                return snippet
+            data = (await self.get_attachment(message["id"], body["attachmentId"])).get("data")
+        return decode_part(part, data or "", settings.email_body_max_bytes) or snippet
 
-    def delete_message(self, message_id: str):
+    @timed(google_seconds, google_errors, "gmail", "archive_message")
+    async def archive_message(self, message_id: str):
         self._ensure_service()
-        self.service.users().messages().delete(userId="me", id=message_id).execute()
+        await self._execute(
+            self.service.users().messages().modify(
+                userId="me",
+                id=message_id,
+                body={"removeLabelIds": ["INBOX", "UNREAD"]},
+            )
+        )
 
-    def send_reply(self, to_email: str, subject: str, body: str):
+    @timed(google_seconds, google_errors, "gmail", "delete_message")
+    async def delete_message(self, message_id: str):
+        self._ensure_service()
+        await self._execute(self.service.users().messages().delete(userId="me", id=message_id))
+
+    @timed(google_seconds, google_errors, "gmail", "send_reply")
+    async def send_reply(self, to_email: str, subject: str, body: str):
         self._ensure_service()
         message = EmailMessage()
         message["To"] = to_email
         message["Subject"] = subject
         message.set_content(body)
         encoded = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        self.service.users().messages().send(userId="me", body={"raw": encoded}).execute()
+        await self._execute(self.service.users().messages().send(userId="me", body={"raw": encoded}))
 
 
 def extract_headers(payload: dict) -> dict:
@@ -60,10 +105,99 @@ def extract_headers(payload: dict) -> dict:
     for h in headers:
         name = h.get("name", "").lower()
         value = h.get("value", "")
-        if name in {"from", "subject"}:
+        if name in {"from", "subject", "list-unsubscribe", "list-id", "precedence", "auto-submitted"}:
             result[name] = value
     return result
 
 
-def extract_snippet(message: dict) -> str:
-    return message.get("snippet", "")
+def _part_header(part: dict, name: str) -> str:
+    for h in part.get("headers", []):
+        if h.get("name", "").lower() == name:
+            return h.get("value", "")
+    return ""
+
+
+def _is_attachment(part: dict) -> bool:
+    return bool(part.get("filename")) or _part_header(part, "content-disposition").lower().startswith("attachment")
+
+
+def find_body_part(payload: dict) -> dict | None:
+    """
+    Recorre el árbol MIME en profundidad y se detiene en el primer text/plain
+    que no sea adjunto; si no hay, el primer text/html. Los adjuntos ni se miran.
+    """
+    html = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if _is_attachment(part):
+            continue
+        mime = part.get("mimeType", "").lower()
+        if mime.startswith("multipart/"):
+            stack.extend(reversed(part.get("parts", [])))
+        elif mime == "text/plain":
+            return part
+        elif mime == "text/html" and html is None:
+            html = part
+    return html
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "head", "title"}
+    BREAKS = {"br", "p", "div", "li", "tr", "h1", "h2", "h3", "h4"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: list[str] = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.BREAKS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.chunks.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.chunks)
+
+
+_CHARSET_RE = re.compile(r'charset="?([\w.-]+)', re.IGNORECASE)
+_QUOTE_HEADER_RE = re.compile(r"^(El .+ escribió:|On .+ wrote:)$")
+
+
+def decode_part(part: dict, data: str, max_bytes: int) -> str:
+    """
+    Decodifica solo los primeros `max_bytes` del base64url de Gmail, en el
+    charset de la parte; quita el HTML, las citas ("> ...") y espacios de más.
+    """
+    # 4 caracteres de base64 por cada 3 bytes: no se decodifica más de lo que se usa
+    chunk = data[: -(-max_bytes // 3) * 4]
+    raw = base64.urlsafe_b64decode(chunk + "=" * (-len(chunk) % 4))[:max_bytes]
+    match = _CHARSET_RE.search(_part_header(part, "content-type"))
+    try:
+        text = raw.decode(match.group(1) if match else "utf-8", errors="replace")
+    except LookupError:
+        text = raw.decode("utf-8", errors="replace")
+    text = text.rstrip("\ufffd")  # el corte pudo caer a mitad de un carácter
+    if part.get("mimeType", "").lower() == "text/html":
+        text = html_to_text(text)
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if _QUOTE_HEADER_RE.match(line):
+            break  # de aquí para abajo es el hilo citado
+        if line and not line.startswith(">"):
+            lines.append(line)
+    return "\n".join(lines)
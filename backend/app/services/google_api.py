@@ -0,0 +1,270 @@
+"""
+Planificador central de requests a las APIs de Google.
+
+Todos los `.execute()` de CalendarClient y GmailClient pasan por acá:
+
+- Una cola por API con prioridad: lo que corre dentro de un turno de paciente
+  (`interactive()`) sale antes que los jobs de fondo.
+- Lo que está encolado al mismo tiempo se manda en un solo batch HTTP (hasta
+  `google_batch_max`); cada API tiene un único round trip en vuelo porque los
+  objetos de googleapiclient/httplib2 no son thread-safe.
+- Cuotas con token buckets por usuario y por proyecto (Gmail en unidades de
+  cuota). Un round trip con 429/403 de rate limit baja la tasa a la mitad; se
+  recupera de a poco con cada round trip limpio.
+- Errores transitorios (429, 403 de rate limit, 5xx, red) se reintentan con
+  backoff exponencial con jitter, respetando Retry-After si viene.
+
+El `.execute()` bloqueante corre en un hilo, así que ya no frena el loop.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from googleapiclient.errors import HttpError
+
+from ..config import settings
+from ..logs import get_logger
+from ..metrics import google_batch_size, google_queue_wait, google_retries
+
+logger = get_logger(__name__)
+
+INTERACTIVE, BACKGROUND = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Unidades de cuota de Gmail por método (el resto de Gmail cuesta 5; Calendar cuenta requests)
+GMAIL_UNITS = {
+    "gmail.users.messages.send": 100,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.batchModify": 50,
+}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+_priority: ContextVar[int] = ContextVar("google_priority", default=BACKGROUND)
+
+
+@contextmanager
+def interactive():
+    """Marca las llamadas a Google hechas dentro del bloque como de un paciente esperando."""
+    token = _priority.set(INTERACTIVE)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Tasa `rate`/s con ráfaga `rate` (un segundo); adaptativa ante rate limits."""
+
+    def __init__(self, rate: float):
+        self.configured = rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        self._refill()
+        cost = min(cost, self.rate)  # un batch más grande que la ráfaga espera a tenerla llena
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self._refill()
+        self.tokens -= cost
+
+    def penalize(self):
+        self.rate = max(self.configured * 0.1, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+    def reward(self):
+        if self.rate < self.configured:
+            self.rate = min(self.configured, self.rate + self.configured * 0.05)
+
+
+class _Call:
+    __slots__ = ("request", "service", "cost", "priority", "attempt", "enqueued", "future")
+
+    def __init__(self, request, service, cost: float, priority: int, future: asyncio.Future):
+        self.request = request
+        self.service = service
+        self.cost = cost
+        self.priority = priority
+        self.attempt = 0
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+def _status(exc: Exception) -> int | None:
+    resp = getattr(exc, "resp", None)
+    return getattr(resp, "status", None) if resp is not None else None
+
+
+def _reason(exc: HttpError) -> str:
+    try:
+        errors = json.loads(exc.content).get("error", {}).get("errors") or [{}]
+        return errors[0].get("reason", "")
+    except (ValueError, AttributeError, TypeError):
+        return ""
+
+
+def is_rate_limit(exc: Exception) -> bool:
+    status = _status(exc)
+    return status == 429 or (status == 403 and isinstance(exc, HttpError) and _reason(exc) in RATE_LIMIT_REASONS)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, HttpError):
+        status = _status(exc) or 0
+        return is_rate_limit(exc) or status >= 500
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+
+class ApiQueue:
+    def __init__(self, api: str, user_rate: float, project_rate: float):
+        self.api = api
+        self.user = TokenBucket(user_rate)
+        self.project = TokenBucket(project_rate)
+        self.heap: list[tuple[int, int, _Call]] = []
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def put(self, call: _Call):
+        heapq.heappush(self.heap, (call.priority, next(self.seq), call))
+        self.wakeup.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def _take_batch(self) -> list[_Call]:
+        """Lo más prioritario primero; solo lo que entra en la ráfaga de cuota disponible."""
+        batch: list[_Call] = []
+        cost = 0.0
+        while self.heap and len(batch) < settings.google_batch_max:
+            call = self.heap[0][2]
+            if batch and cost + call.cost > max(self.user.tokens, 1.0):
+                break
+            heapq.heappop(self.heap)
+            batch.append(call)
+            cost += call.cost
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            # Para tráfico de fondo vale la pena esperar un poco a que se junte más
+            if self.heap[0][0] == BACKGROUND and settings.google_batch_window_ms:
+                await asyncio.sleep(settings.google_batch_window_ms / 1000)
+            head = self.heap[0][2]
+            delay = max(self.user.wait_time(head.cost), self.project.wait_time(head.cost))
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            batch = self._take_batch()
+            cost = sum(call.cost for call in batch)
+            self.user.take(cost)
+            self.project.take(cost)
+            now = time.monotonic()
+            for call in batch:
+                google_queue_wait.observe(now - call.enqueued, self.api, PRIORITY_NAMES[call.priority])
+            google_batch_size.observe(len(batch), self.api)
+            try:
+                outcomes = await asyncio.to_thread(_execute, batch)
+            except Exception as exc:  # noqa: BLE001 - falla del batch entero: aplica a cada request
+                outcomes = [(None, exc)] * len(batch)
+            # Una vez por round trip: un batch con varios 429 es una sola señal de sobrecarga
+            if any(exc is not None and is_rate_limit(exc) for _, exc in outcomes):
+                self.user.penalize()
+            else:
+                self.user.reward()
+            for call, (result, exc) in zip(batch, outcomes):
+                self._settle(call, result, exc)
+
+    def _settle(self, call: _Call, result, exc: Exception | None):
+        if call.future.done():
+            return
+        if exc is None:
+            call.future.set_result(result)
+            return
+        if not is_retryable(exc) or call.attempt >= settings.google_max_retries:
+            call.future.set_exception(exc)
+            return
+        call.attempt += 1
+        google_retries.inc(self.api, str(_status(exc) or exc.__class__.__name__))
+        delay = _retry_after(exc) or random.uniform(
+            0, min(settings.google_backoff_max_seconds, settings.google_backoff_base_seconds * 2 ** call.attempt)
+        )
+        logger.warning("google.retry", api=self.api, attempt=call.attempt, delay=round(delay, 2), status=_status(exc))
+        call.enqueued = time.monotonic() + delay
+        asyncio.get_running_loop().call_later(delay, self.put, call)
+
+
+def _retry_after(exc: Exception) -> float | None:
+    resp = getattr(exc, "resp", None)
+    try:
+        return float(resp.get("retry-after")) if resp is not None and resp.get("retry-after") else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _execute(batch: list[_Call]) -> list[tuple]:
+    """En un hilo: un request suelto o un batch HTTP; devuelve (resultado, excepción) por request."""
+    if len(batch) == 1:
+        try:
+            return [(batch[0].request.execute(), None)]
+        except Exception as exc:  # noqa: BLE001 - se decide en _settle
+            return [(None, exc)]
+    outcomes: dict[str, tuple] = {}
+
+    def collect(request_id, response, exception):
+        outcomes[request_id] = (response, exception)
+
+    http_batch = batch[0].service.new_batch_http_request(callback=collect)
+    for idx, call in enumerate(batch):
+        http_batch.add(call.request, request_id=str(idx))
+    http_batch.execute()
+    return [outcomes.get(str(idx), (None, ConnectionError("sin respuesta en el batch"))) for idx in range(len(batch))]
+
+
+class GoogleRequestScheduler:
+    def __init__(self):
+        self.queues: dict[str, ApiQueue] = {}
+        self._loop = None
+
+    def _queue(self, api: str) -> ApiQueue:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Otro event loop (scripts, reinicio): las colas viejas quedaron atadas al anterior
+            self.queues = {}
+            self._loop = loop
+        queue = self.queues.get(api)
+        if queue is None:
+            if api == "gmail":
+                queue = ApiQueue(api, settings.google_gmail_user_units_per_second, settings.google_gmail_project_units_per_second)
+            else:
+                queue = ApiQueue(api, settings.google_calendar_user_qps, settings.google_calendar_project_qps)
+            self.queues[api] = queue
+        return queue
+
+    async def execute(self, api: str, request, service):
+        """Encola `request` (un HttpRequest de googleapiclient) y espera su resultado."""
+        cost = GMAIL_UNITS.get(getattr(request, "methodId", ""), 5) if api == "gmail" else 1
+        future = asyncio.get_running_loop().create_future()
+        self._queue(api).put(_Call(request, service, cost, _priority.get(), future))
+        return await future
+
+    def depth(self) -> int:
+        return sum(len(queue.heap) for queue in self.queues.values())
+
+
+google_api = GoogleRequestScheduler()
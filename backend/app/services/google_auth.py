@@ -1,13 +1,13 @@
 import os
-from typing import List
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from typing import TYPE_CHECKING, List
 
 from ..config import settings
 
+# googleapiclient.discovery y google_auth_oauthlib se importan al primer uso: el
+# arranque en frío (y /health) no los necesita
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 
 def _scopes() -> List[str]:
     return [s.strip() for s in settings.google_scopes.split(" ") if s.strip()]
@@ -26,6 +26,8 @@ def _client_config():
 
 
 def get_auth_url() -> str:
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(_client_config(), scopes=_scopes())
     flow.redirect_uri = settings.google_redirect_uri
     auth_url, _ = flow.authorization_url(
@@ -34,7 +36,9 @@ def get_auth_url() -> str:
     return auth_url
 
 
-def save_token_from_code(code: str) -> Credentials:
+def save_token_from_code(code: str) -> "Credentials":
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(_client_config(), scopes=_scopes())
     flow.redirect_uri = settings.google_redirect_uri
     flow.fetch_token(code=code)
@@ -46,9 +50,12 @@ def save_token_from_code(code: str) -> Credentials:
     return creds
 
 
-def load_credentials() -> Credentials | None:
+def load_credentials() -> "Credentials | None":
     if not os.path.exists(settings.google_token_path):
         return None
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
     creds = Credentials.from_authorized_user_file(settings.google_token_path, _scopes())
     if creds and creds.expired and creds.refresh_token:
         creds.refresh(Request())
@@ -61,6 +68,8 @@ def get_gmail_service():
     creds = load_credentials()
     if not creds or not creds.valid:
         return None
+    from googleapiclient.discovery import build
+
     return build("gmail", "v1", credentials=creds)
 
 
@@ -68,4 +77,6 @@ def get_calendar_service():
     creds = load_credentials()
     if not creds or not creds.valid:
         return None
+    from googleapiclient.discovery import build
+
     return build("calendar", "v3", credentials=creds)
@@ -1,19 +1,33 @@
-import httpx
+from typing import TYPE_CHECKING
 
 from ..config import settings
+from ..metrics import gateway_errors, gateway_seconds, timed
 from ..schemas import OutgoingWhatsAppMessage
 
+if TYPE_CHECKING:
+    import httpx
+
 
 class WhatsAppGateway:
-    def __init__(self):
+    def __init__(self, client: "httpx.AsyncClient | None" = None):
         self.base_url = settings.whatsapp_gateway_url
         self.api_key = settings.whatsapp_gateway_api_key
+        # Cliente compartido opcional (envíos masivos); sin él se abre uno por envío
+        self.client = client
 
+    @timed(gateway_seconds, gateway_errors, span_name="gateway.send", capture_args=True)
     async def send_message(self, message: OutgoingWhatsAppMessage):
+        if self.client is not None:
+            return await self._post(self.client, message)
+        import httpx
+
         async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{self.base_url}/send",
-                json=message.model_dump(),
-                headers={"x-api-key": self.api_key},
-                timeout=10,
-            )
+            return await self._post(client, message)
+
+    async def _post(self, client: "httpx.AsyncClient", message: OutgoingWhatsAppMessage):
+        return await client.post(
+            f"{self.base_url}/send",
+            json=message.model_dump(),
+            headers={"x-api-key": self.api_key},
+            timeout=10,
+        )
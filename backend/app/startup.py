@@ -0,0 +1,96 @@
+"""
+Arranque en frío: tiempos por fase y calentamiento en segundo plano.
+
+El servidor contesta /health en cuanto termina de importar; la base, los
+índices en memoria y los SDK pesados se cargan después en una tarea de fondo
+(`warm`), en paralelo donde se puede. Las rutas que mutan estado esperan a
+`wait_ready` para no atender un webhook con los índices a medio cargar.
+
+`startup_seconds{phase}` en /metrics y el log `startup.ready` dicen en qué se
+fue el arranque; scripts/cold_start.py mide el desglose de imports y el tiempo
+hasta el primer /health contra un presupuesto.
+"""
+
+import asyncio
+import importlib
+import time
+from typing import Callable
+
+from .config import settings
+from .logs import get_logger
+from .metrics import registry
+
+logger = get_logger(__name__)
+
+# Se importan durante el calentamiento, en un hilo, para que el primer mensaje no los pague
+HEAVY_MODULES = ("openai", "httpx", "googleapiclient.discovery", "google_auth_oauthlib.flow")
+
+
+class Startup:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.ready = asyncio.Event()
+        self.warming = False
+
+    def mark(self, phase: str, since: float) -> float:
+        now = time.perf_counter()
+        self.phases[phase] = round(now - since, 4)
+        return now
+
+    async def _timed(self, phase: str, func: Callable, *args):
+        """Corre `func` en un hilo y anota su duración; un error se loguea y no frena al resto."""
+        started = time.perf_counter()
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as exc:
+            logger.error("startup.phase_failed", phase=phase, error=exc.__class__.__name__, detail=str(exc))
+            return None
+        finally:
+            self.mark(phase, started)
+
+    def warm(
+        self, restores: dict[str, Callable], init_db: Callable[[], bool], journal_restore: Callable, start_jobs: Callable
+    ) -> asyncio.Task:
+        """Lanza el calentamiento; desde aquí `wait_ready` espera a que termine."""
+        self.warming = True
+        return asyncio.create_task(self._warm(restores, init_db, journal_restore, start_jobs))
+
+    async def _warm(self, restores: dict[str, Callable], init_db: Callable[[], bool], journal_restore: Callable, start_jobs: Callable):
+        """Journal, base + índices y SDK en paralelo; los jobs arrancan con los índices ya cargados."""
+        started = time.perf_counter()
+
+        async def database():
+            if await self._timed("init_db", init_db):
+                await asyncio.gather(*(self._timed(name, func) for name, func in restores.items()))
+
+        await asyncio.gather(
+            self._timed("journal", journal_restore),
+            database(),
+            *(self._timed(f"import:{name}", importlib.import_module, name) for name in HEAVY_MODULES),
+        )
+        start_jobs()
+        self.mark("warm", started)
+        self.mark("total", self.started)
+        self.ready.set()
+        logger.info("startup.ready", **{phase.replace(":", "_"): value for phase, value in self.phases.items()})
+
+    async def wait_ready(self):
+        """Espera el calentamiento (con tope: si algo se colgó, mejor atender que perder el mensaje)."""
+        # Sin calentamiento en curso (scripts que llaman al handler directo) no hay nada que esperar
+        if self.ready.is_set() or not self.warming:
+            return
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=settings.startup_ready_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("startup.not_ready", waited=settings.startup_ready_timeout_seconds)
+
+
+startup = Startup()
+
+registry.gauge(
+    "startup_seconds",
+    "Duración de cada fase del arranque",
+    ("phase",),
+    lambda: {(phase,): value for phase, value in startup.phases.items()},
+)
@@ -1,7 +1,13 @@
+import sys
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Optional
-from collections import deque
+from typing import Dict, Iterator, Optional
+from collections import OrderedDict, deque
+
+from .config import settings
+from .journal import journal
+from .tracing import current_trace_id
 
 
 @dataclass
@@ -15,57 +21,197 @@ class PendingEmailAction:
     draft_reply: Optional[str] = None
 
 
-@dataclass
+def _now() -> int:
+    return int(time.time())
+
+
+@dataclass(slots=True)
 class AppointmentConversation:
     """Trackea el estado de una conversación de agendamiento de cita - Flujo conversacional con AI."""
     patient_number: str
-    state: str = "conversing"  # conversing (flujo conversacional) | confirmed
+    state: str = "conversing"  # conversing (flujo conversacional) | cancelling (solo espera el sí) | confirmed
     symptoms: Optional[str] = None
     proposed_times: list = field(default_factory=list)  # Lista de horarios propuestos
     selected_time: Optional[str] = None
     selected_doctor: Optional[str] = None  # fernandez | paredes | perez (extraído por AI)
     selected_office: Optional[str] = None  # calle13 | calle09 (extraído por AI)
-    created_at: datetime = field(default_factory=datetime.utcnow)
-    last_updated: datetime = field(default_factory=datetime.utcnow)
+    reschedule_event_id: Optional[str] = None  # Cita existente que se está reagendando
+    cancel_event_id: Optional[str] = None  # Cita que el paciente pidió cancelar; espera su "sí"
+    created_at: int = field(default_factory=_now)  # epoch en segundos
+    last_updated: int = field(default_factory=_now)
+
+
+class HistoryMessage:
+    """Mensaje del historial: rol internado y timestamp entero, sin dict por mensaje."""
+
+    __slots__ = ("role", "content", "ts")
+
+    def __init__(self, role: str, content: str, ts: int):
+        self.role = sys.intern(role)
+        self.content = content
+        self.ts = ts
+
+
+class BoundedStore:
+    """
+    Dict por número de paciente con tope de entradas y expiración por inactividad.
+    El orden del OrderedDict es el del último acceso, así que lo más viejo queda
+    al frente y desalojar cuesta solo lo que se desaloja.
+    """
+
+    def __init__(self, max_entries: int, idle_seconds: int):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.entries: OrderedDict[str, tuple[int, object]] = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        now = _now()
+        if now - entry[0] > self.idle_seconds:
+            del self.entries[key]
+            self.evicted += 1
+            return None
+        self.entries[key] = (now, entry[1])
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value):
+        self.entries[key] = (_now(), value)
+        self.entries.move_to_end(key)
+        self.evict()
+
+    def pop(self, key: str):
+        entry = self.entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def values(self) -> Iterator:
+        return (value for _, value in self.entries.values())
+
+    def evict(self) -> int:
+        cutoff = _now() - self.idle_seconds
+        removed = 0
+        while self.entries:
+            key, (touched, _) = next(iter(self.entries.items()))
+            if touched >= cutoff and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+            removed += 1
+        self.evicted += removed
+        return removed
+
+
+class ExpiringSet:
+    """Set con TTL y tope LRU: al llenarse sale lo más viejo, no se borra todo."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.entries: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        added = self.entries.get(key)
+        if added is None:
+            return False
+        if _now() - added > self.ttl:
+            del self.entries[key]
+            return False
+        return True
+
+    def add(self, key: str):
+        self.entries[key] = _now()
+        self.entries.move_to_end(key)
+        cutoff = _now() - self.ttl
+        while self.entries:
+            oldest, added = next(iter(self.entries.items()))
+            if added >= cutoff and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
 
 
 class InMemoryState:
     def __init__(self):
-        self.pending_by_user: Dict[str, PendingEmailAction] = {}
-        self.appointment_conversations: Dict[str, AppointmentConversation] = {}
-        self.events = deque(maxlen=200)
-        self.reminders_sent: set[str] = set()
+        # {owner_number: [PendingEmailAction]} en el orden numerado del último digest
+        self.pending_by_user: Dict[str, list[PendingEmailAction]] = {}
+        idle_seconds = settings.conversation_idle_minutes * 60
+        # {patient_number: AppointmentConversation}
+        self.appointment_conversations = BoundedStore(settings.max_conversations, idle_seconds)
+        # Los recordatorios más lejanos son de 24h; 2 días de memoria alcanza
+        self.reminders_sent = ExpiringSet(20000, 2 * 86400)
         self.last_reco_date: str | None = None
-        self.seen_email_ids: set[str] = set()
-        self.conversation_history: Dict[str, deque] = {}  # {patient_number: deque([{role, content, timestamp}])}
+        self.seen_email_ids = ExpiringSet(20000, 14 * 86400)
+        # {patient_number: deque([HistoryMessage])}
+        self.conversation_history = BoundedStore(settings.max_conversations, idle_seconds)
 
     def set_pending(self, user_number: str, action: PendingEmailAction):
-        self.pending_by_user[user_number] = action
+        self.pending_by_user[user_number] = [action]
+
+    def set_pending_digest(self, user_number: str, actions: list[PendingEmailAction]):
+        """Reemplaza los pendientes por los ítems del digest nuevo (1 = el primero)."""
+        self.pending_by_user[user_number] = list(actions)
+
+    def add_pending_digest(self, user_number: str, actions: list[PendingEmailAction]) -> list[PendingEmailAction]:
+        """
+        Digest nuevo: lo que quedó abierto del anterior (incluido un borrador a medias)
+        va primero y los correos nuevos se numeran después. Devuelve los que siguieron.
+        """
+        carried = [a for a in self.pending_by_user.get(user_number, []) if a.status in ("pending", "drafting")]
+        self.pending_by_user[user_number] = carried + list(actions)
+        return carried
 
     def get_pending(self, user_number: str) -> Optional[PendingEmailAction]:
-        return self.pending_by_user.get(user_number)
+        """El primer ítem todavía abierto (pending/drafting), o None."""
+        for action in self.pending_by_user.get(user_number, []):
+            if action.status in ("pending", "drafting"):
+                return action
+        return None
+
+    def get_pending_items(self, user_number: str) -> list[PendingEmailAction]:
+        return self.pending_by_user.get(user_number, [])
+
+    def pending_count(self) -> int:
+        return sum(
+            1 for actions in self.pending_by_user.values() for a in actions if a.status in ("pending", "drafting")
+        )
 
     def clear_pending(self, user_number: str):
         if user_number in self.pending_by_user:
             del self.pending_by_user[user_number]
 
-    def log_event(self, kind: str, detail: str):
-        self.events.appendleft(
-            {
-                "ts": datetime.utcnow().isoformat(),
-                "kind": kind,
-                "detail": detail,
-            }
+    def log_event(
+        self,
+        kind: str,
+        detail: str,
+        patient: str | None = None,
+        doctor: str | None = None,
+        latency_ms: float | None = None,
+        error: str | None = None,
+    ):
+        journal.append(
+            kind,
+            detail,
+            patient=patient,
+            doctor=doctor,
+            latency_ms=latency_ms,
+            error=error,
+            trace_id=current_trace_id(),
         )
 
     def mark_reminder_sent(self, key: str):
-        if len(self.reminders_sent) > 2000:
-            self.reminders_sent.clear()
         self.reminders_sent.add(key)
 
     def mark_email_seen(self, message_id: str):
-        if len(self.seen_email_ids) > 5000:
-            self.seen_email_ids.clear()
         self.seen_email_ids.add(message_id)
 
     def has_seen_email(self, message_id: str) -> bool:
@@ -76,31 +222,42 @@ class InMemoryState:
         return self.appointment_conversations.get(patient_number)
 
     def set_appointment_conversation(self, patient_number: str, conversation: AppointmentConversation):
-        conversation.last_updated = datetime.utcnow()
-        self.appointment_conversations[patient_number] = conversation
+        conversation.last_updated = _now()
+        self.appointment_conversations.set(patient_number, conversation)
 
     def clear_appointment_conversation(self, patient_number: str):
-        if patient_number in self.appointment_conversations:
-            del self.appointment_conversations[patient_number]
+        self.appointment_conversations.pop(patient_number)
 
     # Métodos para gestionar historial conversacional
     def add_message_to_history(self, patient_number: str, role: str, content: str):
-        if patient_number not in self.conversation_history:
-            self.conversation_history[patient_number] = deque(maxlen=20)  # Últimos 20 mensajes
-        self.conversation_history[patient_number].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
-    def get_conversation_history(self, patient_number: str) -> list:
-        if patient_number not in self.conversation_history:
-            return []
-        return list(self.conversation_history[patient_number])
+        history = self.conversation_history.get(patient_number)
+        if history is None:
+            history = deque(maxlen=20)  # Últimos 20 mensajes
+            self.conversation_history.set(patient_number, history)
+        history.append(HistoryMessage(role, content, _now()))
+
+    def get_conversation_history(self, patient_number: str) -> list[HistoryMessage]:
+        history = self.conversation_history.get(patient_number)
+        return list(history) if history else []
 
     def clear_conversation_history(self, patient_number: str):
-        if patient_number in self.conversation_history:
-            del self.conversation_history[patient_number]
+        self.conversation_history.pop(patient_number)
+
+    def evict_idle(self) -> int:
+        """Job periódico: saca conversaciones inactivas aunque nadie vuelva a escribir."""
+        return self.appointment_conversations.evict() + self.conversation_history.evict()
+
+    def memory_report(self) -> dict:
+        return {
+            "appointment_conversations": len(self.appointment_conversations),
+            "conversation_history": len(self.conversation_history),
+            "history_messages": sum(len(h) for h in self.conversation_history.values()),
+            "evicted_conversations": self.appointment_conversations.evicted + self.conversation_history.evicted,
+            "pending_emails": self.pending_count(),
+            "reminders_sent": len(self.reminders_sent),
+            "seen_email_ids": len(self.seen_email_ids),
+            "journal_entries": len(journal.entries),
+        }
 
 
 state = InMemoryState()
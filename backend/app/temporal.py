@@ -0,0 +1,400 @@
+"""
+Parser determinista de expresiones de fecha/hora en español.
+
+Resuelve lo que los pacientes escriben al pedir cita ("mañana 10am", "viernes a
+las 12", "6 de marzo", "pasado mañana en la tarde", "del 3 al 5 de marzo",
+"entre las 4 y las 6") contra un `now` con zona horaria, con una confianza de
+0 a 1. Solo si no alcanza `date_parser_min_confidence` (o quedan palabras de
+fecha sin entender) se le pregunta al modelo.
+
+Convenciones, iguales a las que ya usaba el flujo de agenda:
+- Un día de la semana sin más es el próximo; si es hoy, el de la semana que viene.
+- Una fecha sin año que ya pasó es del año siguiente.
+- Una hora suelta de 1 a 7 sin am/pm ni "de la tarde" es de la tarde
+  (el consultorio abre de 10 a 18), con menos confianza.
+
+scripts/temporal_corpus.py tiene el corpus de frases esperadas.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from .config import settings
+
+WEEKDAYS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+_WEEKDAY_INDEX = {"lunes": 0, "martes": 1, "miercoles": 2, "jueves": 3, "viernes": 4, "sabado": 5, "domingo": 6}
+MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_NUMBER_WORDS = {
+    "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8,
+    "nueve": 9, "diez": 10, "once": 11, "doce": 12, "primero": 1,
+}
+# Franja de cada parte del día: (inicio, fin)
+DAY_PARTS = {"manana": (8, 12), "temprano": (8, 11), "tarde": (12, 19), "noche": (19, 22), "madrugada": (0, 6)}
+
+_ACCENTS = str.maketrans("áéíóúü", "aeiouu")
+_WD = "|".join(_WEEKDAY_INDEX)
+_MONTH = "|".join(MONTHS)
+_NUM = r"\d{1,2}|" + "|".join(_NUMBER_WORDS)
+_PART = r"(?:\s+(?:de|en|por)\s+la\s+(?P<part>manana|tarde|noche|madrugada))?"
+
+
+def _clock(p: str) -> str:
+    """Hora: "5", "5:30", "5 y media", "5 menos cuarto", con am/pm/hrs opcional (grupos con prefijo `p`)."""
+    return (
+        rf"(?P<{p}h>{_NUM})(?::(?P<{p}m>\d{{2}})|\s+y\s+(?P<{p}frac>media|cuarto|\d{{1,2}})"
+        rf"|\s+menos\s+(?P<{p}less>cuarto|\d{{1,2}}))?(?:\s*(?P<{p}mer>am|pm|hrs|hr|h)\b)?"
+    )
+
+
+_RE = {
+    # --- rangos de fechas ---
+    "date_range": re.compile(
+        rf"\b(?:del|entre\s+el)\s+(?P<d1>\d{{1,2}})\s+(?:al|y\s+el)\s+(?P<d2>\d{{1,2}})\s+de\s+(?P<month>{_MONTH})"
+        rf"(?:\s+(?:de|del)\s+(?P<year>\d{{4}}))?\b"
+    ),
+    "weekday_range": re.compile(rf"\b(?:del|entre\s+el)\s+(?P<wd1>{_WD})\s+(?:al|y\s+el)\s+(?P<wd2>{_WD})\b"),
+    "week": re.compile(
+        # "el viernes de la próxima semana" es del patrón de día de la semana
+        r"(?<!de\s)\b(?:(?P<which>esta|la\s+proxima|la\s+siguiente|la\s+otra)\s+semana|la\s+semana\s+que\s+viene)\b"
+    ),
+    "weekend": re.compile(r"\b(?:este|el)\s+fin\s+de\s+semana(?P<next>\s+que\s+viene)?\b"),
+    # --- fechas ---
+    "day_month": re.compile(
+        rf"\b(?P<day>\d{{1,2}}|primero)\s+de\s+(?P<month>{_MONTH})(?:\s+(?:de|del)\s+(?P<year>\d{{4}}))?\b"
+    ),
+    "month_day": re.compile(rf"\b(?P<month>{_MONTH})\s+(?P<day>\d{{1,2}})\b(?!\s*:)"),
+    "numeric": re.compile(r"\b(?P<day>\d{1,2})[/-](?P<month>\d{1,2})(?:[/-](?P<year>\d{2}|\d{4}))?\b"),
+    "relative": re.compile(
+        r"(?<!la\s)(?<!las\s)\b(?P<word>pasado\s+manana|manana|hoy)\b"
+        r"|\b(?:en|dentro\s+de)\s+(?P<n>\d{1,2}|una|un|dos|tres)\s+(?P<unit>dias?|semanas?)\b"
+    ),
+    "weekday": re.compile(
+        rf"\b(?:(?P<mod>este|proximo|siguiente)\s+)?(?P<wd>{_WD})"
+        rf"(?P<post>\s+(?:que\s+viene|proximo|de\s+la\s+(?:proxima|siguiente)\s+semana|de\s+la\s+semana\s+que\s+viene))?\b"
+    ),
+    # "el viernes 30", "martes el 3": el número es el día del mes, el nombre lo confirma
+    "weekday_day": re.compile(
+        rf"\b(?P<wd>{_WD})\s+(?:el\s+)?(?:dia\s+)?(?P<day>\d{{1,2}})\b(?!\s*(?::|am|pm|hrs?\b|h\b|de\s+la\b))"
+    ),
+    "day_only": re.compile(r"\bel\s+(?:dia\s+)?(?P<day>\d{1,2})\b(?!\s*(?::|am|pm|hrs?\b|h\b|de\s+la\b))"),
+    # --- horas ---
+    "time_range": re.compile(
+        rf"\b(?:de|entre)\s+(?:las?\s+)?{_clock('a')}\s+(?:a|y|hasta)\s+(?:las?\s+)?{_clock('b')}{_PART}"
+    ),
+    "after": re.compile(rf"\b(?P<kind>despues\s+de|antes\s+de|desde)\s+(?:las?\s+)?{_clock('a')}{_PART}"),
+    "noon": re.compile(r"\b(?:al\s+|a\s+)?(?P<word>medio\s*dia|mediodia)\b"),
+    "time": re.compile(rf"\b(?:a\s+las?|las)\s+{_clock('a')}{_PART}"),
+    # Sin "a las" solo cuenta con minutos, am/pm o parte del día ("10am", "14:30", "5 de la tarde")
+    "bare_time": re.compile(rf"\b{_clock('a')}{_PART}"),
+    "part": re.compile(r"\b(?:en|por|de|a)\s+la\s+(?P<part>manana|tarde|noche)\b|\b(?P<early>temprano)\b"),
+}
+# Lo que suena a fecha/hora y, si queda sin entender, amerita preguntar al modelo
+_HINT_RE = re.compile(
+    rf"\b(?:{_WD}|{_MONTH}|semanas?|quincena|mes|hora|horas|tarde|noche|temprano|proxim[oa]|siguiente|"
+    r"\d{1,2}:\d{2}|\d{1,2}\s*(?:am|pm))\b"
+)
+
+
+def normalize(text: str) -> str:
+    text = text.lower().translate(_ACCENTS).replace("ñ", "n")
+    text = re.sub(r"\b([ap])\.\s?m\.?", r"\1m", text)
+    text = re.sub(r"[,;!?¿¡()\"']", " ", text)
+    return " ".join(text.split())
+
+
+def _number(raw: str | None) -> int | None:
+    if raw is None:
+        return None
+    return int(raw) if raw.isdigit() else _NUMBER_WORDS.get(raw)
+
+
+@dataclass
+class TemporalExpression:
+    start_date: date | None = None
+    end_date: date | None = None
+    day_name: str | None = None
+    start_time: str | None = None  # "HH:MM"
+    end_time: str | None = None
+    confidence: float = 0.0
+    leftover: bool = False  # quedaron palabras de fecha/hora sin entender
+
+    @property
+    def found(self) -> bool:
+        return self.start_date is not None or self.start_time is not None or self.end_time is not None
+
+    def as_request(self) -> dict:
+        """Mismas llaves que devolvía el modelo, más los finales de rango."""
+        return {
+            "requested_date": self.start_date.isoformat() if self.start_date else None,
+            "requested_date_end": self.end_date.isoformat() if self.end_date else None,
+            "requested_day_name": self.day_name,
+            "requested_time": self.start_time,
+            "requested_time_end": self.end_time,
+        }
+
+
+class _Parse:
+    """Un parseo: cada patrón que pega tapa su tramo para que los siguientes no lo relean."""
+
+    def __init__(self, text: str, now: datetime):
+        self.text = normalize(text)
+        self.today = now.date()
+        self.result = TemporalExpression()
+        self.scores: list[float] = []
+
+    def take(self, name: str, accept=None):
+        for match in _RE[name].finditer(self.text):
+            if accept is None or accept(match):
+                self.text = self.text[: match.start()] + " " * (match.end() - match.start()) + self.text[match.end():]
+                return match
+        return None
+
+    # --- fechas ---
+
+    def next_weekday(self, index: int, include_today: bool = False) -> date:
+        ahead = (index - self.today.weekday()) % 7
+        if ahead == 0 and not include_today:
+            ahead = 7
+        return self.today + timedelta(days=ahead)
+
+    def month_day(self, day: int) -> date:
+        """Día del mes sin mes: de este mes, o del siguiente si ya pasó."""
+        value = self.today.replace(day=1)
+        if day < self.today.day:
+            value = (value + timedelta(days=32)).replace(day=1)
+        return value.replace(day=day)
+
+    def future_date(self, year: int | None, month: int, day: int) -> date:
+        value = date(year or self.today.year, month, day)
+        if year is None and value < self.today:
+            value = date(value.year + 1, month, day)
+        return value
+
+    def set_date(self, value: date, score: float, end: date | None = None, day_name: str | None = None):
+        if self.result.start_date is not None:
+            # Dos fechas distintas ("lunes o martes"): que decida alguien más
+            if self.result.start_date != value:
+                self.scores.append(0.5)
+            return
+        self.result.start_date, self.result.end_date = value, end
+        if day_name:
+            self.result.day_name = day_name
+        self.scores.append(score)
+
+    def dates(self):
+        try:
+            self._dates()
+        except ValueError:
+            # "31 de febrero", "15/13": hay fecha pero no se entiende
+            self.scores.append(0.3)
+            self.result.leftover = True
+
+    def _dates(self):
+        if match := self.take("date_range"):
+            # El año lo decide el final: un rango ya empezado es de este año, desde hoy
+            month, year = MONTHS[match["month"]], _number(match["year"])
+            end = self.future_date(year, month, int(match["d2"]))
+            start = date(end.year, month, int(match["d1"]))
+            self.set_date(max(start, self.today), 1.0 if end >= start else 0.3, end=end)
+        if match := self.take("weekday_range"):
+            start = self.next_weekday(_WEEKDAY_INDEX[match["wd1"]])
+            end = start + timedelta(days=(_WEEKDAY_INDEX[match["wd2"]] - start.weekday()) % 7)
+            self.set_date(start, 1.0, end=end)
+        if match := self.take("week"):
+            monday = self.today - timedelta(days=self.today.weekday())
+            if (match["which"] or "").startswith("esta"):
+                self.set_date(self.today, 0.9, end=monday + timedelta(days=6))
+            else:
+                self.set_date(monday + timedelta(days=7), 0.9, end=monday + timedelta(days=13))
+        if match := self.take("weekend"):
+            saturday = self.next_weekday(5, include_today=True)
+            if self.today.weekday() == 6:
+                saturday = self.today - timedelta(days=1)
+            if match["next"]:
+                saturday += timedelta(days=7)
+            self.set_date(max(saturday, self.today), 0.9, end=saturday + timedelta(days=1))
+        if match := self.take("day_month"):
+            self.set_date(self.future_date(_number(match["year"]), MONTHS[match["month"]], _number(match["day"])), 1.0)
+        if match := self.take("month_day"):
+            self.set_date(self.future_date(None, MONTHS[match["month"]], int(match["day"])), 0.9)
+        if match := self.take("numeric"):
+            year = _number(match["year"])
+            if year is not None and year < 100:
+                year += 2000
+            self.set_date(self.future_date(year, int(match["month"]), int(match["day"])), 0.85)
+        if match := self.take("relative"):
+            word = match["word"]
+            if word == "hoy":
+                self.set_date(self.today, 1.0)
+            elif word:
+                self.set_date(self.today + timedelta(days=2 if word.startswith("pasado") else 1), 1.0)
+            else:
+                count = 1 if match["n"] in ("un", "una") else _number(match["n"])
+                days = count * (7 if match["unit"].startswith("semana") else 1)
+                self.set_date(self.today + timedelta(days=days), 0.9)
+        if self.result.start_date is None and (match := self.take("weekday_day")):
+            index = _WEEKDAY_INDEX[match["wd"]]
+            value = self.month_day(int(match["day"]))
+            self.set_date(value, 1.0 if value.weekday() == index else 0.4, day_name=WEEKDAYS[index])
+        if match := self.take("weekday"):
+            index = _WEEKDAY_INDEX[match["wd"]]
+            name = WEEKDAYS[index]
+            post = match["post"] or ""
+            if "semana" in post:
+                monday = self.today - timedelta(days=self.today.weekday()) + timedelta(days=7)
+                value = monday + timedelta(days=index)
+            else:
+                value = self.next_weekday(index, include_today=match["mod"] == "este")
+            if self.result.start_date is not None and self.result.end_date is None:
+                # "el viernes 6 de marzo": el nombre confirma (o contradice) la fecha
+                self.result.day_name = name
+                if self.result.start_date.weekday() != index:
+                    self.scores.append(0.4)
+            else:
+                self.set_date(value, 1.0, day_name=name)
+        if self.result.start_date is None and (match := self.take("day_only")):
+            # "el 15": de este mes, o del siguiente si ya pasó
+            self.set_date(self.month_day(int(match["day"])), 0.7)
+
+    # --- horas ---
+
+    def clock(self, match, prefix: str, part: str | None) -> tuple[int, int, float]:
+        hour = _number(match[f"{prefix}h"])
+        if hour is None or hour > 23:
+            raise ValueError(match[f"{prefix}h"])
+        minute, score = 0, 1.0
+        if match[f"{prefix}m"]:
+            minute = int(match[f"{prefix}m"])
+        elif match[f"{prefix}frac"]:
+            frac = match[f"{prefix}frac"]
+            minute = {"media": 30, "cuarto": 15}.get(frac) or int(frac)
+        elif match[f"{prefix}less"]:
+            less = match[f"{prefix}less"]
+            hour, minute = hour - 1, 60 - ({"cuarto": 15}.get(less) or int(less))
+        if minute > 59:
+            raise ValueError(minute)
+        mer = match[f"{prefix}mer"]
+        if mer == "pm" and hour < 12:
+            hour += 12
+        elif mer == "am" and hour == 12:
+            hour = 0
+        elif mer or hour >= 13:
+            pass
+        elif part in ("tarde", "noche"):
+            hour += 12 if hour < 12 else 0
+        elif part in ("manana", "madrugada"):
+            pass
+        elif 1 <= hour <= 7:
+            hour, score = hour + 12, 0.85  # consultorio de 10 a 18: "a las 5" es de la tarde
+        return hour % 24, minute, score
+
+    def set_time(self, start: str | None, end: str | None, score: float):
+        if self.result.start_time is not None or self.result.end_time is not None:
+            self.scores.append(0.5)
+            return
+        self.result.start_time, self.result.end_time = start, end
+        self.scores.append(score)
+
+    def times(self):
+        try:
+            self._times()
+        except ValueError:
+            self.scores.append(0.3)
+            self.result.leftover = True
+
+    def _times(self):
+        if match := self.take("time_range"):
+            part = match["part"]
+            h2, m2, s2 = self.clock(match, "b", part)
+            # "de 9 a 1 de la tarde": la parte del día es del final; al inicio solo si cuadra
+            h1, m1, s1 = self.clock(match, "a", part)
+            if (h1, m1) >= (h2, m2) and part:
+                h1, m1, s1 = self.clock(match, "a", None)
+            score = min(s1, s2) if (h1, m1) < (h2, m2) else 0.4
+            self.set_time(f"{h1:02d}:{m1:02d}", f"{h2:02d}:{m2:02d}", score)
+        if match := self.take("after"):
+            hour, minute, score = self.clock(match, "a", match["part"])
+            if match["kind"].startswith("antes"):
+                self.set_time(f"{DAY_PARTS['manana'][0]:02d}:00", f"{hour:02d}:{minute:02d}", score)
+            else:
+                self.set_time(f"{hour:02d}:{minute:02d}", f"{DAY_PARTS['noche'][1]:02d}:00", score)
+        if self.take("noon"):
+            self.set_time("12:00", None, 1.0)
+        match = self.take("time") or self.take(
+            "bare_time", lambda m: bool(m["am"] or m["amer"] or m["part"]) and m["ah"].isdigit()
+        )
+        if match:
+            hour, minute, score = self.clock(match, "a", match["part"])
+            self.set_time(f"{hour:02d}:{minute:02d}", None, score)
+        if match := self.take("part"):
+            if self.result.start_time is None and self.result.end_time is None:
+                start, end = DAY_PARTS["temprano" if match["early"] else match["part"]]
+                self.set_time(f"{start:02d}:00", f"{end:02d}:00", 0.9)
+
+    def run(self) -> TemporalExpression:
+        self.dates()
+        self.times()
+        self.result.leftover = self.result.leftover or bool(_HINT_RE.search(self.text))
+        if self.scores:
+            confidence = min(self.scores)
+            if self.result.leftover:
+                confidence *= 0.5
+            self.result.confidence = round(confidence, 2)
+        return self.result
+
+
+def parse(text: str, now: datetime) -> TemporalExpression:
+    """Fecha/hora pedida en `text`, relativa a `now` (con tzinfo)."""
+    return _Parse(text, now).run()
+
+
+def next_weekday(day_name: str, now: datetime) -> date | None:
+    index = _WEEKDAY_INDEX.get(normalize(day_name))
+    if index is None:
+        return None
+    ahead = (index - now.weekday()) % 7 or 7
+    return now.date() + timedelta(days=ahead)
+
+
+def datetime_request(history: list, now: datetime) -> dict | None:
+    """
+    Lo que pidió el paciente en los últimos mensajes, del más nuevo al más viejo
+    (un mensaje con solo hora se completa con la fecha de uno anterior). None si
+    hace falta el modelo: algo suena a fecha pero no se entendió con confianza.
+    """
+    merged = TemporalExpression(confidence=1.0)
+    any_hint = False
+    for message in reversed(history[-5:]):
+        if message.role != "user":
+            continue
+        parsed = parse(message.content, now)
+        any_hint = any_hint or parsed.leftover
+        if not parsed.found:
+            continue
+        if merged.start_date is None and parsed.start_date is not None:
+            merged.start_date, merged.end_date, merged.day_name = parsed.start_date, parsed.end_date, parsed.day_name
+            merged.confidence = min(merged.confidence, parsed.confidence)
+        if merged.start_time is None and merged.end_time is None and (parsed.start_time or parsed.end_time):
+            merged.start_time, merged.end_time = parsed.start_time, parsed.end_time
+            merged.confidence = min(merged.confidence, parsed.confidence)
+        if merged.start_date is not None and (merged.start_time or merged.end_time):
+            break
+    if not merged.found:
+        # Nada que suene a fecha: busca en los próximos días, sin gastar una completion
+        return None if any_hint else TemporalExpression().as_request()
+    if merged.confidence < settings.date_parser_min_confidence:
+        return None
+    return merged.as_request()
+
+
+def normalize_request(request: dict, now: datetime) -> dict:
+    """Completa la respuesta del modelo: un día de la semana sin fecha se vuelve fecha."""
+    request = {key: request.get(key) for key in TemporalExpression().as_request()}
+    if not request["requested_date"] and request["requested_day_name"]:
+        value = next_weekday(request["requested_day_name"], now)
+        request["requested_date"] = value.isoformat() if value else None
+    return request
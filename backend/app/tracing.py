@@ -0,0 +1,204 @@
+"""
+Tracing liviano del pipeline de mensajes.
+
+`start_trace` abre el span raíz de cada mensaje entrante y `span` los hijos
+(modelo, Google, gateway). El contexto viaja en contextvars, así que cruza los
+await sin pasar nada a mano. Solo una fracción `trace_sample_rate` de las trazas
+guarda spans; las no muestreadas igual tienen trace_id para correlacionar logs
+y el journal, y sus `span()` son un no-op.
+
+Las trazas terminadas van a un buffer acotado que `flush_traces` (job del
+scheduler) vacía a un archivo NDJSON o a un collector OTLP/HTTP (JSON).
+"""
+
+import json
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+from .config import settings
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        data = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "closed")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        # Tareas creadas durante la traza (workers del dispatcher) heredan el
+        # contextvar; al cerrarla dejan de colgarle spans y de usar su id
+        self.closed = False
+
+
+_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_span: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def current_trace_id() -> str | None:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None and not trace.closed else None
+
+
+def current_span_id() -> str | None:
+    trace = _trace.get()
+    if trace is None or trace.closed or not trace.sampled:
+        return None
+    current = _span.get()
+    return current.span_id if current else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    trace = Trace(f"{random.getrandbits(128):032x}", random.random() < settings.trace_sample_rate)
+    root = Span(trace.trace_id, None, name, attributes)
+    if trace.sampled:
+        trace.spans.append(root)
+    trace_token = _trace.set(trace)
+    span_token = _span.set(root)
+    try:
+        yield root
+    except BaseException as exc:
+        root.error = exc.__class__.__name__
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        trace.closed = True
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+        if trace.sampled:
+            exporter.submit(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    trace = _trace.get()
+    if trace is None or trace.closed or not trace.sampled:
+        yield None
+        return
+    parent = _span.get()
+    child = Span(trace.trace_id, parent.span_id if parent else None, name, attributes)
+    trace.spans.append(child)
+    token = _span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = exc.__class__.__name__
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _span.reset(token)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(item: Span) -> dict:
+    data = {
+        "traceId": item.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": 1,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in item.attributes.items() if v is not None],
+    }
+    if item.parent_id:
+        data["parentSpanId"] = item.parent_id
+    if item.error:
+        data["status"] = {"code": 2, "message": item.error}
+    return data
+
+
+class TraceExporter:
+    def __init__(self, mode: str, path: str, endpoint: str, max_buffered: int = 2000):
+        self.mode = mode  # none | file | otlp
+        self.path = path
+        self.endpoint = endpoint
+        # Si el collector no responde se pierden las más viejas, nunca bloquea
+        self.buffer: deque[Trace] = deque(maxlen=max_buffered)
+        self.exported = 0
+
+    def submit(self, trace: Trace):
+        if self.mode != "none":
+            self.buffer.append(trace)
+
+    async def flush(self):
+        traces = [self.buffer.popleft() for _ in range(len(self.buffer))]
+        if not traces:
+            return
+        import httpx  # solo lo necesita el export; no se paga al arrancar
+
+        try:
+            if self.mode == "file":
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    for trace in traces:
+                        fh.write(json.dumps([s.to_dict() for s in trace.spans], ensure_ascii=False) + "\n")
+            elif self.mode == "otlp":
+                payload = {
+                    "resourceSpans": [{
+                        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "agenda-agent"}}]},
+                        "scopeSpans": [{
+                            "scope": {"name": "app.tracing"},
+                            "spans": [_otlp_span(s) for trace in traces for s in trace.spans],
+                        }],
+                    }]
+                }
+                async with httpx.AsyncClient(timeout=5) as client:
+                    resp = await client.post(self.endpoint, json=payload)
+                    resp.raise_for_status()
+            self.exported += len(traces)
+        except (OSError, httpx.HTTPError) as exc:
+            logger.warning("tracing.export_failed", mode=self.mode, traces=len(traces), error=exc.__class__.__name__, detail=str(exc))
+
+
+exporter = TraceExporter(settings.trace_exporter, settings.trace_file, settings.otlp_endpoint)
+
+
+async def flush_traces():
+    await exporter.flush()
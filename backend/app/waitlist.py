@@ -0,0 +1,353 @@
+"""
+Lista de espera con backfill automático.
+
+Cuando no hay disponibilidad el paciente queda anotado (tabla `waitlist`) con su
+doctor y ventana de fechas. Al liberarse un horario (cancelación o evento movido,
+visto por CalendarSync) el índice por doctor+día encuentra a los candidatos en
+orden de prioridad y se le ofrece el slot al primero, con hold.
+"""
+
+import asyncio
+import bisect
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .calendar_sync import calendar_sync
+from .clinic import DOCTORS, OFFICE_HOURS
+from .config import settings
+from .db import SessionLocal
+from .holds import hold_offered_slots, hold_resource
+from .ledger import from_utc_naive, to_utc_naive
+from .logs import get_logger
+from .models import WaitlistEntry
+from .schemas import OutgoingWhatsAppMessage
+from .services.ai import format_slot
+from .services.calendar import CalendarClient
+from .services.dispatcher import dispatcher
+from .state import AppointmentConversation, state
+
+logger = get_logger(__name__)
+
+# Ventanas más largas se recortan: nadie espera un horario a dos meses
+MAX_WINDOW_DAYS = 14
+
+
+@dataclass
+class WaitlistItem:
+    entry_id: int
+    patient_number: str
+    doctor: str | None
+    office: str | None
+    window_start: datetime
+    window_end: datetime
+    priority: int
+    created_at: datetime
+    status: str = "waiting"
+
+    @property
+    def sort_key(self) -> tuple:
+        return (self.priority, self.created_at, self.entry_id)
+
+
+def _from_row(row: WaitlistEntry) -> WaitlistItem:
+    return WaitlistItem(
+        entry_id=row.id,
+        patient_number=row.patient_number,
+        doctor=row.doctor,
+        office=row.office,
+        window_start=from_utc_naive(row.window_start),
+        window_end=from_utc_naive(row.window_end),
+        priority=row.priority,
+        created_at=row.created_at,
+        status=row.status,
+    )
+
+
+class WaitlistIndex:
+    """
+    Buckets por (doctor, día local) con las entradas ordenadas por prioridad.
+    Una entrada cuya ventana abarca varios días aparece en cada bucket, así que
+    un slot liberado solo revisa los buckets de su día.
+    """
+
+    def __init__(self):
+        self.items: dict[int, WaitlistItem] = {}
+        self.buckets: dict[tuple[str | None, date], list[tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _days(self, item: WaitlistItem) -> list[date]:
+        first = item.window_start.date()
+        last = (item.window_end - timedelta(microseconds=1)).date()
+        return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+    def add(self, item: WaitlistItem):
+        self.remove(item.entry_id)
+        self.items[item.entry_id] = item
+        for day in self._days(item):
+            bisect.insort(self.buckets.setdefault((item.doctor, day), []), item.sort_key)
+
+    def remove(self, entry_id: int) -> WaitlistItem | None:
+        item = self.items.pop(entry_id, None)
+        if item is None:
+            return None
+        for day in self._days(item):
+            bucket = self.buckets.get((item.doctor, day))
+            if bucket is None:
+                continue
+            idx = bisect.bisect_left(bucket, item.sort_key)
+            if idx < len(bucket) and bucket[idx] == item.sort_key:
+                bucket.pop(idx)
+            if not bucket:
+                del self.buckets[(item.doctor, day)]
+        return item
+
+    def for_patient(self, patient_number: str) -> list[WaitlistItem]:
+        return [item for item in self.items.values() if item.patient_number == patient_number]
+
+    def candidates(self, doctors, start: datetime, end: datetime) -> list[WaitlistItem]:
+        """Entradas en espera cuya ventana cubre [start, end), en orden de prioridad."""
+        day = start.date()
+        keys = []
+        for doctor in doctors:
+            keys.extend(self.buckets.get((doctor, day), ()))
+        result = []
+        for key in sorted(keys):
+            item = self.items.get(key[2])
+            if item and item.status == "waiting" and item.window_start <= start and end <= item.window_end:
+                result.append(item)
+        return result
+
+
+waitlist_index = WaitlistIndex()
+# Slots ya ofrecidos a cada entrada (para no repetir la oferta al pasar al siguiente)
+_offered: set[tuple[int, datetime]] = set()
+_known_slots: dict[str, tuple[datetime, datetime, str | None]] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+def join_waitlist(
+    patient_number: str,
+    doctor: str | None,
+    office: str | None,
+    window_start: datetime,
+    window_end: datetime,
+    priority: int = 0,
+) -> WaitlistItem | None:
+    """Anota al paciente (reemplaza su entrada anterior, si tenía)."""
+    window_end = min(window_end, window_start + timedelta(days=MAX_WINDOW_DAYS))
+    now = datetime.utcnow()
+    try:
+        with SessionLocal() as session:
+            session.query(WaitlistEntry).filter(
+                WaitlistEntry.patient_number == patient_number,
+                WaitlistEntry.status.in_(["waiting", "offered"]),
+            ).update({"status": "expired"}, synchronize_session=False)
+            row = WaitlistEntry(
+                patient_number=patient_number,
+                doctor=doctor,
+                office=office,
+                window_start=to_utc_naive(window_start),
+                window_end=to_utc_naive(window_end),
+                priority=priority,
+                status="waiting",
+                created_at=now,
+            )
+            session.add(row)
+            session.commit()
+            item = _from_row(row)
+    except SQLAlchemyError as exc:
+        logger.error("waitlist.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return None
+    for previous in waitlist_index.for_patient(patient_number):
+        waitlist_index.remove(previous.entry_id)
+    waitlist_index.add(item)
+    state.log_event(
+        "waitlist.joined",
+        f"patient={patient_number} doctor={doctor} window={window_start.date()}..{window_end.date()}",
+        patient=patient_number,
+        doctor=doctor,
+    )
+    return item
+
+
+def mark_booked(patient_number: str):
+    """El paciente agendó: sale de la lista de espera."""
+    for item in waitlist_index.for_patient(patient_number):
+        waitlist_index.remove(item.entry_id)
+    try:
+        with SessionLocal() as session:
+            session.query(WaitlistEntry).filter(
+                WaitlistEntry.patient_number == patient_number,
+                WaitlistEntry.status.in_(["waiting", "offered"]),
+            ).update({"status": "booked"}, synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("waitlist.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+
+def restore_waitlist() -> int:
+    now = datetime.utcnow()
+    try:
+        with SessionLocal() as session:
+            rows = session.query(WaitlistEntry).filter(
+                WaitlistEntry.status.in_(["waiting", "offered"]),
+                WaitlistEntry.window_end > now,
+            ).all()
+            items = [_from_row(row) for row in rows]
+    except SQLAlchemyError as exc:
+        logger.error("waitlist.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return 0
+    for item in items:
+        waitlist_index.add(item)
+    return len(items)
+
+
+def _doctors_for_calendar(calendar_id: str) -> list[str]:
+    return [doctor for doctor in DOCTORS if hold_resource(doctor) == calendar_id]
+
+
+def _office_slots(start: datetime, end: datetime) -> list[datetime]:
+    """Slots de 1h en horario de consultorio contenidos en el intervalo liberado."""
+    slots = []
+    slot = start.replace(minute=0, second=0, microsecond=0)
+    if slot < start:
+        slot += timedelta(hours=1)
+    while slot + timedelta(hours=1) <= end:
+        if OFFICE_HOURS[0] <= slot.hour < OFFICE_HOURS[1]:
+            slots.append(slot)
+        slot += timedelta(hours=1)
+    return slots
+
+
+async def offer_freed_slot(start: datetime, end: datetime, calendar_id: str | None = None) -> int:
+    """Ofrece cada slot del intervalo al primer candidato elegible. Devuelve cuántos ofreció."""
+    calendar_id = calendar_id or settings.google_calendar_id
+    doctors = _doctors_for_calendar(calendar_id)
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    offered = 0
+    for slot_start in _office_slots(max(start, now), end):
+        slot_end = slot_start + timedelta(hours=1)
+        if any(s < slot_end and slot_start < e for s, e, cal in _known_slots.values() if cal == calendar_id):
+            continue  # Otro evento sigue ocupando ese horario
+        for item in waitlist_index.candidates(doctors, slot_start, slot_end):
+            if (item.entry_id, slot_start) in _offered:
+                continue
+            slot = format_slot(slot_start)
+            if not hold_offered_slots(item.patient_number, item.doctor, [slot], limit=1):
+                break  # Otro paciente ya lo tiene reservado
+            _offered.add((item.entry_id, slot_start))
+            await _send_offer(item, slot)
+            offered += 1
+            break
+    return offered
+
+
+async def _send_offer(item: WaitlistItem, slot: dict):
+    item.status = "offered"
+    try:
+        with SessionLocal() as session:
+            session.query(WaitlistEntry).filter(WaitlistEntry.id == item.entry_id).update(
+                {
+                    "status": "offered",
+                    "offered_slot": to_utc_naive(datetime.fromisoformat(slot["datetime"])),
+                    "offered_at": datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("waitlist.db_error", error=exc.__class__.__name__, detail=str(exc))
+
+    # La respuesta del paciente ("sí") la resuelve el flujo normal de selección de horario
+    conversation = AppointmentConversation(
+        patient_number=item.patient_number,
+        selected_doctor=item.doctor,
+        selected_office=item.office,
+        proposed_times=[slot],
+    )
+    state.set_appointment_conversation(item.patient_number, conversation)
+    doctor_text = f" con {DOCTORS[item.doctor]}" if item.doctor in DOCTORS else ""
+    text = (
+        f"¡Buenas noticias! Se liberó un horario{doctor_text}: {slot['display']}.\n\n"
+        "¿Lo quieres? Responde *sí* para agendarlo; te lo aparto unos minutos."
+    )
+    state.add_message_to_history(item.patient_number, "assistant", text)
+    await dispatcher.enqueue(OutgoingWhatsAppMessage(to_number=item.patient_number, text=text))
+    state.log_event("waitlist.offered", f"patient={item.patient_number} slot={slot['datetime']}", patient=item.patient_number, doctor=item.doctor)
+
+
+async def expire_waitlist_offers():
+    """
+    Ofertas sin respuesta vuelven a 'waiting' y el slot pasa al siguiente
+    candidato; las entradas con ventana vencida salen del índice.
+    """
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.slot_hold_minutes)
+    try:
+        with SessionLocal() as session:
+            lapsed = session.query(WaitlistEntry).filter(
+                WaitlistEntry.status == "offered", WaitlistEntry.offered_at <= cutoff
+            ).all()
+            lapsed_slots = [(row.id, row.offered_slot) for row in lapsed]
+            for row in lapsed:
+                row.status = "waiting"
+            session.query(WaitlistEntry).filter(
+                WaitlistEntry.status.in_(["waiting", "offered"]),
+                WaitlistEntry.window_end <= datetime.utcnow(),
+            ).update({"status": "expired"}, synchronize_session=False)
+            session.commit()
+    except SQLAlchemyError as exc:
+        logger.error("waitlist.db_error", error=exc.__class__.__name__, detail=str(exc))
+        return
+    for item in list(waitlist_index.items.values()):
+        if item.window_end <= now:
+            waitlist_index.remove(item.entry_id)
+    for event_id in [k for k, (_, end, _) in _known_slots.items() if end <= now]:
+        del _known_slots[event_id]
+    _offered.difference_update({key for key in _offered if key[1] <= now})
+    for entry_id, offered_slot in lapsed_slots:
+        item = waitlist_index.items.get(entry_id)
+        if item:
+            item.status = "waiting"
+        if offered_slot:
+            slot_start = from_utc_naive(offered_slot)
+            await offer_freed_slot(slot_start, slot_start + timedelta(hours=1))
+
+
+def _on_calendar_change(events: list[dict], full_sync: bool):
+    now = datetime.now(ZoneInfo(settings.scheduler_timezone))
+    if full_sync:
+        _known_slots.clear()
+    freed = []
+    for event in events:
+        event_id = event.get("id")
+        if not event_id:
+            continue
+        previous = _known_slots.pop(event_id, None)
+        start, end = (None, None)
+        if event.get("status") != "cancelled" and "dateTime" in event.get("start", {}):
+            start, end = CalendarClient.event_start_end(event)
+            if end and end > now:
+                _known_slots[event_id] = (start, end, event.get("_calendar_id"))
+        if previous and not full_sync and previous[1] > now and previous[0] != start:
+            freed.append(previous)
+    if not freed or not waitlist_index.items:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    for start, end, calendar_id in freed:
+        task = loop.create_task(
+            offer_freed_slot(start.astimezone(now.tzinfo), end.astimezone(now.tzinfo), calendar_id)
+        )
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+
+calendar_sync.subscribe(_on_calendar_change)
@@ -3,6 +3,7 @@ Command parsing for WhatsApp messages.
 All control is via WhatsApp in the MVP.
 """
 
+import re
 from dataclasses import dataclass
 
 
@@ -12,12 +13,18 @@ class ParsedCommand:
     payload: dict
 
 
+def _item_number(clean: str) -> int | None:
+    """Número de ítem del digest en "ignorar 2" / "contestar el 1"."""
+    match = re.search(r"\b(\d{1,2})\b", clean)
+    return int(match.group(1)) if match else None
+
+
 def parse_command(text: str) -> ParsedCommand:
     clean = (text or "").strip().lower()
     if clean in {"ignorar", "ignora", "ignore"} or "ignorar" in clean or "ignora" in clean:
-        return ParsedCommand(intent="ignore", payload={"raw": text})
+        return ParsedCommand(intent="ignore", payload={"raw": text, "item": _item_number(clean)})
     if clean in {"contestar", "responder", "responde"} or "contestar" in clean or "responder" in clean:
-        return ParsedCommand(intent="reply", payload={"raw": text})
+        return ParsedCommand(intent="reply", payload={"raw": text, "item": _item_number(clean)})
     if clean in {"enviar", "manda", "mandar"} or "enviar" in clean or "manda" in clean:
         return ParsedCommand(intent="send", payload={"raw": text})
     if clean in {"si", "sí", "ok", "dale", "va", "enviar", "envia", "envíalo"}:
@@ -0,0 +1,147 @@
+"""
+Costo por turno de crear un AIClient por mensaje vs. el cliente compartido.
+
+Sirve el fake de OpenAI por HTTPS (certificado autofirmado) detrás de un proxy
+TCP que agrega RTT, así el handshake TCP+TLS cuesta lo que costaría contra la
+API real. Cada turno hace `--calls` completions como un turno de agendado.
+
+    cd backend && python ../scripts/bench_ai_client.py
+    cd backend && python ../scripts/bench_ai_client.py --rtt-ms 80 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+_tmp = tempfile.mkdtemp()
+CERT, KEY = os.path.join(_tmp, "cert.pem"), os.path.join(_tmp, "key.pem")
+subprocess.run(
+    ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-keyout", KEY, "-out", CERT,
+     "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+    check=True, capture_output=True,
+)
+SERVER_PORT, PROXY_PORT = 3995, 3996
+os.environ["SSL_CERT_FILE"] = CERT  # httpx confía en el autofirmado
+os.environ["OPENAI_BASE_URL"] = f"https://127.0.0.1:{PROXY_PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JOURNAL_DIR", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import benchlib  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services.ai import AIClient, close_ai_client, get_ai_client  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "Eres un asistente que extrae información para agendar citas."},
+    {"role": "user", "content": "Hola, quiero una cita con el neurólogo"},
+]
+
+
+class RttProxy:
+    """Proxy TCP que demora cada tramo medio RTT y cuenta conexiones nuevas."""
+
+    def __init__(self, target_port: int, rtt_ms: float):
+        self.target_port = target_port
+        self.half = rtt_ms / 2000
+        self.connections = 0
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(self.half)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        self.connections += 1
+        await asyncio.sleep(self.half * 2)  # SYN/SYN-ACK
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer), self._pipe(upstream_reader, client_writer)
+        )
+
+    async def start(self, port: int):
+        return await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+
+async def run(variant: str, args, proxy: RttProxy) -> dict:
+    before = proxy.connections
+    turn_ms: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def turn():
+        async with semaphore:
+            started = time.perf_counter()
+            # "per_turn" es lo que hacían whatsapp_incoming/poll_and_notify antes
+            ai = AIClient(settings.openai_api_key) if variant == "per_turn" else get_ai_client()
+            for _ in range(args.calls):
+                await ai._complete("bench", model=ai.model, messages=MESSAGES)
+            turn_ms.append((time.perf_counter() - started) * 1000)
+            if variant == "per_turn":
+                await ai.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(turn() for _ in range(args.turns)))
+    elapsed = time.perf_counter() - started
+    stats = benchlib.percentiles(turn_ms)
+    stats["connections"] = proxy.connections - before
+    stats["turns_per_second"] = round(args.turns / elapsed, 1)
+    return stats
+
+
+async def main(args):
+    fake = benchlib.FakeOpenAI(latency_ms=args.ai_latency_ms, jitter_ms=0)
+    server, server_task = await benchlib.serve(
+        benchlib.openai_app(fake), SERVER_PORT, ssl_keyfile=KEY, ssl_certfile=CERT
+    )
+    proxy = RttProxy(SERVER_PORT, args.rtt_ms)
+    proxy_server = await proxy.start(PROXY_PORT)
+
+    stages = {}
+    for variant in ("per_turn", "shared"):
+        stages[variant] = await run(variant, args, proxy)
+    await close_ai_client()
+
+    saving = stages["per_turn"]["p50"] - stages["shared"]["p50"]
+    print(f"rtt={args.rtt_ms}ms latencia_modelo={args.ai_latency_ms}ms llamadas/turno={args.calls} "
+          f"concurrencia={args.concurrency}\n")
+    print(f"{'variante':<10} {'turnos':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'conexiones':>11} {'turnos/s':>9}")
+    for name, stats in stages.items():
+        print(f"{name:<10} {stats['n']:>7} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f} "
+              f"{stats['connections']:>11} {stats['turns_per_second']:>9}")
+    print(f"\nahorro por turno (p50): {saving:.1f} ms")
+
+    results = {"params": vars(args), "saving_p50_ms": round(saving, 1), "stages": stages}
+    if not args.no_save:
+        print(f"guardado en {benchlib.save_results('ai_client', results)}")
+    if args.compare:
+        benchlib.compare("ai_client", results, args.compare)
+
+    proxy_server.close()
+    server.should_exit = True
+    await server_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=3, help="completions por turno")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    parser.add_argument("--ai-latency-ms", type=float, default=20.0)
+    parser.add_argument("--compare", help="commit contra el cual comparar p95")
+    parser.add_argument("--no-save", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""
+Micro-benchmarks de disponibilidad: fusión de intervalos, slots libres por día,
+sugerencia de slots sobre eventos y búsqueda de los más cercanos contra un
+calendario falso (con y sin caché de freebusy).
+
+    cd backend && python ../scripts/bench_availability.py
+    cd backend && python ../scripts/bench_availability.py --compare <commit>
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JOURNAL_DIR", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import benchlib  # noqa: E402
+
+from app import availability  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.services.ai import AIClient  # noqa: E402
+from app.services.calendar import CalendarClient  # noqa: E402
+
+
+def random_busy(rng: random.Random, start: datetime, days: int, per_day: int):
+    intervals = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        for _ in range(per_day):
+            s = day.replace(hour=rng.randint(9, 18), minute=rng.choice((0, 15, 30, 45)))
+            intervals.append((s, s + timedelta(minutes=rng.choice((15, 30, 60, 90)))))
+    return intervals
+
+
+def bench_sync(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+async def bench_async(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    tz = ZoneInfo(settings.scheduler_timezone)
+    start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    raw = random_busy(rng, start, args.days, args.per_day)
+    merged = availability.merge_intervals(raw)
+    events = [{"start": {"dateTime": s.isoformat()}, "end": {"dateTime": e.isoformat()}} for s, e in merged]
+    ai = AIClient()
+
+    fake = benchlib.FakeCalendarService(latency_ms=args.google_latency_ms, busy_ratio=args.busy_ratio)
+    calendar = CalendarClient()
+    calendar.service = fake
+
+    async def nearest():
+        availability.busy_cache.invalidate()
+        await availability.nearest_slots("perez", "calle13", start + timedelta(days=10, hours=12), count=8, calendar=calendar)
+
+    async def nearest_cached():
+        await availability.nearest_slots("perez", "calle13", start + timedelta(days=10, hours=12), count=8, calendar=calendar)
+
+    n = args.iterations
+    stages = {
+        "merge_intervals": benchlib.percentiles(bench_sync(lambda: availability.merge_intervals(raw), n)),
+        "free_slot_starts": benchlib.percentiles(bench_sync(
+            lambda: [availability.free_slot_starts((start + timedelta(days=d)).date(), tz, merged) for d in range(args.days)], n
+        )),
+        "suggest_available_slots": benchlib.percentiles(
+            await bench_async(lambda: ai.suggest_available_slots(events, settings.scheduler_timezone, days_ahead=args.days), n)
+        ),
+    }
+    calls_before = fake.calls
+    stages["nearest_slots"] = benchlib.percentiles(await bench_async(nearest, max(1, n // 10)))
+    freebusy_per_search = (fake.calls - calls_before) / max(1, n // 10)
+    stages["nearest_slots_cached"] = benchlib.percentiles(await bench_async(nearest_cached, n))
+
+    results = {
+        "params": vars(args),
+        "busy_intervals": len(raw),
+        "freebusy_calls_per_search": round(freebusy_per_search, 2),
+        "stages": stages,
+    }
+
+    print(f"{len(raw)} intervalos en {args.days} días, {freebusy_per_search:.2f} freebusy por búsqueda sin caché")
+    print(f"\n{'benchmark':<28} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for name, stats in stages.items():
+        print(f"{name:<28} {stats['n']:>6} {stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['p99']:>9.3f}")
+
+    if not args.no_save:
+        print(f"\nguardado en {benchlib.save_results('availability', results)}")
+    if args.compare:
+        benchlib.compare("availability", results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--per-day", type=int, default=6)
+    parser.add_argument("--busy-ratio", type=float, default=0.7)
+    parser.add_argument("--google-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", help="commit contra el cual comparar p95")
+    parser.add_argument("--no-save", action="store_true")
+    asyncio.run(main(parser.parse_args()))
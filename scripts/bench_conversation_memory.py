@@ -0,0 +1,85 @@
+"""
+Memoria por conversación del estado en memoria.
+
+Llena N conversaciones con historial y compara contra el formato anterior
+(dict por mensaje con timestamp ISO). Mide con tracemalloc, así que incluye
+deques, strings y registros.
+
+    cd backend && python ../scripts/bench_conversation_memory.py --patients 5000 --messages 12
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.state import AppointmentConversation, InMemoryState  # noqa: E402
+
+TEXTS = [
+    "Hola, quisiera agendar una cita",
+    "Tengo dolor de cabeza desde hace tres días",
+    "¿Tienen lugar el viernes en la tarde?",
+    "Perfecto, el de las 4 me queda bien",
+]
+
+
+def fill_current(patients: int, messages: int) -> InMemoryState:
+    store = InMemoryState()
+    for i in range(patients):
+        number = f"52155{i:08d}"
+        for j in range(messages):
+            store.add_message_to_history(number, "user" if j % 2 == 0 else "assistant", TEXTS[j % len(TEXTS)])
+        store.set_appointment_conversation(number, AppointmentConversation(patient_number=number, symptoms="dolor"))
+    return store
+
+
+def fill_legacy(patients: int, messages: int) -> tuple[dict, dict]:
+    history: dict = {}
+    conversations: dict = {}
+    for i in range(patients):
+        number = f"52155{i:08d}"
+        history[number] = deque(maxlen=20)
+        for j in range(messages):
+            history[number].append({
+                "role": "user" if j % 2 == 0 else "assistant",
+                "content": TEXTS[j % len(TEXTS)],
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+        conversations[number] = {
+            "patient_number": number,
+            "symptoms": "dolor",
+            "created_at": datetime.utcnow(),
+            "last_updated": datetime.utcnow(),
+        }
+    return history, conversations
+
+
+def measure(fill, *args) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = fill(*args)  # noqa: F841 - mantener vivo hasta medir
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=12)
+    args = parser.parse_args()
+
+    current = measure(fill_current, args.patients, args.messages)
+    legacy = measure(fill_legacy, args.patients, args.messages)
+    print(f"patients={args.patients} messages/patient={args.messages}")
+    print(f"legacy   bytes/conversation: {legacy / args.patients:,.0f}")
+    print(f"current  bytes/conversation: {current / args.patients:,.0f}")
+    print(f"ahorro: {100 * (1 - current / legacy):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Planificador de requests a Google bajo carga mezclada: una ráfaga de jobs de
+fondo (sync, recordatorios) mientras pacientes piden disponibilidad, con una
+fracción de respuestas 429. Muestra cuántos round trips ahorra el batch, la
+espera por prioridad y los reintentos.
+
+    cd backend && python ../scripts/bench_google_api.py
+    cd backend && python ../scripts/bench_google_api.py --error-rate 0.2 --qps 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JOURNAL_DIR", "")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("GOOGLE_BACKOFF_BASE_SECONDS", "0.05")
+
+import benchlib  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.logs import configure_logging  # noqa: E402
+from app.metrics import google_retries  # noqa: E402
+from app.services.calendar import CalendarClient  # noqa: E402
+from app.services.google_api import interactive  # noqa: E402
+
+
+async def main(args):
+    configure_logging()
+    settings.google_calendar_user_qps = args.qps
+    fake = benchlib.FakeCalendarService(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    calendar = CalendarClient()
+    calendar.service = fake
+    start = datetime.now().astimezone() + timedelta(days=1)
+    latencies: dict[str, list[float]] = {"background": [], "interactive": []}
+    failures = 0
+
+    async def one(kind: str):
+        nonlocal failures
+        t0 = time.perf_counter()
+        try:
+            if kind == "interactive":
+                with interactive():
+                    await calendar.free_busy(["primary"], start, start + timedelta(days=7))
+            else:
+                await calendar.patch_event("evt", {"description": "recordatorio"})
+        except Exception:  # noqa: BLE001 - se cuenta
+            failures += 1
+        latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    async def patients():
+        for _ in range(args.interactive):
+            await asyncio.sleep(args.background / args.qps / args.interactive)
+            asyncio.ensure_future(one("interactive"))
+
+    started = time.perf_counter()
+    jobs = [one("background") for _ in range(args.background)]
+    await asyncio.gather(patients(), *jobs)
+    while len(latencies["interactive"]) < args.interactive:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    requests = args.background + args.interactive
+    stages = {kind: benchlib.percentiles(values) for kind, values in latencies.items()}
+    retries = sum(google_retries.values.values())
+    print(f"{requests} requests en {elapsed:.2f}s, cuota {args.qps}/s, {args.error_rate:.0%} con 429")
+    print(f"round trips: {fake.round_trips} (sin batch serían ≥{requests}), "
+          f"intentos: {fake.calls}, reintentos: {retries:.0f}, fallidos: {failures}")
+    print(f"\n{'prioridad':<12} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for kind, stats in stages.items():
+        print(f"{kind:<12} {stats['n']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+
+    results = {
+        "params": vars(args),
+        "round_trips": fake.round_trips,
+        "attempts": fake.calls,
+        "failures": failures,
+        "retries": retries,
+        "stages": stages,
+    }
+    if not args.no_save:
+        print(f"\nguardado en {benchlib.save_results('google_api', results)}")
+    if args.compare:
+        benchlib.compare("google_api", results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--background", type=int, default=200)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--qps", type=float, default=50.0)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--compare", help="commit contra el cual comparar p95")
+    parser.add_argument("--no-save", action="store_true")
+    asyncio.run(main(parser.parse_args()))
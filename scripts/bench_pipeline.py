@@ -0,0 +1,188 @@
+"""
+Benchmark de punta a punta del backend con stand-ins en proceso.
+
+Lleva N pacientes simulados por el diálogo completo de agendado (pide cita →
+se le ofrecen horarios → elige uno → se crea el evento) con C en paralelo,
+luego corre poll_and_notify sobre un inbox falso y los jobs de sync de
+calendario. Reporta throughput y p50/p95/p99 por etapa (spans de tracing) y
+guarda los resultados por commit.
+
+    cd backend && python ../scripts/bench_pipeline.py --patients 2000 --concurrency 200
+    cd backend && python ../scripts/bench_pipeline.py --compare <commit>
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db.name}")
+os.environ.setdefault("WHATSAPP_GATEWAY_URL", "http://127.0.0.1:3997")
+os.environ.setdefault("JOURNAL_DIR", "")
+os.environ.setdefault("TRACE_SAMPLE_RATE", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+# Miles de pacientes contra tres doctores agotan la agenda con holds de 10 min;
+# acá se mide el pipeline, no la contención por slots
+os.environ.setdefault("SLOT_HOLD_MINUTES", "0")
+
+import benchlib  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+from app import tracing  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.db import init_db  # noqa: E402
+from app.logs import configure_logging  # noqa: E402
+from app.routes import gmail as gmail_route  # noqa: E402
+from app.routes.whatsapp import whatsapp_incoming  # noqa: E402
+from app.schemas import IncomingWhatsAppMessage  # noqa: E402
+from app.scheduler import sync_calendar_changes  # noqa: E402
+from app.services import ai as ai_module  # noqa: E402
+from app.services import calendar as calendar_module  # noqa: E402
+from app.services import gmail as gmail_module  # noqa: E402
+
+FIRST_TURNS = [
+    "Hola, tengo dolor de cabeza muy fuerte desde ayer, quiero una cita",
+    "Buenas tardes, necesito consulta con neurología por mareos",
+    "Quisiera agendar una cita con el Dr. Perez, en calle 13",
+]
+
+
+def install_fakes(args):
+    fake_ai = benchlib.FakeOpenAI(latency_ms=args.ai_latency_ms, jitter_ms=args.ai_latency_ms / 3)
+    http_client = benchlib.openai_http_client(fake_ai)
+    ai_module._shared = ai_module.AIClient(api_key="sk-bench", http_client=http_client)
+    ai_module._shared.client = AsyncOpenAI(
+        api_key="sk-bench", base_url="https://api.openai.test/v1", http_client=http_client
+    )
+    calendar_service = benchlib.FakeCalendarService(latency_ms=args.google_latency_ms)
+    calendar_module.get_calendar_service = lambda: calendar_service
+    gmail_service = benchlib.FakeGmailService(
+        unread=args.emails, latency_ms=args.google_latency_ms,
+        mix=benchlib.INBOX_MIX if args.typical_inbox else None,
+    )
+    gmail_module.get_gmail_service = lambda: gmail_service
+    return fake_ai, calendar_service, gmail_service
+
+
+async def patient(number: str, rng: random.Random, turn_ms: list[float], statuses: Counter):
+    turns = [rng.choice(FIRST_TURNS), f"la {rng.randint(1, 5)}"]
+    for idx, text in enumerate(turns):
+        started = time.perf_counter()
+        try:
+            result = await whatsapp_incoming(IncomingWhatsAppMessage(
+                from_number=number, text=text, message_id=f"{number}-{idx}"
+            ))
+            statuses[result.get("status", "?")] += 1
+        except Exception as exc:  # noqa: BLE001 - se cuenta como resultado
+            statuses[f"error:{exc.__class__.__name__}"] += 1
+        turn_ms.append((time.perf_counter() - started) * 1000)
+
+
+async def main(args):
+    configure_logging()
+    init_db()
+    fake_ai, calendar_service, gmail_service = install_fakes(args)
+    gateway = benchlib.gateway_app()
+    port = int(settings.whatsapp_gateway_url.rsplit(":", 1)[1])
+    server, server_task = await benchlib.serve(gateway, port)
+
+    spans: dict[str, list[float]] = defaultdict(list)
+
+    def collect(trace):
+        for item in trace.spans:
+            spans[item.name].append(item.duration_ms)
+
+    tracing.exporter.submit = collect
+
+    rng = random.Random(args.seed)
+    turn_ms: list[float] = []
+    statuses: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(i: int):
+        async with semaphore:
+            await patient(f"52181{i:08d}", rng, turn_ms, statuses)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_one(i) for i in range(args.patients)))
+    dialogs_s = time.perf_counter() - t0
+
+    gmail_ms = []
+    t0 = time.perf_counter()
+    for _ in range(args.emails):
+        p0 = time.perf_counter()
+        await gmail_route.poll_and_notify()
+        gmail_ms.append((time.perf_counter() - p0) * 1000)
+    gmail_s = time.perf_counter() - t0
+
+    sync_ms = []
+    for _ in range(args.syncs):
+        p0 = time.perf_counter()
+        await sync_calendar_changes()
+        sync_ms.append((time.perf_counter() - p0) * 1000)
+
+    stages = {"turn": benchlib.percentiles(turn_ms)}
+    for name in sorted(spans):
+        stages[name] = benchlib.percentiles(spans[name])
+    stages["job:gmail_poll"] = benchlib.percentiles(gmail_ms)
+    stages["job:calendar_sync"] = benchlib.percentiles(sync_ms)
+
+    results = {
+        "params": vars(args),
+        "dialogs_seconds": round(dialogs_s, 2),
+        "turns_per_second": round(len(turn_ms) / dialogs_s, 1),
+        "emails_per_second": round(args.emails / gmail_s, 1) if gmail_s else None,
+        "statuses": dict(statuses),
+        "upstream_calls": {
+            "openai": fake_ai.calls,
+            "calendar": calendar_service.calls,
+            "calendar_round_trips": calendar_service.round_trips,
+            "gmail": gmail_service.calls,
+            "gmail_round_trips": gmail_service.round_trips,
+            "gmail_bytes": gmail_service.bytes,
+            "gateway": gateway.state.received,
+        },
+        "stages": stages,
+    }
+
+    print(f"patients={args.patients} concurrency={args.concurrency} turns={len(turn_ms)} in {dialogs_s:.2f}s "
+          f"→ {results['turns_per_second']} turns/s")
+    print(f"statuses={dict(statuses)}")
+    print(f"upstream calls={results['upstream_calls']}")
+    print(f"\n{'stage':<40} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for name, stats in stages.items():
+        if stats.get("n"):
+            print(f"{name:<40} {stats['n']:>7} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}")
+
+    if not args.no_save:
+        print(f"\nguardado en {benchlib.save_results('pipeline', results)}")
+    if args.compare:
+        benchlib.compare("pipeline", results, args.compare)
+
+    server.should_exit = True
+    await server_task
+    os.unlink(_db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--syncs", type=int, default=5)
+    parser.add_argument("--typical-inbox", action="store_true", help="boletines y notificaciones además de correos reales")
+    parser.add_argument("--ai-latency-ms", type=float, default=300.0)
+    parser.add_argument("--google-latency-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", help="commit contra el cual comparar p95")
+    parser.add_argument("--no-save", action="store_true")
+    asyncio.run(main(parser.parse_args()))
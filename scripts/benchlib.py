@@ -0,0 +1,417 @@
+"""
+Piezas compartidas de los benchmarks: stand-ins en proceso para OpenAI,
+Google Calendar/Gmail y el gateway, percentiles y guardado de resultados.
+
+- OpenAI: transporte httpx falso detrás del SDK real (se mide también el
+  costo del cliente). Responde JSON enlatado según el prompt, con latencia
+  configurable.
+- Google: objetos con la misma forma encadenada que googleapiclient
+  (`service.events().insert(...).execute()`). `execute()` es bloqueante igual
+  que el real, así que la latencia simulada bloquea el loop como en producción.
+- Gateway: un /send de FastAPI servido por uvicorn en el mismo proceso (el
+  fake de OpenAI también se puede servir así, con TLS, vía `openai_app`).
+
+Los resultados quedan en scripts/bench_results/<commit>-<nombre>.json.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "bench_results")
+
+
+# --- OpenAI ---
+
+class FakeOpenAI:
+    """Handler para httpx.MockTransport que imita /chat/completions."""
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 100.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls = 0
+
+    def reply_for(self, messages: list[dict]) -> str:
+        system = messages[0]["content"] if messages else ""
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if "extrae información para agendar" in system:
+            picked = any(ch.isdigit() for ch in last_user)
+            return json.dumps({
+                "recommended_doctor": "perez",
+                "wants_appointment": True,
+                "preferred_location": "calle13",
+                "preferred_date_mention": None,
+                "symptoms_summary": "dolor de cabeza",
+                "ready_to_offer_slots": not picked,
+                "appointment_action": "new",
+                "needs_clarification": None,
+            })
+        if "extrae la fecha y hora" in system:
+            return json.dumps({"requested_date": None, "requested_time": None, "requested_day_name": None})
+        if "ACEPTÓ una de estas opciones" in system or "ACEPTÓ una de estas opciones" in last_user:
+            answer = last_user.split("'")[1] if last_user.count("'") >= 2 else ""
+            digits = "".join(ch for ch in answer if ch.isdigit())
+            return digits[:1] or "ninguna"
+        if "califica" in system and "importancia" in system:
+            ids = re.findall(r"^\[([^\]]+)\]", last_user, flags=re.M)
+            return json.dumps({"items": [
+                {"id": i, "summary": f"Aviso del proveedor sobre {i}.", "importance": 1 + n % 5}
+                for n, i in enumerate(ids)
+            ]})
+        if "Resume en 1 oración" in system:
+            return "El proveedor confirma la entrega del pedido el lunes."
+        return json.dumps({
+            "is_emergency": False,
+            "needs_appointment": False,
+            "needs_more_info": False,
+            "urgency": "low",
+            "suggested_response": "Entiendo, ¿en qué más te puedo ayudar?",
+        })
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=await self.respond(json.loads(request.content)))
+
+    async def respond(self, body: dict) -> dict:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        content = self.reply_for(body.get("messages", []))
+        return {
+            "id": f"chatcmpl-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 600, "completion_tokens": 60, "total_tokens": 660},
+        }
+
+
+def openai_http_client(fake: FakeOpenAI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(fake), base_url="https://api.openai.test/v1")
+
+
+def openai_app(fake: FakeOpenAI):
+    """El mismo fake servido por HTTP de verdad (para medir conexiones y TLS)."""
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        return await fake.respond(await request.json())
+
+    return app
+
+
+# --- Google ---
+
+def rate_limit_error():
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    content = json.dumps({"error": {"code": 429, "errors": [{"reason": "rateLimitExceeded"}]}}).encode()
+    return HttpError(httplib2.Response({"status": 429}), content)
+
+
+class _Request:
+    def __init__(self, fn, service: "_FakeService"):
+        self.fn = fn
+        self.service = service
+
+    def run(self):
+        self.service.calls += 1
+        if self.service.error_rate and self.service.rng_errors.random() < self.service.error_rate:
+            raise rate_limit_error()
+        result = self.fn()
+        self.service.bytes += len(json.dumps(result, default=str))
+        return result
+
+    def execute(self):
+        self.service.round_trips += 1
+        if self.service.latency_ms:
+            time.sleep(self.service.latency_ms / 1000)
+        return self.run()
+
+
+class _Batch:
+    """Como BatchHttpRequest: un round trip, un callback por request."""
+
+    def __init__(self, service: "_FakeService", callback):
+        self.service = service
+        self.callback = callback
+        self.requests: list[tuple[str, _Request]] = []
+
+    def add(self, request: _Request, request_id: str):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.round_trips += 1
+        if self.service.latency_ms:
+            time.sleep(self.service.latency_ms / 1000)
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.run(), None)
+            except Exception as exc:  # noqa: BLE001 - igual que googleapiclient
+                self.callback(request_id, None, exc)
+
+
+class _FakeService:
+    """`calls` cuenta requests lógicos; `round_trips`, idas a la red (un batch es una); `bytes`, JSON de respuesta."""
+
+    def __init__(self, latency_ms: float, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng_errors = random.Random(11)
+        self.calls = 0
+        self.round_trips = 0
+        self.bytes = 0
+
+    def _req(self, fn):
+        return _Request(fn, self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+class FakeCalendarService(_FakeService):
+    """events().list/insert/patch/delete y freebusy().query sobre un dict en memoria."""
+
+    def __init__(self, latency_ms: float = 5.0, busy_ratio: float = 0.4, seed: int = 7, error_rate: float = 0.0):
+        super().__init__(latency_ms, error_rate)
+        self.store: dict[str, dict] = {}
+        self.busy_ratio = busy_ratio
+        self.rng = random.Random(seed)
+        self._next = 0
+
+    def events(self):
+        return self
+
+    def freebusy(self):
+        return _FreeBusy(self)
+
+    def list(self, **params):
+        items = list(self.store.values())
+        return self._req(lambda: {"items": items, "nextSyncToken": f"tok{len(items)}"})
+
+    def insert(self, calendarId: str, body: dict):
+        def run():
+            self._next += 1
+            event = dict(body, id=f"evt{self._next}", status="confirmed")
+            self.store[event["id"]] = event
+            return event
+        return self._req(run)
+
+    def patch(self, calendarId: str, eventId: str, body: dict):
+        def run():
+            event = self.store.setdefault(eventId, {"id": eventId})
+            event.update(body)
+            return event
+        return self._req(run)
+
+    def delete(self, calendarId: str, eventId: str):
+        return self._req(lambda: self.store.pop(eventId, None) or {})
+
+    def busy_for(self, body: dict) -> dict:
+        start = datetime.fromisoformat(body["timeMin"])
+        end = datetime.fromisoformat(body["timeMax"])
+        calendars = {}
+        for item in body["items"]:
+            busy = []
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            while hour < end:
+                if 10 <= hour.hour < 18 and self.rng.random() < self.busy_ratio:
+                    busy.append({"start": hour.isoformat(), "end": (hour + timedelta(hours=1)).isoformat()})
+                hour += timedelta(hours=1)
+            calendars[item["id"]] = {"busy": busy}
+        return {"calendars": calendars}
+
+
+class _FreeBusy:
+    def __init__(self, service: FakeCalendarService):
+        self.service = service
+
+    def query(self, body: dict):
+        return self.service._req(lambda: self.service.busy_for(body))
+
+
+# Bandeja típica: la mayoría boletines y notificaciones automáticas
+INBOX_MIX = [
+    ("Proveedor <ventas@proveedor.test>", "Pedido {id}", "Confirmamos la entrega de su pedido para el lunes por la mañana.", []),
+    ("Farmacia Hoy <ofertas@farmaciahoy.test>", "Promociones de la semana", "Descuentos en vitaminas y más.",
+     [("List-Unsubscribe", "<mailto:baja@farmaciahoy.test>")]),
+    ("Banco <no-reply@banco.test>", "Tu estado de cuenta está listo", "Consulta tu estado de cuenta en línea.", []),
+    ("Colegio Médico <boletin@colegio.test>", "Boletín mensual", "Noticias del colegio.",
+     [("List-Id", "<boletin.colegio.test>"), ("Precedence", "bulk")]),
+    ("Sistema <alertas@hospital.test>", "Alerta de respaldo", "El respaldo nocturno terminó.", [("Auto-Submitted", "auto-generated")]),
+]
+
+
+class FakeGmailService(_FakeService):
+    def __init__(self, unread: int = 100, latency_ms: float = 5.0, error_rate: float = 0.0, mix: list | None = None):
+        super().__init__(latency_ms, error_rate)
+        self.unread = [f"m{i}" for i in range(unread)]
+        self.mix = mix or INBOX_MIX[:1]
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId: str, q: str = "", maxResults: int = 5, **_):
+        return self._req(lambda: {"messages": [{"id": m} for m in self.unread[:maxResults]]})
+
+    def attachments(self):
+        return _FakeAttachments(self)
+
+    def get(self, userId: str, id: str, format: str = "full", **_):
+        sender, subject, snippet, extra = self.mix[int(id.lstrip("m") or 0) % len(self.mix)]
+        headers = [
+            {"name": "From", "value": sender},
+            {"name": "Subject", "value": subject.format(id=id)},
+            *({"name": name, "value": value} for name, value in extra),
+        ]
+        if format == "metadata":
+            return self._req(lambda: {"id": id, "snippet": snippet, "payload": {"mimeType": "multipart/mixed", "headers": headers}})
+        return self._req(lambda: {"id": id, "snippet": snippet, "payload": fake_mime(id, snippet, headers)})
+
+    def send(self, userId: str, body: dict):
+        return self._req(lambda: {"id": f"sent{self.calls}"})
+
+    def modify(self, userId: str, id: str, body: dict):
+        def run():
+            if id in self.unread:
+                self.unread.remove(id)
+            return {}
+        return self._req(run)
+
+
+class _FakeAttachments:
+    def __init__(self, service: FakeGmailService):
+        self.service = service
+
+    def get(self, userId: str, messageId: str, id: str):
+        return self.service._req(lambda: {"size": len(LONG_BODY), "data": _b64(LONG_BODY)})
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+# Cuerpo largo con hilo citado: Gmail lo manda aparte, por attachmentId
+LONG_BODY = ("Le comparto el detalle del pedido y las fechas de entrega. " * 40
+             + "\n\nEl lun, 1 ene 2024 a las 9:00, Consultorio escribió:\n> pedido anterior\n" * 30)
+
+
+def fake_mime(message_id: str, snippet: str, headers: list[dict]) -> dict:
+    """multipart/mixed con alternative (texto + HTML) y un PDF adjunto, como Gmail en format=full."""
+    number = int(message_id.lstrip("m") or 0)
+    text = f"{snippet}\n\nSaludos cordiales.\n\n> Mensaje anterior citado\n"
+    plain = (
+        {"size": len(LONG_BODY), "attachmentId": f"att-{message_id}"} if number % 4 == 3
+        else {"size": len(text), "data": _b64(text)}
+    )
+    html = f"<html><head><style>p{{}}</style></head><body><p>{snippet}</p><p>Saludos cordiales.</p></body></html>"
+    return {
+        "mimeType": "multipart/mixed",
+        "headers": headers,
+        "parts": [
+            {"mimeType": "multipart/alternative", "parts": [
+                {"mimeType": "text/plain", "headers": [{"name": "Content-Type", "value": "text/plain; charset=UTF-8"}],
+                 "body": plain},
+                {"mimeType": "text/html", "body": {"size": len(html), "data": _b64(html)}},
+            ]},
+            {"mimeType": "application/pdf", "filename": "factura.pdf",
+             "body": {"size": 480_000, "attachmentId": f"pdf-{message_id}"}},
+        ],
+    }
+
+
+# --- Gateway ---
+
+def gateway_app():
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+    app.state.received = 0
+
+    @app.post("/send")
+    async def send(request: Request):
+        await request.body()
+        app.state.received += 1
+        return {"status": "sent"}
+
+    return app
+
+
+async def serve(app, port: int, **config):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", **config))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+# --- Resultados ---
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "p50": round(pick(0.50), 3),
+        "p95": round(pick(0.95), 3),
+        "p99": round(pick(0.99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(name: str, results: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results = dict(results, commit=git_commit(), recorded_at=datetime.utcnow().isoformat())
+    path = os.path.join(RESULTS_DIR, f"{results['commit']}-{name}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare(name: str, results: dict, baseline_commit: str):
+    """Imprime p95 (o el valor) actual vs. el guardado para otro commit."""
+    path = os.path.join(RESULTS_DIR, f"{baseline_commit}-{name}.json")
+    if not os.path.exists(path):
+        print(f"(sin resultados para {baseline_commit} en {path})")
+        return
+    with open(path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    print(f"\ncomparación contra {baseline_commit}:")
+    for key, current in results.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(key)
+        if not before or "p95" not in current or "p95" not in before:
+            continue
+        delta = (current["p95"] - before["p95"]) / before["p95"] * 100 if before["p95"] else 0.0
+        print(f"  {key:<40} p95 {before['p95']:>9.3f} -> {current['p95']:>9.3f} ms ({delta:+.0f}%)")
@@ -0,0 +1,122 @@
+"""
+Arranque en frío del backend: desglose de imports y tiempo hasta el primer
+/health, contra un presupuesto. Sale con 1 si alguna corrida se pasa.
+
+    python scripts/cold_start.py
+    python scripts/cold_start.py --runs 5 --budget-ms 1500 --top 20
+
+Cada corrida es un proceso nuevo de uvicorn (como un deploy o un wake-up en
+Render). "ready" es cuando /health reporta el calentamiento terminado.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/cold_start.db")
+    env.setdefault("JOURNAL_DIR", "")
+    env["PYTHONPATH"] = BACKEND
+    return env
+
+
+def import_breakdown(top: int) -> tuple[float, list[tuple[str, float]]]:
+    """Tiempo propio de cada import (python -X importtime) sumado por paquete de primer nivel."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, env=_env(), capture_output=True, text=True, check=True,
+    )
+    by_package: dict[str, float] = {}
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        package = "app." + name.split(".")[1] if name.startswith("app.") and "." in name else name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + int(self_us) / 1000
+        total += int(self_us) / 1000
+    return total, sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _health(port: int) -> dict | None:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5) as resp:
+            return json.loads(resp.read()) if resp.status == 200 else None
+    except OSError:
+        return None
+
+
+def time_to_health(timeout: float) -> tuple[float, float | None]:
+    """(ms hasta el primer /health 200, ms hasta ready) desde que se lanza el proceso."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    healthy = ready = None
+    try:
+        while time.perf_counter() - started < timeout and proc.poll() is None:
+            body = _health(port)
+            if body is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                healthy = healthy or elapsed
+                if body.get("ready"):
+                    ready = elapsed
+                    break
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    if healthy is None:
+        raise RuntimeError("el backend no contestó /health")
+    return healthy, ready
+
+
+def main(args) -> int:
+    total, packages = import_breakdown(args.top)
+    print(f"imports de app.main: {total:.0f} ms (tiempo propio, sumado por paquete)")
+    for package, ms in packages:
+        print(f"  {ms:8.1f} ms  {package}")
+
+    healthy, ready = [], []
+    for _ in range(args.runs):
+        first, warm = time_to_health(args.timeout)
+        healthy.append(first)
+        if warm is not None:
+            ready.append(warm)
+    print(f"\nprimer /health: p50 {statistics.median(healthy):.0f} ms, máx {max(healthy):.0f} ms ({args.runs} corridas)")
+    if ready:
+        print(f"calentamiento terminado: p50 {statistics.median(ready):.0f} ms")
+    if max(healthy) > args.budget_ms:
+        print(f"FUERA DE PRESUPUESTO: {max(healthy):.0f} ms > {args.budget_ms} ms")
+        return 1
+    print(f"dentro del presupuesto de {args.budget_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=2000)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=30)
+    sys.exit(main(parser.parse_args()))
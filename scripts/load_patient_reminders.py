@@ -0,0 +1,117 @@
+"""
+Prueba de carga de recordatorios a pacientes contra un gateway de mentira.
+
+Arma N citas, simula un día completo de ticks del motor y manda todo por el
+dispatcher a un /send local. Reporta tiempos de indexado, de pop y throughput.
+
+    cd backend && python ../scripts/load_patient_reminders.py --appointments 5000 --rate 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db.name}")
+os.environ.setdefault("WHATSAPP_GATEWAY_URL", "http://127.0.0.1:3998")
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from zoneinfo import ZoneInfo  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.db import init_db  # noqa: E402
+from app.patient_reminders import PatientReminderIndex, claim_patient_reminder, reminder_text  # noqa: E402
+from app.schemas import OutgoingWhatsAppMessage  # noqa: E402
+from app.services.dispatcher import RateLimitedDispatcher  # noqa: E402
+
+stand_in = FastAPI()
+received = {"count": 0}
+
+
+@stand_in.post("/send")
+async def send(request: Request):
+    await request.body()
+    received["count"] += 1
+    return {"status": "sent"}
+
+
+def fake_events(n: int, now: datetime) -> list[dict]:
+    events = []
+    for i in range(n):
+        start = now + timedelta(minutes=90 + (i * 1440) // n)
+        events.append({
+            "id": f"evt{i}",
+            "status": "confirmed",
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+            "extendedProperties": {"private": {
+                "patient_number": f"5281{i:08d}",
+                "doctor": ("fernandez", "paredes", "perez")[i % 3],
+                "office": ("calle13", "calle09")[i % 2],
+            }},
+        })
+    return events
+
+
+async def main(args):
+    init_db()
+    port = int(settings.whatsapp_gateway_url.rsplit(":", 1)[1])
+    server = uvicorn.Server(uvicorn.Config(stand_in, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    tz = ZoneInfo(settings.scheduler_timezone)
+    now = datetime.now(tz)
+    index = PatientReminderIndex()
+    events = fake_events(args.appointments, now)
+
+    t0 = time.perf_counter()
+    for ev in events:
+        index.upsert_event(ev, now)
+    t_index = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    due_total = []
+    pop_time = 0.0
+    # Un tick por minuto durante 26h de reloj simulado
+    for minute in range(0, 26 * 60):
+        tick = now + timedelta(minutes=minute)
+        p0 = time.perf_counter()
+        due = index.pop_due(tick)
+        pop_time += time.perf_counter() - p0
+        due_total.extend((appt, offset) for appt, offset in due if claim_patient_reminder(appt, offset))
+    t_ticks = time.perf_counter() - t0
+
+    dispatcher = RateLimitedDispatcher(rate_per_second=args.rate, workers=args.workers)
+    t0 = time.perf_counter()
+    for appt, offset in due_total:
+        await dispatcher.enqueue(
+            OutgoingWhatsAppMessage(to_number=appt.patient_number, text=reminder_text(appt, offset))
+        )
+    await dispatcher.join()
+    t_send = time.perf_counter() - t0
+
+    print(f"appointments={args.appointments} reminders={len(due_total)} delivered={received['count']} failed={dispatcher.failed}")
+    print(f"index_build={t_index * 1000:.1f}ms ({t_index / args.appointments * 1e6:.1f}us/appt)")
+    print(f"ticks={t_ticks:.2f}s (pop_due {pop_time * 1000:.1f}ms, rest is durable claims) over {26 * 60} ticks")
+    print(f"dispatch={t_send:.2f}s throughput={received['count'] / t_send:.0f} msg/s (rate limit {args.rate}/s)")
+
+    server.should_exit = True
+    await server_task
+    os.unlink(_db.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200.0)
+    parser.add_argument("--workers", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
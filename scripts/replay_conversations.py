@@ -0,0 +1,142 @@
+"""
+Reproduce turnos grabados (RECORD_DIR) por whatsapp_incoming con los upstreams
+grabados: sin red, con el reloj congelado en la hora de cada turno y mucho más
+rápido que en vivo. Marca cada turno cuyo resultado, mensajes salientes o
+llamadas a upstream (cantidad por tipo y orden) no coinciden con la grabación.
+
+    cd backend && RECORD_DIR=.recordings uvicorn app.main:app      # grabar
+    cd backend && python ../scripts/replay_conversations.py .recordings/
+    cd backend && python ../scripts/replay_conversations.py turns-20261019.ndjson --verbose
+
+La configuración que cambia el flujo (SLOT_HOLD_MINUTES, DOCTOR_CALENDARS, ...)
+tiene que ser la misma que cuando se grabó; va por variables de entorno.
+Sale con código 1 si hubo divergencias, para poder usarlo en CI.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db.name}"
+os.environ["JOURNAL_DIR"] = ""
+os.environ["RECORD_DIR"] = ""
+os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+
+from app.db import init_db  # noqa: E402
+from app.logs import configure_logging  # noqa: E402
+from app.recorder import Turn, decode, restore, use_turn  # noqa: E402
+from app.routes.whatsapp import whatsapp_incoming  # noqa: E402
+from app.schemas import IncomingWhatsAppMessage  # noqa: E402
+
+
+class FrozenClock:
+    """Reemplaza `datetime` en los módulos de app.* por una clase con now() fijo."""
+
+    def __init__(self):
+        self.ts = time.time()
+        clock = self
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.ts, tz)
+
+            @classmethod
+            def utcnow(cls):
+                return datetime.fromtimestamp(clock.ts, timezone.utc).replace(tzinfo=None)
+
+        for name, module in list(sys.modules.items()):
+            if name.startswith("app") and getattr(module, "datetime", None) is datetime:
+                module.datetime = FrozenDatetime
+
+
+def load(paths: list[str]) -> list[dict]:
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.ndjson"))) if os.path.isdir(path) else [path])
+    turns = []
+    for path in files:
+        with open(path, encoding="utf-8") as fh:
+            turns.extend(json.loads(line) for line in fh if line.strip())
+    turns.sort(key=lambda t: t["ts"])
+    return turns
+
+
+def outbound(calls: list[dict]) -> list[str]:
+    return [(c.get("args") or [{}])[0].get("text", "") for c in calls if c["call"] == "gateway.send"]
+
+
+def diff(recorded: dict, replayed_calls: list[dict], result) -> list[str]:
+    problems = []
+    if decode(recorded["result"]) != result:
+        problems.append(f"resultado {recorded['result']} → {result}")
+    before, after = Counter(c["call"] for c in recorded["calls"]), Counter(c["call"] for c in replayed_calls)
+    if before != after:
+        changed = {k: f"{before.get(k, 0)}→{after.get(k, 0)}" for k in before | after if before.get(k) != after.get(k)}
+        problems.append(f"llamadas {changed}")
+    elif [c["call"] for c in recorded["calls"]] != [c["call"] for c in replayed_calls]:
+        problems.append("orden de llamadas distinto")
+    if outbound(recorded["calls"]) != outbound(replayed_calls):
+        problems.append(f"salientes {outbound(recorded['calls'])!r} → {outbound(replayed_calls)!r}")
+    return problems
+
+
+async def main(args):
+    configure_logging()
+    init_db()
+    clock = FrozenClock()
+    turns = load(args.paths)[: args.limit or None]
+    if not turns:
+        print("sin turnos grabados")
+        return 0
+
+    diverged = 0
+    recorded_ms = 0.0
+    started = time.perf_counter()
+    for record in turns:
+        message = IncomingWhatsAppMessage(**record["input"])
+        patient = "".join(ch for ch in message.from_number if ch.isdigit())
+        clock.ts = record["ts"]
+        restore(patient, record["state"])
+        turn = Turn("replay", patient, expected=record["calls"])
+        with use_turn(turn):
+            try:
+                result = await whatsapp_incoming(message)
+            except Exception as exc:  # noqa: BLE001 - se reporta como divergencia
+                result = {"exception": f"{exc.__class__.__name__}: {exc}"}
+        recorded_ms += record.get("ms") or 0.0
+        problems = diff(record, turn.calls, result)
+        if problems:
+            diverged += 1
+            print(f"✗ {datetime.fromtimestamp(record['ts']):%Y-%m-%d %H:%M:%S} {patient} {message.text[:40]!r}")
+            for problem in problems:
+                print(f"    {problem}")
+        elif args.verbose:
+            print(f"✓ {patient} {message.text[:40]!r} → {result}")
+
+    elapsed = time.perf_counter() - started
+    speedup = recorded_ms / 1000 / elapsed if elapsed else 0.0
+    print(f"\n{len(turns)} turnos, {diverged} con divergencias, {elapsed:.2f}s "
+          f"(grabados: {recorded_ms / 1000:.1f}s, x{speedup:.0f})")
+    os.unlink(_db.name)
+    return 1 if diverged else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="archivos .ndjson o directorios de RECORD_DIR")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
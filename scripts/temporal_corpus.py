@@ -0,0 +1,193 @@
+"""
+Corpus del parser de fechas (app/temporal.py): frases de pacientes y lo que
+debe salir, con "hoy" fijo en miércoles 4 de marzo de 2026, 10:00 en Monterrey.
+`None` en vez del dict = el parser no está seguro y decide el modelo.
+
+    cd backend && python ../scripts/temporal_corpus.py
+    cd backend && python ../scripts/temporal_corpus.py -v    # muestra todo
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JOURNAL_DIR", "")
+
+from app.state import HistoryMessage  # noqa: E402
+from app.temporal import datetime_request  # noqa: E402
+
+NOW = datetime(2026, 3, 4, 10, 0, tzinfo=ZoneInfo("America/Monterrey"))  # miércoles
+
+
+def req(date=None, end=None, day=None, time=None, time_end=None) -> dict:
+    return {
+        "requested_date": date,
+        "requested_date_end": end,
+        "requested_day_name": day,
+        "requested_time": time,
+        "requested_time_end": time_end,
+    }
+
+
+NOTHING = req()
+
+CORPUS = [
+    # --- días relativos ---
+    ("mañana", req("2026-03-05")),
+    ("Mañana 10am", req("2026-03-05", time="10:00")),
+    ("pasado mañana", req("2026-03-06")),
+    ("pasado mañana en la tarde", req("2026-03-06", time="12:00", time_end="19:00")),
+    ("hoy", req("2026-03-04")),
+    ("hoy en la tarde", req("2026-03-04", time="12:00", time_end="19:00")),
+    ("mañana en la mañana", req("2026-03-05", time="08:00", time_end="12:00")),
+    ("mañana por la mañana", req("2026-03-05", time="08:00", time_end="12:00")),
+    ("mañana a las 10", req("2026-03-05", time="10:00")),
+    ("en 3 días", req("2026-03-07")),
+    ("dentro de 2 dias", req("2026-03-06")),
+    ("en una semana", req("2026-03-11")),
+    ("en dos semanas", req("2026-03-18")),
+    # --- días de la semana ---
+    ("viernes", req("2026-03-06", day="viernes")),
+    ("Viernes a las 12", req("2026-03-06", day="viernes", time="12:00")),
+    ("el lunes", req("2026-03-09", day="lunes")),
+    ("el miércoles", req("2026-03-11", day="miércoles")),  # hoy es miércoles: el de la otra semana
+    ("Miercoles", req("2026-03-11", day="miércoles")),
+    ("este miércoles", req("2026-03-04", day="miércoles")),
+    ("SABADO", req("2026-03-07", day="sábado")),
+    ("domingo", req("2026-03-08", day="domingo")),
+    ("el próximo martes", req("2026-03-10", day="martes")),
+    ("el martes que viene", req("2026-03-10", day="martes")),
+    ("el viernes de la próxima semana", req("2026-03-13", day="viernes")),
+    ("el jueves de la semana que viene", req("2026-03-12", day="jueves")),
+    ("sábado en la mañana", req("2026-03-07", day="sábado", time="08:00", time_end="12:00")),
+    ("el jueves a las 3 de la tarde", req("2026-03-05", day="jueves", time="15:00")),
+    ("viernes 5pm", req("2026-03-06", day="viernes", time="17:00")),
+    # --- fechas ---
+    ("6 de marzo", req("2026-03-06")),
+    ("el 6 de marzo", req("2026-03-06")),
+    ("3 de marzo", req("2027-03-03")),  # ya pasó: el del año que viene
+    ("15 de abril", req("2026-04-15")),
+    ("primero de mayo", req("2026-05-01")),
+    ("1 de enero de 2027", req("2027-01-01")),
+    ("10 de octubre del 2026", req("2026-10-10")),
+    ("marzo 20", req("2026-03-20")),
+    ("6/3", req("2026-03-06")),
+    ("20/03/2026", req("2026-03-20")),
+    ("15-4", req("2026-04-15")),
+    ("el 15", req("2026-03-15")),
+    ("el 2", req("2026-04-02")),
+    ("el día 20 a las 11", req("2026-03-20", time="11:00")),
+    ("el 20 de marzo a las 11:30", req("2026-03-20", time="11:30")),
+    ("el viernes 6 de marzo", req("2026-03-06", day="viernes")),
+    ("el lunes 6 de marzo", None),  # el 6 es viernes
+    ("el viernes 20 a las 11", req("2026-03-20", day="viernes", time="11:00")),
+    ("el martes 10", req("2026-03-10", day="martes")),
+    ("el jueves 2", req("2026-04-02", day="jueves")),  # el 2 ya pasó: el de abril
+    ("viernes el 13 en la tarde", req("2026-03-13", day="viernes", time="12:00", time_end="19:00")),
+    ("el lunes 20", None),  # el 20 es viernes
+    ("el viernes 5 pm", req("2026-03-06", day="viernes", time="17:00")),
+    ("31 de febrero", None),
+    # --- rangos de días ---
+    ("del 10 al 12 de marzo", req("2026-03-10", end="2026-03-12")),
+    ("entre el 10 y el 12 de marzo", req("2026-03-10", end="2026-03-12")),
+    ("del 3 al 5 de marzo", req("2026-03-04", end="2026-03-05")),  # ya empezó: desde hoy
+    ("del lunes al miércoles", req("2026-03-09", end="2026-03-11")),
+    ("entre el jueves y el sábado", req("2026-03-05", end="2026-03-07")),
+    ("esta semana", req("2026-03-04", end="2026-03-08")),
+    ("la próxima semana", req("2026-03-09", end="2026-03-15")),
+    ("la semana que viene", req("2026-03-09", end="2026-03-15")),
+    ("la próxima semana en la tarde", req("2026-03-09", end="2026-03-15", time="12:00", time_end="19:00")),
+    ("este fin de semana", req("2026-03-07", end="2026-03-08")),
+    ("el fin de semana que viene", req("2026-03-14", end="2026-03-15")),
+    # --- horas ---
+    ("a las 5", req(time="17:00")),  # consultorio de 10 a 18
+    ("a las 5 de la tarde", req(time="17:00")),
+    ("a las cinco de la tarde", req(time="17:00")),
+    ("a las 11", req(time="11:00")),
+    ("a las 12", req(time="12:00")),
+    ("a las 10:30", req(time="10:30")),
+    ("14:30", req(time="14:30")),
+    ("10am", req(time="10:00")),
+    ("10 am", req(time="10:00")),
+    ("a las 10 a.m.", req(time="10:00")),
+    ("5pm", req(time="17:00")),
+    ("5 p.m.", req(time="17:00")),
+    ("12pm", req(time="12:00")),
+    ("a la una", req(time="13:00")),
+    ("a la 1 de la tarde", req(time="13:00")),
+    ("a las 4 y media", req(time="16:30")),
+    ("a las 3 y cuarto", req(time="15:15")),
+    ("a las 5 menos cuarto", req(time="16:45")),
+    ("a las 9 de la mañana", req(time="09:00")),
+    ("a las 8 de la noche", req(time="20:00")),
+    ("al mediodía", req(time="12:00")),
+    ("a medio dia", req(time="12:00")),
+    ("15 hrs", req(time="15:00")),
+    ("10h", req(time="10:00")),
+    # --- franjas ---
+    ("de 10 a 12", req(time="10:00", time_end="12:00")),
+    ("entre las 4 y las 6", req(time="16:00", time_end="18:00")),
+    ("entre las 4 y las 6 de la tarde", req(time="16:00", time_end="18:00")),
+    ("de 9 a 1 de la tarde", req(time="09:00", time_end="13:00")),
+    ("de 11 a 2", req(time="11:00", time_end="14:00")),
+    ("de 10am a 1pm", req(time="10:00", time_end="13:00")),
+    ("después de las 4", req(time="16:00", time_end="22:00")),
+    ("antes de las 12", req(time="08:00", time_end="12:00")),
+    ("desde las 3 de la tarde", req(time="15:00", time_end="22:00")),
+    ("en la tarde", req(time="12:00", time_end="19:00")),
+    ("por la mañana", req(time="08:00", time_end="12:00")),
+    ("temprano", req(time="08:00", time_end="11:00")),
+    ("en la noche", req(time="19:00", time_end="22:00")),
+    # --- frases completas ---
+    ("Hola, ¿tienen algo para mañana en la tarde?", req("2026-03-05", time="12:00", time_end="19:00")),
+    ("me duele la cabeza desde ayer, quiero cita el lunes", req("2026-03-09", day="lunes")),
+    ("¿Puede ser el 12 de marzo como a las 4?", req("2026-03-12", time="16:00")),
+    ("quisiera para el sábado temprano", req("2026-03-07", day="sábado", time="08:00", time_end="11:00")),
+    # --- sin fecha: no se gasta una completion ---
+    ("quiero una cita", NOTHING),
+    ("tengo 35 años", NOTHING),
+    ("hola buenas tardes", NOTHING),
+    ("buenas noches, me duele la garganta", NOTHING),
+    ("la 3", NOTHING),
+    # --- dudoso: decide el modelo ---
+    ("el mes que entra", None),
+    ("lunes o martes", None),
+    ("después de la quincena", None),
+    ("¿a qué hora abren?", None),
+]
+
+# Varios mensajes: del más nuevo al más viejo, completando fecha y hora
+DIALOGS = [
+    ([("user", "quiero cita el viernes"), ("assistant", "¿A qué hora?"), ("user", "a las 11")],
+     req("2026-03-06", day="viernes", time="11:00")),
+    ([("user", "mañana"), ("assistant", "No tengo lugar"), ("user", "mejor el lunes")],
+     req("2026-03-09", day="lunes")),
+    ([("user", "hola"), ("assistant", "¿En qué te ayudo?"), ("user", "una cita con el pediatra")], NOTHING),
+    ([("assistant", "El lunes a las 10 tengo lugar"), ("user", "ok")], NOTHING),  # lo que dice el bot no cuenta
+]
+
+
+def main(args) -> int:
+    cases = [([("user", text)], expected, text) for text, expected in CORPUS]
+    cases += [(dialog, expected, " / ".join(text for _, text in dialog)) for dialog, expected in DIALOGS]
+    failures = 0
+    for dialog, expected, label in cases:
+        history = [HistoryMessage(role, content, 0) for role, content in dialog]
+        got = datetime_request(history, NOW)
+        ok = got == expected
+        failures += not ok
+        if not ok or args.verbose:
+            print(f"{'ok ' if ok else 'ERR'} {label!r}\n      esperado {expected}\n      obtenido {got}")
+    print(f"{len(cases) - failures}/{len(cases)} frases bien")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sys.exit(main(parser.parse_args()))
@@ -138,6 +138,7 @@ const initWhatsApp = async () => {
         body: JSON.stringify({
           from_number: from,
           text,
+          message_id: typeof message.id === 'string' ? message.id : message.id?._serialized,
         }),
       });
       if (!res.ok) {